@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+# program to check (some) features of asyncoro: it runs a peer (this
+# program with 'peer' argument) in another process and checks message
+# passing with remote coroutines ('send' and 'deliver', with small and
+# bulk messages), filters of (local and remote) channel subscribers,
+# overflow policies of coroutine mailboxes and that 'finish' returns
+# right away while peer is still connected. Each check prints 'ok' or
+# 'FAILED'; exit status is number of failed checks.
+
+import sys, time, socket, subprocess
+import asyncoro.disasyncoro as asyncoro
+
+def echo_proc(coro=None):
+    # send back messages to remote client
+    coro.set_daemon()
+    coro.register('checks_echo')
+    while True:
+        client, msg = yield coro.receive()
+        client.send(msg)
+
+def peer_proc(coro=None):
+    channel = asyncoro.Channel('checks_channel')
+    channel.register()
+    asyncoro.Coro(echo_proc)
+    coro.register('checks_peer')
+    # wait until client is done
+    msg = yield coro.receive()
+    channel.unregister()
+
+def peer(port):
+    scheduler = asyncoro.AsynCoro(node='127.0.0.1', tcp_port=port, udp_port=0,
+                                  discover_peers=False)
+    asyncoro.Coro(peer_proc).value()
+    start = time.time()
+    scheduler.finish()
+    print('finish: %.3f' % (time.time() - start))
+    sys.stdout.flush()
+
+def check(name, result):
+    print('check %s: %s' % (name, 'ok' if result else 'FAILED'))
+    sys.stdout.flush()
+    return 0 if result else 1
+
+def remote_checks(location, coro=None):
+    failed = 0
+    for i in range(50):
+        yield asyncoro.AsynCoro.instance().peer(location)
+        echo = yield asyncoro.Coro.locate('checks_echo', location, timeout=1)
+        if isinstance(echo, asyncoro.Coro):
+            break
+    else:
+        raise StopIteration(check('peer', False))
+
+    # round trip of messages sent to remote coroutine; bulk messages
+    # may be sent over other connection (with 'peer_conns' > 1), but
+    # messages must be received in the order they are sent
+    sent = [(i, b'x' * (1024 * 1024 if i % 10 == 0 else 10)) for i in range(50)]
+    for msg in sent:
+        echo.send((coro, msg))
+    received = []
+    for i in range(len(sent)):
+        msg = yield coro.receive(timeout=10)
+        if msg is None:
+            break
+        received.append(msg)
+    failed += check('remote send', received == sent)
+
+    n = yield echo.deliver((coro, 'deliver'), timeout=5)
+    msg = yield coro.receive(timeout=5)
+    failed += check('remote deliver', n == 1 and msg == 'deliver')
+
+    # 'deliver' after bulk 'send' (in flight over other connection) to
+    # same coroutine must not get ahead of it
+    echo.send((coro, b'x' * (4 * 1024 * 1024)))
+    n = yield echo.deliver((coro, 'after send'), timeout=10)
+    received = []
+    for i in range(2):
+        msg = yield coro.receive(timeout=10)
+        received.append(msg if msg == 'after send' else len(msg or b''))
+    failed += check('remote deliver after send', n == 1 and
+                    received == [4 * 1024 * 1024, 'after send'])
+
+    # subscriber filter of remote channel is applied at peer
+    channel = yield asyncoro.Channel.locate('checks_channel', location, timeout=5)
+    if (yield channel.subscribe(coro, filter={'type': 'quote', 'symbol': set(['A', 'B'])})):
+        failed += check('remote channel filter', False)
+    else:
+        for i, symbol in enumerate(['A', 'X', 'B', 'A']):
+            channel.send({'type': 'quote', 'symbol': symbol, 'seq': i})
+        channel.send({'type': 'trade', 'symbol': 'A', 'seq': 4})
+        channel.send({'type': 'quote', 'symbol': 'B', 'seq': 5})
+        received = []
+        while True:
+            msg = yield coro.receive(timeout=2)
+            if msg is None:
+                break
+            received.append(msg['seq'])
+        yield channel.unsubscribe(coro)
+        failed += check('remote channel filter', received == [0, 2, 3, 5])
+
+    peer = yield asyncoro.Coro.locate('checks_peer', location, timeout=5)
+    peer.send('quit')
+    raise StopIteration(failed)
+
+def collect_proc(coro=None):
+    received = []
+    while True:
+        msg = yield coro.receive(timeout=0.2)
+        if msg is None:
+            break
+        received.append(msg)
+    raise StopIteration(received)
+
+def local_checks(coro=None):
+    failed = 0
+    channel = asyncoro.Channel('checks_local')
+    subscribers = [asyncoro.Coro(collect_proc) for i in range(3)]
+    yield channel.subscribe(subscribers[0])
+    yield channel.subscribe(subscribers[1], filter=lambda msg: msg % 2 == 0)
+    yield channel.subscribe(subscribers[2], filter=lambda msg: msg > 6)
+    for i in range(10):
+        channel.send(i)
+    results = []
+    for subscriber in subscribers:
+        results.append((yield subscriber.finish()))
+    failed += check('channel filter', results == [list(range(10)), [0, 2, 4, 6, 8], [7, 8, 9]])
+    channel.close()
+
+    # messages are sent before receiver runs, so only 2 fit in its mailbox
+    expected = {'reject': ([0, 0, -1, -1], [0, 1], 'rejected'),
+                'drop_oldest': ([0, 0, 0, 0], [2, 3], 'dropped'),
+                'drop_newest': ([0, 0, 0, 0], [0, 1], 'dropped')}
+    for overflow in sorted(expected):
+        receiver = asyncoro.Coro(collect_proc)
+        receiver.set_mailbox(2, overflow)
+        status = [receiver.send(i) for i in range(4)]
+        stats = receiver.mailbox_stats()
+        received = yield receiver.finish()
+        statuses, messages, counter = expected[overflow]
+        failed += check('mailbox %s' % overflow, status == statuses and received == messages and
+                        stats['depth'] == 2 and stats[counter] == 2)
+    raise StopIteration(failed)
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == 'peer':
+        peer(int(sys.argv[2]))
+        exit(0)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    proc = subprocess.Popen([sys.executable, __file__, 'peer', str(port)],
+                            stdout=subprocess.PIPE)
+    scheduler = asyncoro.AsynCoro(node='127.0.0.1', udp_port=0, discover_peers=False,
+                                  peer_conns=2)
+    failed = asyncoro.Coro(local_checks).value()
+    failed += asyncoro.Coro(remote_checks, asyncoro.Location('127.0.0.1', port)).value()
+    # peer finishes while this process is still connected to it
+    for i in range(100):
+        if proc.poll() is not None:
+            break
+        time.sleep(0.1)
+    else:
+        proc.kill()
+    output = proc.communicate()[0].decode()
+    finish = [line for line in output.split('\n') if line.startswith('finish: ')]
+    failed += check('peer finish', finish and float(finish[0].split()[1]) < 5)
+    start = time.time()
+    scheduler.finish()
+    failed += check('finish', (time.time() - start) < 5)
+    exit(failed)
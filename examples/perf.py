@@ -1,11 +1,10 @@
 import sys, time
 
-# program to test performance of creating many coroutines
-# and message passing in local coroutines.
-if sys.version_info.major > 2:
-    import asyncoro3 as asyncoro
-else:
-    import asyncoro
+# program to test performance of creating many coroutines,
+# message passing in local coroutines and scheduling (steps per
+# second) of coroutines, and of batch APIs 'Coro.spawn_many' and
+# 'AsynCoro.send_many' compared to creating / sending one at a time.
+import asyncoro
 
 def client_proc(i, server, coro=None):
     # wait until all processes are created
@@ -25,8 +24,20 @@ def server_proc(n, coro=None):
             if k == n:
                 break
 
+def steps_proc(steps, coro=None):
+    # wait for signal to start
+    yield coro.receive()
+    # each 'yield' is one step in scheduler
+    for i in range(steps):
+        yield
+
+def recv_proc(msgs, coro=None):
+    for i in range(msgs):
+        yield coro.receive()
+
 if __name__ == '__main__':
     n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    steps = int(sys.argv[2]) if len(sys.argv) > 2 else 100
 
     start = time.time()
     server = asyncoro.Coro(server_proc, n)
@@ -38,3 +49,38 @@ if __name__ == '__main__':
     # wait for server to finish
     server.value()
     print('messaging took %.3f sec' % (time.time() - proc_start))
+
+    coros = [asyncoro.Coro(steps_proc, steps) for i in range(n)]
+    start = time.time()
+    for coro in coros:
+        coro.send('start')
+    for coro in coros:
+        coro.value()
+    elapsed = time.time() - start
+    print('%d steps in %d coroutines took %.3f sec: %d steps/sec' %
+          (n * steps, n, elapsed, (n * steps) / elapsed))
+
+    # each coroutine gets 3 messages; create coroutines and send messages
+    # one at a time and then with batch APIs
+    msgs = 3
+    start = time.time()
+    coros = [asyncoro.Coro(recv_proc, msgs) for i in range(n)]
+    print('creating %d coroutines with Coro took %.3f sec' % (n, time.time() - start))
+    start = time.time()
+    for j in range(msgs):
+        for coro in coros:
+            coro.send(j)
+    print('sending %d messages with send took %.3f sec' % (n * msgs, time.time() - start))
+    for coro in coros:
+        coro.value()
+
+    scheduler = asyncoro.AsynCoro.instance()
+    start = time.time()
+    coros = asyncoro.Coro.spawn_many(recv_proc, [(msgs,)] * n)
+    print('creating %d coroutines with spawn_many took %.3f sec' % (n, time.time() - start))
+    start = time.time()
+    for j in range(msgs):
+        scheduler.send_many([(coro, j) for coro in coros])
+    print('sending %d messages with send_many took %.3f sec' % (n * msgs, time.time() - start))
+    for coro in coros:
+        coro.value()
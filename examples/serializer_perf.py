@@ -0,0 +1,56 @@
+import sys, time
+
+# program to compare serializers used for messages to peers: size of
+# serialized messages and time to serialize and deserialize them, for
+# typical requests (that carry small messages) and replies.
+import asyncoro.disasyncoro as asyncoro
+from asyncoro.disasyncoro import _NetRequest
+
+
+def server_proc(coro=None):
+    coro.set_daemon()
+    while True:
+        msg = yield coro.receive()
+
+
+def messages(server, channel):
+    """Returns (name, object) pairs of messages to serialize.
+    """
+    loc = server.location
+    send = _NetRequest('send', kwargs={'message': ('ping', 1), 'name': server.name,
+                                       'coro': server._id}, dst=loc, timeout=10)
+    deliver = _NetRequest('deliver', kwargs={'message': {'job': 5, 'client': server},
+                                             'name': server.name, 'coro': server._id},
+                          dst=loc, timeout=10)
+    deliver.id = 12
+    chan_send = _NetRequest('send', kwargs={'message': 3.14, 'channel': channel.name},
+                            dst=loc, timeout=10)
+    sends = [_NetRequest('send', kwargs={'message': ('ping', i), 'name': server.name,
+                                         'coro': server._id}, dst=loc, timeout=10)
+             for i in range(100)]
+    batch = _NetRequest('batch', kwargs={'reqs': sends}, dst=loc)
+    return [('send', send), ('deliver', deliver), ('channel send', chan_send),
+            ('batch of 100 sends', batch), ('reply (coro)', (12, server)),
+            ('reply (int)', (13, 1))]
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    scheduler = asyncoro.AsynCoro(udp_port=0, discover_peers=False)
+    server = asyncoro.Coro(server_proc)
+    channel = asyncoro.Channel('perf')
+    serializers = [asyncoro.Serializer.get('pickle'), asyncoro.Serializer.get('compact')]
+    for name, obj in messages(server, channel):
+        for serializer in serializers:
+            msg = serializer.encode(obj)
+            start = time.time()
+            for i in range(n):
+                serializer.encode(obj)
+            dumps = (time.time() - start) * 1e6 / n
+            start = time.time()
+            for i in range(n):
+                asyncoro.Serializer.decode(msg)
+            loads = (time.time() - start) * 1e6 / n
+            print('%-20s %-8s: %6d bytes, %7.2f usec to serialize, %7.2f usec to deserialize' %
+                  (name, serializer.name, len(msg), dumps, loads))
+    scheduler.finish()
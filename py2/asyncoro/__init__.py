@@ -23,7 +23,6 @@ import re
 import errno
 import platform
 import ssl
-from heapq import heappush, heappop
 from bisect import bisect_left
 import Queue as queue
 import atexit
@@ -52,7 +51,7 @@ __maintainer__ = "Giridhar Pemmasani (pgiri@yahoo.com)"
 __license__ = "MIT"
 __url__ = "http://asyncoro.sourceforge.net"
 __status__ = "Production"
-__version__ = "4.2.2"
+__version__ = "4.3.0"
 
 __all__ = ['AsyncSocket', 'AsynCoroSocket', 'Coro', 'AsynCoro',
            'Lock', 'RLock', 'Event', 'Condition', 'Semaphore',
@@ -177,6 +176,339 @@ class Logger(object):
 logger = Logger('asyncoro')
 
 
+class _Timer(object):
+    """Internal use only. See _TimerWheel.
+    """
+
+    __slots__ = ('expires', 'tick', 'data', '_slot', '_level')
+
+    def __init__(self, expires, tick, data):
+        self.expires = expires
+        self.tick = tick
+        self.data = data
+        self._slot = None
+        self._level = 0
+
+
+class _TimerWheel(object):
+    """Internal use only.
+
+    Hierarchical timing wheel used by scheduler (for timed suspends of
+    coroutines) and I/O notifiers (for timeouts of sockets). Adding and
+    cancelling a timer take constant time. Timers are kept with
+    resolution of 1 ms and never expire before their time. Callers
+    must synchronize access to it.
+    """
+
+    # number of bits for slots in each level; first level has slots for
+    # each tick (ms) and other levels have slots for all ticks
+    # spanned by previous level, so the wheels span ~50 days; timers
+    # farther than that are kept in last slot and cascaded again
+    _Bits = (8, 6, 6, 6, 6)
+    _TicksPerSec = 1000
+
+    def __init__(self):
+        self._wheels = [[set() for i in range(1 << bits)] for bits in _TimerWheel._Bits]
+        self._masks = [(1 << bits) - 1 for bits in _TimerWheel._Bits]
+        self._shifts = [sum(_TimerWheel._Bits[:level]) for level in range(len(_TimerWheel._Bits))]
+        self._span = 1 << sum(_TimerWheel._Bits)
+        self._counts = [0] * len(_TimerWheel._Bits)
+        self._len = 0
+        # next tick to process
+        self._tick = int(_time() * _TimerWheel._TicksPerSec)
+
+    def __len__(self):
+        return self._len
+
+    def add(self, expires, data):
+        """Add timer that expires at 'expires' (as per '_time') and return
+        it. 'data' of the timer is returned by 'expire' when it expires.
+        """
+        tick = expires * _TimerWheel._TicksPerSec
+        timer = _Timer(expires, int(tick), data)
+        if timer.tick < tick:
+            timer.tick += 1
+        if not self._len:
+            self._tick = max(self._tick, int(_time() * _TimerWheel._TicksPerSec))
+        self._insert(timer)
+        self._len += 1
+        return timer
+
+    def cancel(self, timer):
+        """Remove timer added with 'add'. Returns True if timer was
+        pending.
+        """
+        slot = timer._slot
+        if slot is None:
+            return False
+        slot.discard(timer)
+        timer._slot = None
+        self._counts[timer._level] -= 1
+        self._len -= 1
+        return True
+
+    def next_expiry(self):
+        """Returns time (as per '_time') of earliest timer or None if no
+        timers are pending.
+        """
+        if not self._len:
+            return None
+        earliest = None
+        if self._counts[0]:
+            wheel = self._wheels[0]
+            mask = self._masks[0]
+            for i in range(mask + 1):
+                if wheel[(self._tick + i) & mask]:
+                    earliest = self._tick + i
+                    break
+        for level in range(1, len(self._wheels)):
+            if not self._counts[level]:
+                continue
+            # slot for current position has already been cascaded (by
+            # 'expire'), so earliest timer in this level is at or after
+            # next slot
+            shift = self._shifts[level]
+            cur = self._tick >> shift
+            if earliest is not None and ((cur + 1) << shift) >= earliest:
+                continue
+            wheel = self._wheels[level]
+            mask = self._masks[level]
+            for i in range(1, mask + 2):
+                slot = wheel[(cur + i) & mask]
+                if slot:
+                    tick = min(timer.tick for timer in slot)
+                    start = (cur + i) << shift
+                    if tick >= (start + (1 << shift)):
+                        # timers farther than span of wheels; they are
+                        # cascaded (again) at start of this slot
+                        tick = start
+                    if earliest is None or tick < earliest:
+                        earliest = tick
+                    break
+        return float(earliest) / _TimerWheel._TicksPerSec
+
+    def expire(self, now):
+        """Remove timers that expire at or before 'now' and return list
+        of their data, ordered by (millisecond) tick of expiry.
+        """
+        expired = []
+        last = int(now * _TimerWheel._TicksPerSec)
+        wheel = self._wheels[0]
+        mask = self._masks[0]
+        counts = self._counts
+        while self._tick <= last:
+            if not self._len:
+                self._tick = last + 1
+                break
+            tick = self._tick
+            i = tick & mask
+            if i == 0:
+                self._cascade(tick)
+            slot = wheel[i]
+            if slot:
+                for timer in slot:
+                    timer._slot = None
+                    expired.append(timer.data)
+                counts[0] -= len(slot)
+                self._len -= len(slot)
+                slot.clear()
+            if counts[0]:
+                self._tick = tick + 1
+            else:
+                # skip to the tick where earliest non-empty slot in
+                # higher levels is cascaded
+                for level in range(1, len(counts)):
+                    if counts[level]:
+                        break
+                width = 1 << self._shifts[level]
+                self._tick = min((tick | (width - 1)) + 1, last + 1)
+        if not (self._tick & mask) and self._len:
+            # cascade slots for next tick now (instead of when it is
+            # processed), so 'next_expiry' finds their timers in lower
+            # levels
+            self._cascade(self._tick)
+        return expired
+
+    def _insert(self, timer):
+        delta = timer.tick - self._tick
+        if delta < (1 << self._shifts[1]):
+            level = 0
+            if delta < 0:
+                # already expired; process with current tick
+                i = self._tick & self._masks[0]
+            else:
+                i = timer.tick & self._masks[0]
+        else:
+            for level in range(2, len(self._shifts)):
+                if delta < (1 << self._shifts[level]):
+                    level -= 1
+                    tick = timer.tick
+                    break
+            else:
+                level = len(self._shifts) - 1
+                if delta < self._span:
+                    tick = timer.tick
+                else:
+                    tick = self._tick + self._span - 1
+            i = (tick >> self._shifts[level]) & self._masks[level]
+        slot = self._wheels[level][i]
+        slot.add(timer)
+        timer._slot = slot
+        timer._level = level
+        self._counts[level] += 1
+
+    def _cascade(self, tick):
+        # move timers in slots of higher levels at current position to
+        # lower levels
+        for level in range(1, len(self._wheels)):
+            i = (tick >> self._shifts[level]) & self._masks[level]
+            slot = self._wheels[level][i]
+            if slot:
+                timers = list(slot)
+                slot.clear()
+                self._counts[level] -= len(timers)
+                for timer in timers:
+                    self._insert(timer)
+            if i:
+                break
+
+
+class _BufferPool(object):
+    """Internal use only.
+
+    Pool of bytearrays in size classes (powers of 2, from _MinSize to
+    _MaxSize), so buffers used for receiving data (e.g., by 'recv_msg'
+    to read ahead) are reused instead of being allocated (and freed)
+    for each read. Bigger buffers are not pooled.
+    """
+
+    _MinSize = 4096
+    _MaxSize = 4194304
+    # at most this many free buffers are kept in each size class
+    _MaxFree = 16
+
+    def __init__(self):
+        self._free = {}
+        size = _BufferPool._MinSize
+        while size <= _BufferPool._MaxSize:
+            self._free[size] = []
+            size <<= 1
+
+    def get(self, size):
+        """Return bytearray of at least 'size' bytes. It should be given
+        back with 'put' when done with it.
+        """
+        if size > _BufferPool._MaxSize:
+            return bytearray(size)
+        size = max(1 << (size - 1).bit_length(), _BufferPool._MinSize)
+        try:
+            return self._free[size].pop()
+        except IndexError:
+            return bytearray(size)
+
+    def put(self, buf):
+        """Give back buffer obtained with 'get'.
+        """
+        free = self._free.get(len(buf), None)
+        if free is not None and len(free) < _BufferPool._MaxFree:
+            free.append(buf)
+
+_buffer_pool = _BufferPool()
+
+
+class _SSLContexts(object):
+    """Internal use only.
+
+    SSL contexts shared by all AsyncSockets with same certificate,
+    key and CA files (instead of a context created, and certificates
+    loaded, for every connection) and sessions of client connections
+    kept by peer address, so reconnecting to a peer resumes earlier
+    session with abbreviated handshake (if ssl module supports
+    sessions).
+    """
+
+    # at most this many client sessions are kept
+    _MaxSessions = 1024
+
+    def __init__(self):
+        self._contexts = {}
+        self._sessions = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.full_handshakes = 0
+        self.resumed_handshakes = 0
+
+    def context(self, server_side, certfile=None, keyfile=None, ca_certs=None,
+                ssl_version=ssl.PROTOCOL_SSLv23):
+        """Return (shared) SSLContext for given side and files, or None
+        if ssl module doesn't support contexts. If 'ca_certs' is given,
+        peer's certificate is verified with it.
+        """
+        if not hasattr(ssl, 'SSLContext'):
+            return None
+        key = (server_side, certfile, keyfile, ca_certs, ssl_version)
+        with self._lock:
+            ctx = self._contexts.get(key, None)
+            if ctx:
+                return ctx
+            if hasattr(ssl, 'create_default_context'):
+                if server_side:
+                    ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+                else:
+                    ctx = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=ca_certs)
+                    # peers are identified by (self-signed) certificates, not host names
+                    ctx.check_hostname = False
+                    if not ca_certs:
+                        ctx.verify_mode = ssl.CERT_NONE
+            else:
+                ctx = ssl.SSLContext(ssl_version)
+                if ca_certs:
+                    ctx.verify_mode = ssl.CERT_REQUIRED
+                    ctx.load_verify_locations(ca_certs)
+            if certfile:
+                ctx.load_cert_chain(certfile=certfile, keyfile=keyfile)
+            self._contexts[key] = ctx
+            return ctx
+
+    def resume(self, sock, addr):
+        """Set session saved for peer at 'addr' (with same context) in
+        client SSL socket 'sock', before handshake.
+        """
+        if not hasattr(sock, 'session'):
+            return
+        with self._lock:
+            session = self._sessions.get((sock.context, addr), None)
+        if session:
+            try:
+                sock.session = session
+            except (ValueError, ssl.SSLError):
+                pass
+
+    def save(self, sock, addr):
+        """Save session of client SSL socket 'sock' connected to peer at
+        'addr'. With TLS 1.3, session tickets are sent after handshake,
+        so this should also be called before closing socket.
+        """
+        session = getattr(sock, 'session', None)
+        if not session:
+            return
+        key = (sock.context, addr)
+        with self._lock:
+            self._sessions.pop(key, None)
+            self._sessions[key] = session
+            if len(self._sessions) > _SSLContexts._MaxSessions:
+                self._sessions.popitem(last=False)
+
+    def handshake_done(self, sock):
+        """Update counts of full / resumed handshakes.
+        """
+        if getattr(sock, 'session_reused', False):
+            self.resumed_handshakes += 1
+        else:
+            self.full_handshakes += 1
+
+_ssl_contexts = _SSLContexts()
+
+
 class _AsyncSocket(object):
     """Base class for use with AsynCoro, for asynchronous I/O
     completion and coroutines. This class is for internal use
@@ -187,10 +519,19 @@ class _AsyncSocket(object):
                  '_timeout_id', '_read_coro', '_read_task', '_read_result', '_write_coro',
                  '_write_task', '_write_result', '_asyncoro', '_notifier', 'recvall', 'sendall',
                  'recv_msg', 'send_msg', '_blocking', 'recv', 'send', 'recvfrom', 'sendto',
-                 'accept', 'connect', 'ssl_server_ctx')
+                 'accept', 'connect', 'ssl_server_ctx', 'recv_msgs', '_rbuf', 'sendall_vec',
+                 'sendfile', 'recv_into', 'recvall_into', 'recvfrom_many', 'sendto_many',
+                 'accept_many', '_ssl_peer')
 
     _default_timeout = None
     _MsgLengthSize = struct.calcsize('>L')
+    # recv_msg reads (at most) this many bytes at a time, so one read
+    # may get many (small) messages
+    _ReadAhead = 65536
+    # 'sendall_vec' joins buffers smaller than this
+    _JoinSize = 65536
+    # 'sendfile' reads (and sends) this many bytes at a time
+    _FileChunk = 1048576
 
     def __init__(self, sock, blocking=False, keyfile=None, certfile=None,
                  ssl_version=ssl.PROTOCOL_SSLv23):
@@ -205,7 +546,13 @@ class _AsyncSocket(object):
         Only methods without leading underscore should be used; other
         attributes are for internal use only. In addition to usual
         socket I/O methods, AsyncSocket implemnents 'recvall',
-        'send_msg', 'recv_msg' and 'unwrap' methods.
+        'recvall_into', 'sendall_vec', 'sendfile', 'send_msg',
+        'recv_msg', 'recv_msgs', 'recvfrom_many', 'sendto_many',
+        'accept_many' and 'unwrap' methods.
+
+        SSL contexts are shared by sockets with same certificate files
+        and client sockets resume sessions with peers they connected
+        to earlier (see 'ssl_handshakes').
         """
 
         if isinstance(sock, AsyncSocket):
@@ -229,10 +576,18 @@ class _AsyncSocket(object):
             self._asyncoro = None
             self._notifier = None
             self.ssl_server_ctx = None
+            # address of peer connected with SSL, to save session when closing
+            self._ssl_peer = None
+            # data read ahead by recv_msg but not consumed yet
+            self._rbuf = None
 
             self.recvall = None
+            self.recvall_into = None
             self.sendall = None
+            self.sendall_vec = None
+            self.sendfile = None
             self.recv_msg = None
+            self.recv_msgs = None
             self.send_msg = None
 
             self._blocking = None
@@ -245,6 +600,14 @@ class _AsyncSocket(object):
     def __getattr__(self, name):
         return getattr(self._rsock, name)
 
+    @staticmethod
+    def ssl_handshakes():
+        """Returns tuple of number of full and resumed (abbreviated) SSL
+        handshakes done by asynchronous sockets so far. Client sockets
+        resume earlier session with same peer when possible.
+        """
+        return (_ssl_contexts.full_handshakes, _ssl_contexts.resumed_handshakes)
+
     def setblocking(self, blocking):
         if blocking:
             blocking = True
@@ -257,30 +620,51 @@ class _AsyncSocket(object):
             self._unregister()
             self._rsock.setblocking(1)
             if self._certfile:
-                self._rsock = ssl.wrap_socket(self._rsock, keyfile=self._keyfile,
-                                              certfile=self._certfile,
-                                              ssl_version=self._ssl_version)
-            for name in ['recv', 'send', 'recvfrom', 'sendto', 'accept', 'connect']:
+                ctx = _ssl_contexts.context(False, certfile=self._certfile, keyfile=self._keyfile,
+                                            ssl_version=self._ssl_version)
+                if ctx:
+                    self._rsock = ctx.wrap_socket(self._rsock)
+                else:
+                    self._rsock = ssl.wrap_socket(self._rsock, keyfile=self._keyfile,
+                                                  certfile=self._certfile,
+                                                  ssl_version=self._ssl_version)
+            for name in ['recv', 'recv_into', 'send', 'recvfrom', 'sendto', 'accept',
+                         'connect']:
                 setattr(self, name, getattr(self._rsock, name))
+            self.recvfrom_many = self._sync_recvfrom_many
+            self.sendto_many = self._sync_sendto_many
+            self.accept_many = self._sync_accept_many
             if self._rsock.type & socket.SOCK_STREAM:
                 self.recvall = self._sync_recvall
+                self.recvall_into = self._sync_recvall_into
                 self.sendall = self._sync_sendall
+                self.sendall_vec = self._sync_sendall_vec
+                self.sendfile = self._sync_sendfile
                 self.recv_msg = self._sync_recv_msg
+                self.recv_msgs = self._sync_recv_msgs
                 self.send_msg = self._sync_send_msg
             self._asyncoro = None
             self._notifier = None
         else:
             self._rsock.setblocking(0)
             self.recv = self._async_recv
+            self.recv_into = self._async_recv_into
             self.send = self._async_send
             self.recvfrom = self._async_recvfrom
             self.sendto = self._async_sendto
+            self.recvfrom_many = self._async_recvfrom_many
+            self.sendto_many = self._async_sendto_many
             self.accept = self._async_accept
+            self.accept_many = self._async_accept_many
             self.connect = self._async_connect
             if self._rsock.type & socket.SOCK_STREAM:
                 self.recvall = self._async_recvall
+                self.recvall_into = self._async_recvall_into
                 self.sendall = self._async_sendall
+                self.sendall_vec = self._async_sendall_vec
+                self.sendfile = self._async_sendfile
                 self.recv_msg = self._async_recv_msg
+                self.recv_msgs = self._async_recv_msgs
                 self.send_msg = self._async_send_msg
             self._asyncoro = AsynCoro.scheduler()
             self._notifier = _AsyncNotifier.instance()
@@ -303,6 +687,9 @@ class _AsyncSocket(object):
         """
         self._unregister()
         if self._rsock:
+            if self._ssl_peer:
+                _ssl_contexts.save(self._rsock, self._ssl_peer)
+                self._ssl_peer = None
             self._rsock.close()
             self._rsock = None
         self._read_task = self._write_task = None
@@ -376,6 +763,10 @@ class _AsyncSocket(object):
                 n = len(self._read_result) - len(view)
                 if n > 0:
                     buf = bytes(self._read_result[:n])
+            elif isinstance(self._read_result, memoryview):
+                # recvall_into: number of bytes received is returned
+                view = self._read_task.args[1]
+                buf = len(self._read_result) - len(view)
             if buf:
                 self._read_coro._proceed_(buf)
             else:
@@ -386,6 +777,9 @@ class _AsyncSocket(object):
             sent = 0
             if isinstance(self._write_result, buffer):
                 sent = self._write_task.args[1] - len(self._write_result)
+            elif isinstance(self._write_result, int):
+                # sendto_many: number of datagrams sent
+                sent = self._write_result
             if sent:
                 self._write_coro._proceed_(sent)
             else:
@@ -399,6 +793,27 @@ class _AsyncSocket(object):
         if self._read_task:
             self._read_task()
 
+    def _read_buffered(self, bufsize):
+        """Internal use only.
+
+        Returns (at most 'bufsize' bytes of) data read ahead by
+        'recv_msg', if any, so it is not lost to 'recv' and 'recvall'.
+        """
+        buf = str(self._rbuf[:bufsize])
+        del self._rbuf[:bufsize]
+        return buf
+
+    def _read_buffered_into(self, view):
+        """Internal use only.
+
+        Copies (at most len(view) bytes of) data read ahead by
+        'recv_msg' into 'view' and returns number of bytes copied.
+        """
+        n = min(len(view), len(self._rbuf))
+        view[:n] = str(self._rbuf[:n])
+        del self._rbuf[:n]
+        return n
+
     def _async_recv(self, bufsize, *args):
         """Internal use only; use 'recv' with 'yield' instead.
 
@@ -415,6 +830,14 @@ class _AsyncSocket(object):
                     self._read_task = None
                     coro, self._read_coro = self._read_coro, None
                     coro.throw(*sys.exc_info())
+            except socket.error as err:
+                if err.args[0] == EWOULDBLOCK:
+                    pass
+                else:
+                    self._notifier.clear(self, _AsyncPoller._Read)
+                    self._read_task = None
+                    coro, self._read_coro = self._read_coro, None
+                    coro.throw(*sys.exc_info())
             except:
                 self._notifier.clear(self, _AsyncPoller._Read)
                 self._read_task = None
@@ -426,27 +849,84 @@ class _AsyncSocket(object):
                 coro, self._read_coro = self._read_coro, None
                 coro._proceed_(buf)
 
+        if self._rbuf:
+            return self._read_buffered(bufsize)
+        # try to receive first; suspend and wait for data only if
+        # none is available now
+        try:
+            buf = self._rsock.recv(bufsize, *args)
+        except ssl.SSLError as err:
+            if err.args[0] != ssl.SSL_ERROR_WANT_READ:
+                raise
+        except socket.error as err:
+            if err.args[0] != EWOULDBLOCK:
+                raise
+        else:
+            return buf
         self._read_task = partial_func(_recv, self, bufsize, *args)
         if not self._asyncoro:
             self._asyncoro = AsynCoro.scheduler()
         self._read_coro = AsynCoro.cur_coro(self._asyncoro)
         self._read_coro._await_()
         self._notifier.add(self, _AsyncPoller._Read)
-        if self._certfile and self._rsock.pending():
+
+    def _async_recv_into(self, buffer, nbytes=0, *args):
+        """Internal use only; use 'recv_into' with 'yield' instead.
+
+        Asynchronous version of socket recv_into method; returns
+        number of bytes received into 'buffer'.
+        """
+        def _recv_into(self, buffer, nbytes, *args):
             try:
-                buf = self._rsock.recv(bufsize)
-            except socket.error as err:
-                if err.args[0] != EWOULDBLOCK:
-                    self._read_task = None
+                n = self._rsock.recv_into(buffer, nbytes, *args)
+            except ssl.SSLError as err:
+                if err.args[0] == ssl.SSL_ERROR_WANT_READ:
+                    pass
+                else:
                     self._notifier.clear(self, _AsyncPoller._Read)
+                    self._read_task = None
                     coro, self._read_coro = self._read_coro, None
                     coro.throw(*sys.exc_info())
-            else:
-                if buf:
-                    self._read_task = None
+            except socket.error as err:
+                if err.args[0] == EWOULDBLOCK:
+                    pass
+                else:
                     self._notifier.clear(self, _AsyncPoller._Read)
+                    self._read_task = None
                     coro, self._read_coro = self._read_coro, None
-                    coro._proceed_(buf)
+                    coro.throw(*sys.exc_info())
+            except:
+                self._notifier.clear(self, _AsyncPoller._Read)
+                self._read_task = None
+                coro, self._read_coro = self._read_coro, None
+                coro.throw(*sys.exc_info())
+            else:
+                self._notifier.clear(self, _AsyncPoller._Read)
+                self._read_task = None
+                coro, self._read_coro = self._read_coro, None
+                coro._proceed_(n)
+
+        if self._rbuf:
+            view = memoryview(buffer)
+            if nbytes:
+                view = view[:nbytes]
+            return self._read_buffered_into(view)
+        try:
+            n = self._rsock.recv_into(buffer, nbytes, *args)
+        except ssl.SSLError as err:
+            if err.args[0] != ssl.SSL_ERROR_WANT_READ:
+                raise
+        except socket.error as err:
+            if err.args[0] != EWOULDBLOCK:
+                raise
+        else:
+            return n
+        self._read_task = partial_func(_recv_into, self, buffer, nbytes, *args)
+        if not self._asyncoro:
+            self._asyncoro = AsynCoro.scheduler()
+        self._read_coro = AsynCoro.cur_coro(self._asyncoro)
+        self._read_coro._await_()
+        self._notifier.add(self, _AsyncPoller._Read)
 
     def _async_recvall(self, bufsize, *args):
         """Internal use only; use 'recvall' with 'yield' instead.
@@ -458,69 +938,96 @@ class _AsyncSocket(object):
         exception to be thrown.
         """
         def _recvall(self, view, *args):
-            try:
-                recvd = self._rsock.recv_into(view, len(view), *args)
-            except ssl.SSLError as err:
-                if err.args[0] == ssl.SSL_ERROR_WANT_READ:
-                    pass
-                else:
+            # receive until done or no more data is available now
+            # (needed with edge-triggered notifications)
+            recvd = 0
+            while len(view) > 0:
+                try:
+                    n = self._rsock.recv_into(view, len(view), *args)
+                except ssl.SSLError as err:
+                    if err.args[0] == ssl.SSL_ERROR_WANT_READ:
+                        break
                     self._notifier.clear(self, _AsyncPoller._Read)
                     self._read_task = self._read_result = None
                     coro, self._read_coro = self._read_coro, None
                     coro.throw(*sys.exc_info())
-            except:
-                logger.debug(traceback.format_exc())
-                self._notifier.clear(self, _AsyncPoller._Read)
-                self._read_task = self._read_result = None
-                coro, self._read_coro = self._read_coro, None
-                coro.throw(*sys.exc_info())
-            else:
-                if recvd:
-                    view = view[recvd:]
-                    if len(view) == 0:
-                        buf = str(self._read_result)
-                        self._notifier.clear(self, _AsyncPoller._Read)
-                        self._read_task = self._read_result = None
-                        coro, self._read_coro = self._read_coro, None
-                        coro._proceed_(buf)
-                    else:
-                        if self._timeout:
-                            self._notifier._del_timeout(self)
-                            self._notifier._add_timeout(self)
-                        self._read_task = partial_func(_recvall, self, view, *args)
-                else:
+                    return
+                except socket.error as err:
+                    if err.args[0] == EWOULDBLOCK:
+                        break
+                    logger.debug(traceback.format_exc())
+                    self._notifier.clear(self, _AsyncPoller._Read)
+                    self._read_task = self._read_result = None
+                    coro, self._read_coro = self._read_coro, None
+                    coro.throw(*sys.exc_info())
+                    return
+                except:
+                    logger.debug(traceback.format_exc())
+                    self._notifier.clear(self, _AsyncPoller._Read)
+                    self._read_task = self._read_result = None
+                    coro, self._read_coro = self._read_coro, None
+                    coro.throw(*sys.exc_info())
+                    return
+                if not n:
                     self._notifier.clear(self, _AsyncPoller._Read)
                     self._read_task = self._read_result = None
                     coro, self._read_coro = self._read_coro, None
                     coro._proceed_('')
+                    return
+                recvd += n
+                view = view[n:]
+            else:
+                buf = str(self._read_result)
+                self._notifier.clear(self, _AsyncPoller._Read)
+                self._read_task = self._read_result = None
+                coro, self._read_coro = self._read_coro, None
+                coro._proceed_(buf)
+                return
+            if recvd:
+                if self._timeout:
+                    self._notifier._del_timeout(self)
+                    self._notifier._add_timeout(self)
+                self._read_task = partial_func(_recvall, self, view, *args)
 
+        if self._rbuf:
+            buf = self._read_buffered(bufsize)
+            if len(buf) == bufsize:
+                return buf
+        else:
+            buf = None
         self._read_result = bytearray(bufsize)
         view = memoryview(self._read_result)
+        if buf:
+            view[:len(buf)] = buf
+            view = view[len(buf):]
+        # receive data available now; suspend and wait for rest only
+        # if necessary
+        while len(view) > 0:
+            try:
+                recvd = self._rsock.recv_into(view, len(view), *args)
+            except ssl.SSLError as err:
+                if err.args[0] == ssl.SSL_ERROR_WANT_READ:
+                    break
+                self._read_result = None
+                raise
+            except socket.error as err:
+                if err.args[0] == EWOULDBLOCK:
+                    break
+                self._read_result = None
+                raise
+            if not recvd:
+                self._read_result = None
+                return ''
+            view = view[recvd:]
+        else:
+            buf, self._read_result = str(self._read_result), None
+            return buf
         self._read_task = partial_func(_recvall, self, view, *args)
         if not self._asyncoro:
             self._asyncoro = AsynCoro.scheduler()
         self._read_coro = AsynCoro.cur_coro(self._asyncoro)
         self._read_coro._await_()
         self._notifier.add(self, _AsyncPoller._Read)
-        if self._certfile and self._rsock.pending():
-            try:
-                recvd = self._rsock.recv_into(view, bufsize)
-            except socket.error as err:
-                if err.args[0] != EWOULDBLOCK:
-                    self._read_task = self._read_result = None
-                    self._notifier.clear(self, _AsyncPoller._Read)
-                    coro, self._read_coro = self._read_coro, None
-                    coro.throw(*sys.exc_info())
-            else:
-                if recvd == bufsize:
-                    buf = str(self._read_result)
-                    self._read_task = self._read_result = None
-                    self._notifier.clear(self, _AsyncPoller._Read)
-                    coro, self._read_coro = self._read_coro, None
-                    coro._proceed_(buf)
-                elif recvd:
-                    view = view[recvd:]
-                    self._read_task = partial_func(_recvall, self, view, *args)
 
     def _sync_recvall(self, bufsize, *args):
         """Internal use only; use 'recvall' instead.
@@ -529,6 +1036,10 @@ class _AsyncSocket(object):
         """
         self._read_result = bytearray(bufsize)
         view = memoryview(self._read_result)
+        if self._rbuf:
+            buf = self._read_buffered(bufsize)
+            view[:len(buf)] = buf
+            view = view[len(buf):]
         while len(view) > 0:
             recvd = self._rsock.recv_into(view, *args)
             if not recvd:
@@ -538,6 +1049,111 @@ class _AsyncSocket(object):
         buf, self._read_result = str(self._read_result), None
         return buf
 
+    def _async_recvall_into(self, buffer, *args):
+        """Internal use only; use 'recvall_into' with 'yield' instead.
+
+        Receive data until 'buffer' (writable buffer, e.g., bytearray
+        or memoryview) is full, so caller can reuse buffers. Returns
+        number of bytes received, which is less than size of 'buffer'
+        only if connection is closed or socket's timeout expires after
+        some data has been received (if no data has been received
+        before timeout, 'socket.timeout' exception is thrown).
+        """
+        def _recvall_into(self, view, *args):
+            # receive until done or no more data is available now
+            # (needed with edge-triggered notifications)
+            recvd = 0
+            while len(view) > 0:
+                try:
+                    n = self._rsock.recv_into(view, len(view), *args)
+                except ssl.SSLError as err:
+                    if err.args[0] == ssl.SSL_ERROR_WANT_READ:
+                        break
+                    self._notifier.clear(self, _AsyncPoller._Read)
+                    self._read_task = self._read_result = None
+                    coro, self._read_coro = self._read_coro, None
+                    coro.throw(*sys.exc_info())
+                    return
+                except socket.error as err:
+                    if err.args[0] == EWOULDBLOCK:
+                        break
+                    self._notifier.clear(self, _AsyncPoller._Read)
+                    self._read_task = self._read_result = None
+                    coro, self._read_coro = self._read_coro, None
+                    coro.throw(*sys.exc_info())
+                    return
+                except:
+                    self._notifier.clear(self, _AsyncPoller._Read)
+                    self._read_task = self._read_result = None
+                    coro, self._read_coro = self._read_coro, None
+                    coro.throw(*sys.exc_info())
+                    return
+                if not n:
+                    # connection closed
+                    recvd = -1
+                    break
+                recvd += n
+                view = view[n:]
+            if len(view) > 0 and recvd >= 0:
+                if recvd:
+                    if self._timeout:
+                        self._notifier._del_timeout(self)
+                        self._notifier._add_timeout(self)
+                    self._read_task = partial_func(_recvall_into, self, view, *args)
+                return
+            recvd = len(self._read_result) - len(view)
+            self._notifier.clear(self, _AsyncPoller._Read)
+            self._read_task = self._read_result = None
+            coro, self._read_coro = self._read_coro, None
+            coro._proceed_(recvd)
+
+        buf = memoryview(buffer)
+        view = buf
+        if self._rbuf:
+            view = view[self._read_buffered_into(view):]
+        # receive data available now; suspend and wait for rest only
+        # if necessary
+        while len(view) > 0:
+            try:
+                recvd = self._rsock.recv_into(view, len(view), *args)
+            except ssl.SSLError as err:
+                if err.args[0] == ssl.SSL_ERROR_WANT_READ:
+                    break
+                raise
+            except socket.error as err:
+                if err.args[0] == EWOULDBLOCK:
+                    break
+                raise
+            if not recvd:
+                # connection closed
+                return len(buf) - len(view)
+            view = view[recvd:]
+        else:
+            return len(buf)
+        self._read_result = buf
+        self._read_task = partial_func(_recvall_into, self, view, *args)
+        if not self._asyncoro:
+            self._asyncoro = AsynCoro.scheduler()
+        self._read_coro = AsynCoro.cur_coro(self._asyncoro)
+        self._read_coro._await_()
+        self._notifier.add(self, _AsyncPoller._Read)
+
+    def _sync_recvall_into(self, buffer, *args):
+        """Internal use only; use 'recvall_into' instead.
+
+        Synchronous version of async_recvall_into.
+        """
+        buf = memoryview(buffer)
+        view = buf
+        if self._rbuf:
+            view = view[self._read_buffered_into(view):]
+        while len(view) > 0:
+            recvd = self._rsock.recv_into(view, len(view), *args)
+            if not recvd:
+                break
+            view = view[recvd:]
+        return len(buf) - len(view)
+
     def _async_recvfrom(self, *args):
         """Internal use only; use 'recvfrom' with 'yield' instead.
 
@@ -546,6 +1162,14 @@ class _AsyncSocket(object):
         def _recvfrom(self, *args):
             try:
                 res = self._rsock.recvfrom(*args)
+            except socket.error as err:
+                if err.args[0] == EWOULDBLOCK:
+                    pass
+                else:
+                    self._notifier.clear(self, _AsyncPoller._Read)
+                    self._read_task = None
+                    coro, self._read_coro = self._read_coro, None
+                    coro.throw(*sys.exc_info())
             except:
                 self._notifier.clear(self, _AsyncPoller._Read)
                 self._read_task = None
@@ -557,12 +1181,160 @@ class _AsyncSocket(object):
                 coro, self._read_coro = self._read_coro, None
                 coro._proceed_(res)
 
+        try:
+            res = self._rsock.recvfrom(*args)
+        except socket.error as err:
+            if err.args[0] != EWOULDBLOCK:
+                raise
+        else:
+            return res
         self._read_task = partial_func(_recvfrom, self, *args)
         if not self._asyncoro:
             self._asyncoro = AsynCoro.scheduler()
-        self._read_coro = AsynCoro.cur_coro(self._asyncoro)
-        self._read_coro._await_()
-        self._notifier.add(self, _AsyncPoller._Read)
+        self._read_coro = AsynCoro.cur_coro(self._asyncoro)
+        self._read_coro._await_()
+        self._notifier.add(self, _AsyncPoller._Read)
+
+    def _recvfrom_batch(self, max_n, bufsize):
+        """Internal use only.
+
+        Returns list of (at most 'max_n') datagrams available now, as
+        (data, address) tuples. Raises socket.error (with EWOULDBLOCK)
+        if none are available.
+        """
+        msgs = []
+        while len(msgs) < max_n:
+            try:
+                msgs.append(self._rsock.recvfrom(bufsize))
+            except socket.error as err:
+                if msgs and err.args[0] == EWOULDBLOCK:
+                    break
+                raise
+        return msgs
+
+    def _sendto_batch(self, msgs, start):
+        """Internal use only.
+
+        Sends datagrams in 'msgs' (list of (data, address) tuples)
+        from index 'start' until all are sent or socket's buffer is
+        full and returns number of datagrams sent.
+        """
+        sent = start
+        while sent < len(msgs):
+            try:
+                self._rsock.sendto(msgs[sent][0], msgs[sent][1])
+            except socket.error as err:
+                if err.args[0] == EWOULDBLOCK:
+                    break
+                raise
+            sent += 1
+        return sent - start
+
+    def _async_recvfrom_many(self, max_n, bufsize):
+        """Internal use only; use 'recvfrom_many' with 'yield' instead.
+
+        Returns list of (at most 'max_n') datagrams, each of (at most)
+        'bufsize' bytes, as (data, address) tuples. All datagrams
+        available are returned with one notification. If no datagrams
+        are available, waits until at least one is received.
+        """
+        def _recvfrom_many(self, max_n, bufsize):
+            try:
+                msgs = self._recvfrom_batch(max_n, bufsize)
+            except socket.error as err:
+                if err.args[0] == EWOULDBLOCK:
+                    pass
+                else:
+                    self._notifier.clear(self, _AsyncPoller._Read)
+                    self._read_task = None
+                    coro, self._read_coro = self._read_coro, None
+                    coro.throw(*sys.exc_info())
+            except:
+                self._notifier.clear(self, _AsyncPoller._Read)
+                self._read_task = None
+                coro, self._read_coro = self._read_coro, None
+                coro.throw(*sys.exc_info())
+            else:
+                self._notifier.clear(self, _AsyncPoller._Read)
+                self._read_task = None
+                coro, self._read_coro = self._read_coro, None
+                coro._proceed_(msgs)
+
+        try:
+            msgs = self._recvfrom_batch(max_n, bufsize)
+        except socket.error as err:
+            if err.args[0] != EWOULDBLOCK:
+                raise
+        else:
+            return msgs
+        self._read_task = partial_func(_recvfrom_many, self, max_n, bufsize)
+        if not self._asyncoro:
+            self._asyncoro = AsynCoro.scheduler()
+        self._read_coro = AsynCoro.cur_coro(self._asyncoro)
+        self._read_coro._await_()
+        self._notifier.add(self, _AsyncPoller._Read)
+
+    def _sync_recvfrom_many(self, max_n, bufsize):
+        """Internal use only; use 'recvfrom_many' instead.
+
+        Synchronous version of async_recvfrom_many.
+        """
+        msgs = [self._rsock.recvfrom(bufsize)]
+        if hasattr(socket, 'MSG_DONTWAIT'):
+            while len(msgs) < max_n:
+                try:
+                    msgs.append(self._rsock.recvfrom(bufsize, socket.MSG_DONTWAIT))
+                except socket.error as err:
+                    if err.args[0] == EWOULDBLOCK:
+                        break
+                    raise
+        return msgs
+
+    def _async_sendto_many(self, msgs):
+        """Internal use only; use 'sendto_many' with 'yield' instead.
+
+        Sends datagrams in 'msgs' (list of (data, address) tuples) and
+        returns number of datagrams sent. Datagrams are sent with as
+        few notifications as possible. If socket's timeout is set and
+        it expires before all datagrams could be sent, it returns
+        number of datagrams sent if any have been sent.
+        """
+        def _sendto_many(self, msgs):
+            try:
+                self._write_result += self._sendto_batch(msgs, self._write_result)
+            except:
+                self._notifier.clear(self, _AsyncPoller._Write)
+                self._write_task = self._write_result = None
+                coro, self._write_coro = self._write_coro, None
+                coro.throw(*sys.exc_info())
+                return
+            if self._write_result == len(msgs):
+                self._notifier.clear(self, _AsyncPoller._Write)
+                self._write_task = self._write_result = None
+                coro, self._write_coro = self._write_coro, None
+                coro._proceed_(len(msgs))
+
+        # send as many as possible now; suspend and wait to send rest
+        # only if necessary
+        sent = self._sendto_batch(msgs, 0)
+        if sent == len(msgs):
+            return sent
+        self._write_result = sent
+        self._write_task = partial_func(_sendto_many, self, msgs)
+        if not self._asyncoro:
+            self._asyncoro = AsynCoro.scheduler()
+        self._write_coro = AsynCoro.cur_coro(self._asyncoro)
+        self._write_coro._await_()
+        self._notifier.add(self, _AsyncPoller._Write)
+
+    def _sync_sendto_many(self, msgs):
+        """Internal use only; use 'sendto_many' instead.
+
+        Synchronous version of async_sendto_many.
+        """
+        for data, addr in msgs:
+            self._rsock.sendto(data, addr)
+        return len(msgs)
 
     def _async_send(self, *args):
         """Internal use only; use 'send' with 'yield' instead.
@@ -580,6 +1352,14 @@ class _AsyncSocket(object):
                     self._write_task = None
                     coro, self._write_coro = self._write_coro, None
                     coro.throw(*sys.exc_info())
+            except socket.error as err:
+                if err.args[0] == EWOULDBLOCK:
+                    pass
+                else:
+                    self._notifier.clear(self, _AsyncPoller._Write)
+                    self._write_task = None
+                    coro, self._write_coro = self._write_coro, None
+                    coro.throw(*sys.exc_info())
             except:
                 self._notifier.clear(self, _AsyncPoller._Write)
                 self._write_task = None
@@ -591,6 +1371,18 @@ class _AsyncSocket(object):
                 coro, self._write_coro = self._write_coro, None
                 coro._proceed_(sent)
 
+        # try to send first; suspend and wait only if socket's buffer
+        # is full
+        try:
+            sent = self._rsock.send(*args)
+        except ssl.SSLError as err:
+            if err.args[0] != ssl.SSL_ERROR_WANT_WRITE:
+                raise
+        except socket.error as err:
+            if err.args[0] != EWOULDBLOCK:
+                raise
+        else:
+            return sent
         self._write_task = partial_func(_send, self, *args)
         if not self._asyncoro:
             self._asyncoro = AsynCoro.scheduler()
@@ -606,6 +1398,14 @@ class _AsyncSocket(object):
         def _sendto(self, *args):
             try:
                 sent = self._rsock.sendto(*args)
+            except socket.error as err:
+                if err.args[0] == EWOULDBLOCK:
+                    pass
+                else:
+                    self._notifier.clear(self, _AsyncPoller._Write)
+                    self._write_task = None
+                    coro, self._write_coro = self._write_coro, None
+                    coro.throw(*sys.exc_info())
             except:
                 self._notifier.clear(self, _AsyncPoller._Write)
                 self._write_task = None
@@ -617,6 +1417,13 @@ class _AsyncSocket(object):
                 coro, self._write_coro = self._write_coro, None
                 coro._proceed_(sent)
 
+        try:
+            sent = self._rsock.sendto(*args)
+        except socket.error as err:
+            if err.args[0] != EWOULDBLOCK:
+                raise
+        else:
+            return sent
         self._write_task = partial_func(_sendto, self, *args)
         if not self._asyncoro:
             self._asyncoro = AsynCoro.scheduler()
@@ -634,39 +1441,60 @@ class _AsyncSocket(object):
         'socket.timeout' exception to be thrown.
         """
         def _sendall(self, data_len):
-            try:
-                sent = self._rsock.send(self._write_result)
-                if sent < 0:
+            # send until done or socket's buffer is full (needed with
+            # edge-triggered notifications)
+            while len(self._write_result) > 0:
+                try:
+                    sent = self._rsock.send(self._write_result)
+                except ssl.SSLError as err:
+                    if err.args[0] == ssl.SSL_ERROR_WANT_WRITE:
+                        return
                     self._notifier.clear(self, _AsyncPoller._Write)
                     self._write_task = self._write_result = None
                     coro, self._write_coro = self._write_coro, None
                     coro.throw(*sys.exc_info())
-            except ssl.SSLError as err:
-                if err.args[0] == ssl.SSL_ERROR_WANT_WRITE:
-                    pass
-                else:
+                    return
+                except socket.error as err:
+                    if err.args[0] == EWOULDBLOCK:
+                        return
                     self._notifier.clear(self, _AsyncPoller._Write)
                     self._write_task = self._write_result = None
                     coro, self._write_coro = self._write_coro, None
                     coro.throw(*sys.exc_info())
-            except:
-                self._notifier.clear(self, _AsyncPoller._Write)
-                self._write_task = self._write_result = None
-                coro, self._write_coro = self._write_coro, None
-                coro.throw(*sys.exc_info())
-            else:
-                if sent > 0:
-                    self._write_result = self._write_result[sent:]
-                    if len(self._write_result) == 0:
-                        self._notifier.clear(self, _AsyncPoller._Write)
-                        self._write_task = self._write_result = None
-                        coro, self._write_coro = self._write_coro, None
-                        coro._proceed_(None)
-                    # elif self._timeout:
-                    #     self._notifier._del_timeout(self)
-                    #     self._notifier._add_timeout(self)
+                    return
+                except:
+                    self._notifier.clear(self, _AsyncPoller._Write)
+                    self._write_task = self._write_result = None
+                    coro, self._write_coro = self._write_coro, None
+                    coro.throw(*sys.exc_info())
+                    return
+                self._write_result = buffer(self._write_result, sent)
+                # if self._timeout:
+                #     self._notifier._del_timeout(self)
+                #     self._notifier._add_timeout(self)
+            self._notifier.clear(self, _AsyncPoller._Write)
+            self._write_task = self._write_result = None
+            coro, self._write_coro = self._write_coro, None
+            coro._proceed_(None)
 
-        self._write_result = buffer(data)
+        # send as much as possible now; suspend and wait to send rest
+        # only if necessary
+        buf = buffer(data)
+        while len(buf) > 0:
+            try:
+                sent = self._rsock.send(buf)
+            except ssl.SSLError as err:
+                if err.args[0] == ssl.SSL_ERROR_WANT_WRITE:
+                    break
+                raise
+            except socket.error as err:
+                if err.args[0] == EWOULDBLOCK:
+                    break
+                raise
+            buf = buffer(buf, sent)
+        else:
+            return None
+        self._write_result = buf
         self._write_task = partial_func(_sendall, self, len(data))
         if not self._asyncoro:
             self._asyncoro = AsynCoro.scheduler()
@@ -685,9 +1513,114 @@ class _AsyncSocket(object):
             sent = self._rsock.send(buf)
             if sent < 0:
                 raise socket.error('hangup')
-            buf = buf[sent:]
+            buf = buffer(buf, sent)
+        return None
+
+    def _join_buffers(self, buffers):
+        """Internal use only.
+
+        As there is no 'sendmsg' (scatter/gather I/O) with Python 2,
+        adjacent buffers smaller than _JoinSize are joined (so, e.g.,
+        message header is not sent by itself), and bigger buffers are
+        sent as they are (without copying).
+        """
+        data = None
+        for buf in buffers:
+            if len(buf) < AsyncSocket._JoinSize:
+                if data is None:
+                    data = bytearray(buf)
+                else:
+                    data += buf
+                continue
+            if data is not None:
+                yield data
+                data = None
+            yield buf
+        if data is not None:
+            yield data
+
+    def _async_sendall_vec(self, buffers):
+        """Internal use only; use 'sendall_vec' with 'yield' instead.
+
+        Sends all data in 'buffers' (list of strings or buffers). If
+        socket's timeout is set and it expires before all the data
+        could be sent, it returns the length of data sent if any data
+        is sent (as 'sendall').
+        """
+        sent = 0
+        for data in self._join_buffers(buffers):
+            try:
+                n = yield self.sendall(data)
+            except socket.timeout:
+                if sent:
+                    raise StopIteration(sent)
+                raise
+            if n is not None:
+                raise StopIteration(sent + n)
+            sent += len(data)
+        raise StopIteration(None)
+
+    def _sync_sendall_vec(self, buffers):
+        """Internal use only; use 'sendall_vec' instead.
+
+        Synchronous version of async_sendall_vec.
+        """
+        for data in self._join_buffers(buffers):
+            self._sync_sendall(data)
         return None
 
+    def _async_sendfile(self, file, offset=0, count=None):
+        """Internal use only; use 'sendfile' with 'yield' instead.
+
+        Sends 'count' bytes (or until end of file if 'count' is None)
+        from 'file' (opened in binary mode), starting at 'offset'. As
+        there is no 'os.sendfile' with Python 2, file is read and sent
+        _FileChunk bytes at a time. Returns number of bytes sent. If
+        socket's timeout is set and it expires before all the data
+        could be sent, it returns the number of bytes sent if any data
+        is sent (as 'sendall'). File's position is set to end of data
+        sent.
+        """
+        file.seek(offset)
+        sent = 0
+        while count is None or sent < count:
+            if count is None:
+                data = file.read(AsyncSocket._FileChunk)
+            else:
+                data = file.read(min(count - sent, AsyncSocket._FileChunk))
+            if not data:
+                break
+            try:
+                n = yield self.sendall(data)
+            except socket.timeout:
+                if sent:
+                    break
+                raise
+            if n is not None:
+                sent += n
+                break
+            sent += len(data)
+        file.seek(offset + sent)
+        raise StopIteration(sent)
+
+    def _sync_sendfile(self, file, offset=0, count=None):
+        """Internal use only; use 'sendfile' instead.
+
+        Synchronous version of async_sendfile.
+        """
+        file.seek(offset)
+        sent = 0
+        while count is None or sent < count:
+            if count is None:
+                data = file.read(AsyncSocket._FileChunk)
+            else:
+                data = file.read(min(count - sent, AsyncSocket._FileChunk))
+            if not data:
+                break
+            self._sync_sendall(data)
+            sent += len(data)
+        return sent
+
     def _async_accept(self):
         """Internal use only; use 'accept' with 'yield' instead.
 
@@ -695,16 +1628,22 @@ class _AsyncSocket(object):
         returned pair is asynchronous socket (instance of
         AsyncSocket with blocking=False).
         """
-        def _accept(self):
-            conn, addr = self._rsock.accept()
+        def _accept(self, conn=None, addr=None):
+            if not conn:
+                try:
+                    conn, addr = self._rsock.accept()
+                except socket.error as err:
+                    if err.args[0] == EWOULDBLOCK:
+                        return
+                    raise
             self._read_task = None
             self._notifier.clear(self, _AsyncPoller._Read)
 
             if self._certfile:
-                if not self.ssl_server_ctx and hasattr(ssl, 'create_default_context'):
-                    self.ssl_server_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-                    self.ssl_server_ctx.load_cert_chain(certfile=self._certfile,
-                                                        keyfile=self._keyfile)
+                if not self.ssl_server_ctx:
+                    self.ssl_server_ctx = _ssl_contexts.context(True, certfile=self._certfile,
+                                                                keyfile=self._keyfile,
+                                                                ssl_version=self._ssl_version)
 
                 def _ssl_handshake(conn, addr):
                     try:
@@ -729,6 +1668,7 @@ class _AsyncSocket(object):
                         conn._read_task = conn._write_task = None
                         coro, conn._read_coro = conn._read_coro, None
                         conn._notifier.clear(conn, _AsyncPoller._Read | _AsyncPoller._Write)
+                        _ssl_contexts.handshake_done(conn._rsock)
                         coro._proceed_((conn, addr))
                 conn = AsyncSocket(conn, blocking=False, keyfile=self._keyfile,
                                    certfile=self._certfile, ssl_version=self._ssl_version)
@@ -758,13 +1698,109 @@ class _AsyncSocket(object):
                 conn = AsyncSocket(conn, blocking=False)
                 coro._proceed_((conn, addr))
 
+        # accept pending connection, if any, first
+        try:
+            conn, addr = self._rsock.accept()
+        except socket.error as err:
+            if err.args[0] != EWOULDBLOCK:
+                raise
+            conn = None
+        else:
+            if not self._certfile:
+                return (AsyncSocket(conn, blocking=False), addr)
         self._read_task = partial_func(_accept, self)
         if not self._asyncoro:
             self._asyncoro = AsynCoro.scheduler()
         self._read_coro = AsynCoro.cur_coro(self._asyncoro)
         self._read_coro._await_()
+        if conn:
+            # complete SSL handshake asynchronously
+            _accept(self, conn, addr)
+        else:
+            self._notifier.add(self, _AsyncPoller._Read)
+
+    def _accept_batch(self, max_n):
+        """Internal use only.
+
+        Returns list of (at most 'max_n' if it is not 0) pending
+        connections, as (socket, address) tuples. Raises socket.error
+        (with EWOULDBLOCK) if there are no pending connections.
+        """
+        conns = []
+        while not max_n or len(conns) < max_n:
+            try:
+                conn, addr = self._rsock.accept()
+            except socket.error:
+                if conns:
+                    break
+                raise
+            conns.append((AsyncSocket(conn, blocking=False), addr))
+        return conns
+
+    def _async_accept_many(self, max_n=0):
+        """Internal use only; use 'accept_many' with 'yield' instead.
+
+        Returns list of connections, as (AsyncSocket, address) pairs,
+        pending in listen backlog (at most 'max_n' connections if it
+        is not 0), so connection storms are handled with one
+        notification. If there are no pending connections, waits
+        until at least one is accepted. With SSL, connections are
+        accepted (with handshake) one at a time.
+        """
+        def _accept_many(self, max_n):
+            try:
+                conns = self._accept_batch(max_n)
+            except socket.error as err:
+                if err.args[0] == EWOULDBLOCK:
+                    pass
+                else:
+                    self._notifier.clear(self, _AsyncPoller._Read)
+                    self._read_task = None
+                    coro, self._read_coro = self._read_coro, None
+                    coro.throw(*sys.exc_info())
+            except:
+                self._notifier.clear(self, _AsyncPoller._Read)
+                self._read_task = None
+                coro, self._read_coro = self._read_coro, None
+                coro.throw(*sys.exc_info())
+            else:
+                self._notifier.clear(self, _AsyncPoller._Read)
+                self._read_task = None
+                coro, self._read_coro = self._read_coro, None
+                coro._proceed_(conns)
+
+        if self._certfile:
+            return self._async_accept_one()
+        try:
+            conns = self._accept_batch(max_n)
+        except socket.error as err:
+            if err.args[0] != EWOULDBLOCK:
+                raise
+        else:
+            return conns
+        self._read_task = partial_func(_accept_many, self, max_n)
+        if not self._asyncoro:
+            self._asyncoro = AsynCoro.scheduler()
+        self._read_coro = AsynCoro.cur_coro(self._asyncoro)
+        self._read_coro._await_()
         self._notifier.add(self, _AsyncPoller._Read)
 
+    def _async_accept_one(self):
+        """Internal use only.
+
+        Version of async_accept_many for SSL sockets.
+        """
+        conn = yield self.accept()
+        raise StopIteration([conn])
+
+    def _sync_accept_many(self, max_n=0):
+        """Internal use only; use 'accept_many' instead.
+
+        Synchronous version of async_accept_many; returns list with
+        one connection.
+        """
+        return [self._rsock.accept()]
+
     def _async_connect(self, *args):
         """Internal use only; use 'connect' with 'yield' instead.
 
@@ -802,14 +1838,25 @@ class _AsyncSocket(object):
                         self._read_task = self._write_task = None
                         coro, self._write_coro = self._write_coro, None
                         self._read_coro = None
+                        _ssl_contexts.handshake_done(self._rsock)
+                        self._ssl_peer = args[0]
+                        _ssl_contexts.save(self._rsock, self._ssl_peer)
                         coro._proceed_(0)
 
                 try:
                     # TODO: provide 'ca_certs' as special parameter to 'accept'?
                     # For now this setup wrks for self-signed certs
-                    self._rsock = ssl.wrap_socket(self._rsock, ca_certs=self._certfile,
-                                                  cert_reqs=ssl.CERT_REQUIRED, server_side=False,
-                                                  do_handshake_on_connect=False)
+                    ctx = _ssl_contexts.context(False, ca_certs=self._certfile,
+                                                ssl_version=self._ssl_version)
+                    if ctx:
+                        self._rsock = ctx.wrap_socket(self._rsock, server_side=False,
+                                                      do_handshake_on_connect=False)
+                        _ssl_contexts.resume(self._rsock, args[0])
+                    else:
+                        self._rsock = ssl.wrap_socket(self._rsock, ca_certs=self._certfile,
+                                                      cert_reqs=ssl.CERT_REQUIRED,
+                                                      server_side=False,
+                                                      do_handshake_on_connect=False)
                 except:
                     coro, self._write_coro = self._write_coro, None
                     self.close()
@@ -825,12 +1872,8 @@ class _AsyncSocket(object):
                 self._notifier.clear(self, _AsyncPoller._Write)
                 coro._proceed_(0)
 
-        self._write_task = partial_func(_connect, self, *args)
-        if not self._asyncoro:
-            self._asyncoro = AsynCoro.scheduler()
-        self._write_coro = AsynCoro.cur_coro(self._asyncoro)
-        self._write_coro._await_()
-        self._notifier.add(self, _AsyncPoller._Write)
+        # initiate connection before registering for notifications, as
+        # unconnected sockets are reported as writable
         try:
             self._rsock.connect(*args)
         except socket.error as e:
@@ -838,6 +1881,12 @@ class _AsyncSocket(object):
                 pass
             else:
                 raise
+        self._write_task = partial_func(_connect, self, *args)
+        if not self._asyncoro:
+            self._asyncoro = AsynCoro.scheduler()
+        self._write_coro = AsynCoro.cur_coro(self._asyncoro)
+        self._write_coro._await_()
+        self._notifier.add(self, _AsyncPoller._Write)
 
     def _async_send_msg(self, data):
         """Internal use only; use 'send_msg' with 'yield' instead.
@@ -845,44 +1894,106 @@ class _AsyncSocket(object):
         Messages are tagged with length of the data, so on the
         receiving side, recv_msg knows how much data to receive.
         """
-        yield self.sendall(struct.pack('>L', len(data)) + data)
+        yield self.sendall_vec([struct.pack('>L', len(data)), data])
 
     def _sync_send_msg(self, data):
         """Internal use only; use 'send_msg' instead.
 
         Synchronous version of async_send_msg.
         """
-        return self._sync_sendall(struct.pack('>L', len(data)) + data)
+        return self._sync_sendall_vec([struct.pack('>L', len(data)), data])
+
+    def _buffered_msgs(self, max_n):
+        """Internal use only.
+
+        Returns list of complete messages (at most 'max_n' messages if
+        it is not 0) in data read ahead.
+        """
+        msgs = []
+        rbuf = self._rbuf
+        if not rbuf:
+            return msgs
+        n = AsyncSocket._MsgLengthSize
+        start, end = 0, len(rbuf)
+        while (end - start) >= n:
+            size = struct.unpack_from('>L', rbuf, start)[0]
+            if (end - start - n) < size:
+                break
+            start += n
+            msgs.append(str(rbuf[start:start + size]))
+            start += size
+            if len(msgs) == max_n:
+                break
+        if start:
+            del rbuf[:start]
+        return msgs
 
     def _async_recv_msg(self):
         """Internal use only; use 'recv_msg' with 'yield' instead.
 
         Message is tagged with length of the payload (data). This
         method receives length of payload, then the payload and
-        returns the payload.
+        returns the payload. Data is read ahead (up to _ReadAhead
+        bytes at a time), so messages received with one read are
+        returned without reading from socket again.
         """
-        n = AsyncSocket._MsgLengthSize
-        try:
-            data = yield self.recvall(n)
-        except socket.error as err:
-            if err.args[0] == 'hangup':
+        msgs = self._buffered_msgs(1)
+        if not msgs:
+            msgs = yield self._async_recv_msgs(1)
+            if not msgs:
                 raise StopIteration('')
-            else:
-                raise
-        if len(data) != n:
-            raise StopIteration('')
-        n = struct.unpack('>L', data)[0]
-        # assert n >= 0
+        raise StopIteration(msgs[0])
+
+    def _async_recv_msgs(self, max_n=0):
+        """Internal use only; use 'recv_msgs' with 'yield' instead.
+
+        Returns list of messages (as sent with 'send_msg') that have
+        been received, at most 'max_n' messages if it is not 0. If no
+        messages are available, waits until at least one message is
+        received. If connection is closed, returns empty list.
+        """
+        msgs = self._buffered_msgs(max_n)
+        if msgs:
+            raise StopIteration(msgs)
+        n = AsyncSocket._MsgLengthSize
+        rbuf = self._rbuf
+        if rbuf is None:
+            rbuf = bytearray()
+        # recv_into and recvall_into below shouldn't return data read
+        # ahead
+        self._rbuf = None
+        # read ahead into buffer from pool, instead of allocating
+        # new buffer for each read
+        buf = _buffer_pool.get(AsyncSocket._ReadAhead)
         try:
-            data = yield self.recvall(n)
+            while True:
+                if len(rbuf) >= n:
+                    need = n + struct.unpack_from('>L', rbuf)[0] - len(rbuf)
+                    if need <= 0:
+                        break
+                    if need > AsyncSocket._ReadAhead:
+                        # receive rest of large message directly into
+                        # message's buffer
+                        data = bytearray(len(rbuf) - n + need)
+                        view = memoryview(data)
+                        view[:len(rbuf) - n] = str(rbuf[n:])
+                        recvd = yield self.recvall_into(view[len(rbuf) - n:])
+                        if recvd != need:
+                            raise StopIteration([])
+                        del rbuf[:]
+                        raise StopIteration([str(data)])
+                recvd = yield self.recv_into(buf, AsyncSocket._ReadAhead)
+                if not recvd:
+                    raise StopIteration([])
+                rbuf += buffer(buf, 0, recvd)
         except socket.error as err:
             if err.args[0] == 'hangup':
-                raise StopIteration('')
-            else:
-                raise
-        if len(data) != n:
-            raise StopIteration('')
-        raise StopIteration(data)
+                raise StopIteration([])
+            raise
+        finally:
+            _buffer_pool.put(buf)
+            self._rbuf = rbuf
+        raise StopIteration(self._buffered_msgs(max_n))
 
     def _sync_recv_msg(self):
         """Internal use only; use 'recv_msg' instead.
@@ -912,6 +2023,18 @@ class _AsyncSocket(object):
             return ''
         return data
 
+    def _sync_recv_msgs(self, max_n=0):
+        """Internal use only; use 'recv_msgs' instead.
+
+        Synchronous version of async_recv_msgs.
+        """
+        msgs = self._buffered_msgs(max_n)
+        if not msgs:
+            msg = self._sync_recv_msg()
+            if msg:
+                msgs.append(msg)
+        return msgs
+
     def create_connection(self, host_port, timeout=None, source_address=None):
         if timeout is not None:
             self.settimeout(timeout)
@@ -1163,7 +2286,7 @@ if platform.system() == 'Windows':
                 self._poller_name = 'IOCP'
                 self.iocp = win32file.CreateIoCompletionPort(win32file.INVALID_HANDLE_VALUE,
                                                              None, 0, 0)
-                self._timeouts = []
+                self._timers = _TimerWheel()
                 self.async_poller = _AsyncPoller(self)
                 self.cmd_rsock, self.cmd_wsock = _AsyncPoller._socketpair()
                 self.cmd_wsock.setblocking(0)
@@ -1205,8 +2328,8 @@ if platform.system() == 'Windows':
             def poll(self):
                 while 1:
                     self._lock.acquire()
-                    if self._timeouts:
-                        timeout = self._timeouts[0][0] - _time()
+                    if self._timers:
+                        timeout = self._timers.next_expiry() - _time()
                         if timeout < 0.0001:
                             timeout = 0
                         else:
@@ -1234,21 +2357,18 @@ if platform.system() == 'Windows':
                         err, n, key, overlap = win32file.GetQueuedCompletionStatus(self.iocp, 0)
 
                     self._lock.acquire()
-                    if self._timeouts:
-                        now = _time() + 0.0001
-                        while self._timeouts and self._timeouts[0][0] <= now:
-                            fd_timeout, fd = self._timeouts.pop(0)
-                            if fd._timeout_id == fd_timeout:
-                                fd._timeout_id = None
-                                fd._timed_out()
+                    if self._timers:
+                        for fd in self._timers.expire(_time()):
+                            fd._timeout_id = None
+                            fd._timed_out()
                     self._lock.release()
 
             def _add_timeout(self, fd):
                 if fd._timeout:
                     self._lock.acquire()
-                    fd._timeout_id = _time() + fd._timeout
-                    i = bisect_left(self._timeouts, (fd._timeout_id, fd))
-                    self._timeouts.insert(i, (fd._timeout_id, fd))
+                    if fd._timeout_id:
+                        self._timers.cancel(fd._timeout_id)
+                    fd._timeout_id = self._timers.add(_time() + fd._timeout, fd)
                     if self._polling:
                         self._interrupt()
                     self._lock.release()
@@ -1258,17 +2378,8 @@ if platform.system() == 'Windows':
             def _del_timeout(self, fd):
                 if fd._timeout_id:
                     self._lock.acquire()
-                    i = bisect_left(self._timeouts, (fd._timeout_id, fd))
-                    while i < len(self._timeouts):
-                        if self._timeouts[i] == (fd._timeout_id, fd):
-                            del self._timeouts[i]
-                            fd._timeout_id = None
-                            break
-                        if fd._timeout_id != self._timeouts[i][0]:
-                            logger.warning('fd %s with %s is not found',
-                                           fd._fileno, fd._timeout_id)
-                            break
-                        i += 1
+                    self._timers.cancel(fd._timeout_id)
+                    fd._timeout_id = None
                     if self._polling:
                         self._interrupt()
                     self._lock.release()
@@ -1282,7 +2393,7 @@ if platform.system() == 'Windows':
                     iocp, self.iocp = self.iocp, None
                     win32file.CloseHandle(iocp)
                     self.poll_thread.join(0.2)
-                    self._timeouts = []
+                    self._timers = _TimerWheel()
                     self.cmd_rsock = self.cmd_wsock = None
                     self.__class__._instance = None
 
@@ -1360,11 +2471,14 @@ if platform.system() == 'Windows':
                 _AsyncSocket.setblocking(self, blocking)
                 if not self._blocking and self._rsock.type & socket.SOCK_STREAM:
                     self.recv = self._iocp_recv
+                    self.recv_into = self._iocp_recv_into
                     self.send = self._iocp_send
                     self.recvall = self._iocp_recvall
+                    self.recvall_into = self._iocp_recvall_into
                     self.sendall = self._iocp_sendall
                     self.connect = self._iocp_connect
                     self.accept = self._iocp_accept
+                    self.accept_many = self._iocp_accept_many
 
             def _iocp_recv(self, bufsize, *args):
                 """Internal use only; use 'recv' with 'yield' instead.
@@ -1392,6 +2506,8 @@ if platform.system() == 'Windows':
                         if coro:
                             coro._proceed_(buf)
 
+                if self._rbuf:
+                    return self._read_buffered(bufsize)
                 self._read_result = win32file.AllocateReadBuffer(bufsize)
                 self._read_overlap.object = partial_func(_recv, self)
                 if not self._asyncoro:
@@ -1482,6 +2598,13 @@ if platform.system() == 'Windows':
                                     coro.throw(socket.error(err))
 
                 self._read_result = []
+                if self._rbuf:
+                    buf = self._read_buffered(bufsize)
+                    if len(buf) == bufsize:
+                        self._read_result = None
+                        return buf
+                    self._read_result.append(buf)
+                    bufsize -= len(buf)
                 buf = win32file.AllocateReadBuffer(min(bufsize, 1048576))
                 self._read_overlap.object = partial_func(_recvall, self, bufsize, buf)
                 if not self._asyncoro:
@@ -1495,6 +2618,26 @@ if platform.system() == 'Windows':
                     self._read_overlap.object = self._read_result = self._read_coro = None
                     raise socket.error(err)
 
+            def _iocp_recv_into(self, buffer, nbytes=0, *args):
+                """Internal use only; use 'recv_into' with 'yield' instead.
+
+                Data is received with 'recv' and copied into 'buffer'.
+                """
+                view = memoryview(buffer)
+                data = yield self._iocp_recv(nbytes or len(view))
+                view[:len(data)] = data
+                raise StopIteration(len(data))
+
+            def _iocp_recvall_into(self, buffer, *args):
+                """Internal use only; use 'recvall_into' with 'yield' instead.
+
+                Data is received with 'recvall' and copied into 'buffer'.
+                """
+                view = memoryview(buffer)
+                data = yield self._iocp_recvall(len(view))
+                view[:len(data)] = data
+                raise StopIteration(len(data))
+
             def _iocp_sendall(self, data):
                 """Internal use only; use 'sendall' with 'yield' instead.
                 """
@@ -1578,6 +2721,9 @@ if platform.system() == 'Windows':
                                 self._notifier._del_timeout(self)
                             self._read_overlap.object = self._read_result = None
                             coro, self._read_coro = self._read_coro, None
+                            _ssl_contexts.handshake_done(self._rsock)
+                            self._ssl_peer = host_port
+                            _ssl_contexts.save(self._rsock, self._ssl_peer)
                             if coro:
                                 coro._proceed_(0)
 
@@ -1595,10 +2741,18 @@ if platform.system() == 'Windows':
                         self._rsock.setsockopt(socket.SOL_SOCKET,
                                                win32file.SO_UPDATE_CONNECT_CONTEXT, '')
                         if self._certfile:
-                            self._rsock = ssl.wrap_socket(self._rsock, ca_certs=self._certfile,
-                                                          cert_reqs=ssl.CERT_REQUIRED,
-                                                          server_side=False,
-                                                          do_handshake_on_connect=False)
+                            ctx = _ssl_contexts.context(False, ca_certs=self._certfile,
+                                                        ssl_version=self._ssl_version)
+                            if ctx:
+                                self._rsock = ctx.wrap_socket(self._rsock, server_side=False,
+                                                              do_handshake_on_connect=False)
+                                _ssl_contexts.resume(self._rsock, host_port)
+                            else:
+                                self._rsock = ssl.wrap_socket(self._rsock,
+                                                              ca_certs=self._certfile,
+                                                              cert_reqs=ssl.CERT_REQUIRED,
+                                                              server_side=False,
+                                                              do_handshake_on_connect=False)
                             self._read_result = win32file.AllocateReadBuffer(0)
                             self._read_overlap.object = partial_func(_ssl_handshake, self)
                             self._read_overlap.object(None, 0)
@@ -1628,6 +2782,14 @@ if platform.system() == 'Windows':
                     self._read_overlap.object = self._read_result = self._read_coro = None
                     raise socket.error(err)
 
+            def _iocp_accept_many(self, max_n=0):
+                """Internal use only; use 'accept_many' with 'yield' instead.
+
+                With IOCP, connections are accepted one at a time.
+                """
+                conn = yield self._iocp_accept()
+                raise StopIteration([conn])
+
             def _iocp_accept(self):
                 """Internal use only; use 'accept' with 'yield'
                 instead. Socket in returned pair is asynchronous
@@ -1664,6 +2826,7 @@ if platform.system() == 'Windows':
                                 self._notifier._del_timeout(self)
                             self._read_overlap.object = self._read_result = None
                             coro, self._read_coro = self._read_coro, None
+                            _ssl_contexts.handshake_done(conn._rsock)
                             if coro:
                                 coro._proceed_((conn, addr))
 
@@ -1680,10 +2843,10 @@ if platform.system() == 'Windows':
                         conn._rsock.setsockopt(socket.SOL_SOCKET, win32file.SO_UPDATE_ACCEPT_CONTEXT,
                                                struct.pack('P', self._fileno))
                         if self._certfile:
-                            if not self.ssl_server_ctx and hasattr(ssl, 'create_default_context'):
-                                self.ssl_server_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-                                self.ssl_server_ctx.load_cert_chain(certfile=self._certfile,
-                                                                    keyfile=self._keyfile)
+                            if not self.ssl_server_ctx:
+                                self.ssl_server_ctx = _ssl_contexts.context(
+                                    True, certfile=self._certfile, keyfile=self._keyfile,
+                                    ssl_version=self._ssl_version)
 
                             if self.ssl_server_ctx:
                                 conn._rsock = self.ssl_server_ctx.wrap_socket(
@@ -1746,6 +2909,7 @@ if not hasattr(sys.modules[__name__], '_AsyncNotifier'):
         _Error = None
 
         _Block = None
+        _Edge = None
 
         def __init__(self):
             self.__class__._instance = self
@@ -1759,6 +2923,8 @@ if not hasattr(sys.modules[__name__], '_AsyncNotifier'):
                 _AsyncPoller._Hangup = select.EPOLLHUP
                 _AsyncPoller._Error = select.EPOLLERR
                 _AsyncPoller._Block = -1
+                _AsyncPoller._Edge = (select.EPOLLIN | select.EPOLLPRI | select.EPOLLOUT |
+                                      select.EPOLLET)
             elif hasattr(select, 'kqueue'):
                 self._poller_name = 'kqueue'
                 self._poller = _KQueueNotifier()
@@ -1798,14 +2964,24 @@ if not hasattr(sys.modules[__name__], '_AsyncNotifier'):
 
             self._fds = {}
             self._events = {}
-            self._timeouts = []
+            # with edge-triggered notifications, readiness of sockets
+            # (that is not consumed yet)
+            self._ready = {}
+            self._edge_triggered = False
+            self._timers = _TimerWheel()
             self._lock = threading.RLock()
             self._polling = False
             self._run = True
             self.cmd_read, self.cmd_write = _AsyncPoller._cmd_read_write_fds()
-            self.poll_thread = threading.Thread(target=self.poll)
-            self.poll_thread.daemon = True
-            self.poll_thread.start()
+            if hasattr(self.cmd_write, 'getsockname'):
+                self.cmd_read = AsyncSocket(self.cmd_read)
+                self.cmd_read._read_task = lambda: self.cmd_read._rsock.recv(128)
+                self._interrupt = lambda: self.cmd_write.send('I')
+            else:
+                self._interrupt = lambda: os.write(self.cmd_write._fileno, 'I')
+            self.add(self.cmd_read, _AsyncPoller._Read)
+            self.poll_thread = None
+            self._start_poll_thread()
 
         @classmethod
         def instance(cls):
@@ -1815,68 +2991,91 @@ if not hasattr(sys.modules[__name__], '_AsyncNotifier'):
             return cls._instance
 
         def poll(self):
-            if hasattr(self.cmd_write, 'getsockname'):
-                self.cmd_read = AsyncSocket(self.cmd_read)
-                self.cmd_read._read_task = lambda: self.cmd_read._rsock.recv(128)
-                self._interrupt = lambda: self.cmd_write.send('I')
-            else:
-                self._interrupt = lambda: os.write(self.cmd_write._fileno, 'I')
-            self.add(self.cmd_read, _AsyncPoller._Read)
-            while self._run:
-                self._lock.acquire()
-                if self._timeouts:
-                    timeout = self._timeouts[0][0] - _time()
-                    if timeout < 0.0001:
-                        timeout = 0
-                else:
-                    timeout = _AsyncPoller._Block
-                self._polling = True
-                self._lock.release()
-                try:
-                    events = self._poller.poll(timeout)
-                except:
-                    logger.debug(traceback.format_exc())
-                    # prevent tight loops
-                    time.sleep(5)
-                    continue
-                self._lock.acquire()
-                self._polling = False
-                try:
-                    for fileno, event in events:
-                        fd = self._fds.get(fileno, None)
-                        if not fd:
-                            if not (event & _AsyncPoller._Hangup):
-                                logger.debug('invalid fd %s for event %s', fileno, event)
-                            continue
-                        if event & _AsyncPoller._Read:
-                            if fd._read_task:
-                                fd._read_task()
-                            else:
-                                logger.debug('fd %s is not registered for reading!', fd._fileno)
-                                self.unregister(fd)
-                        elif event & _AsyncPoller._Write:
-                            if fd._write_task:
-                                fd._write_task()
-                            else:
-                                logger.debug('fd %s is not registered for writing!', fd._fileno)
-                                self.unregister(fd)
-                        elif event & _AsyncPoller._Hangup:
-                            fd._eof()
-                        elif event & _AsyncPoller._Error:
-                            logger.warning('error on fd %s', fd._fileno)
+            while self._run and self.poll_thread == threading.current_thread():
+                self._dispatch(self._poll_events(None))
+            if not self._run:
+                self._cleanup()
+
+        def _poll_events(self, timeout):
+            """Internal use only.
+
+            Wait for I/O events for at most 'timeout' seconds (or until
+            an event occurs if 'timeout' is None) and return them; the
+            events are processed with '_dispatch'.
+            """
+            self._lock.acquire()
+            if self._timers:
+                fd_timeout = self._timers.next_expiry() - _time()
+                if fd_timeout < 0.0001:
+                    fd_timeout = 0
+                if timeout is None or fd_timeout < timeout:
+                    timeout = fd_timeout
+            self._polling = True
+            self._lock.release()
+            if timeout is None:
+                timeout = _AsyncPoller._Block
+            else:
+                timeout *= self.timeout_multiplier
+            try:
+                return self._poller.poll(timeout)
+            except:
+                logger.debug(traceback.format_exc())
+                # prevent tight loops
+                time.sleep(5)
+                return []
+
+        def _dispatch(self, events):
+            """Internal use only.
+
+            Run I/O tasks for events returned by '_poll_events' and
+            process expired timeouts.
+            """
+            self._lock.acquire()
+            self._polling = False
+            try:
+                for fileno, event in events:
+                    fd = self._fds.get(fileno, None)
+                    if not fd:
+                        if not (event & _AsyncPoller._Hangup):
+                            logger.debug('invalid fd %s for event %s', fileno, event)
+                        continue
+                    if fileno in self._ready:
+                        # edge-triggered; tasks find out about hangup
+                        # and errors when they run
+                        if event & (_AsyncPoller._Hangup | _AsyncPoller._Error):
+                            event |= _AsyncPoller._Read | _AsyncPoller._Write
+                        self._ready[fileno] |= event & (_AsyncPoller._Read | _AsyncPoller._Write)
+                        self._run_ready(fd)
+                        continue
+                    if event & _AsyncPoller._Read:
+                        if fd._read_task:
+                            fd._read_task()
+                        else:
+                            logger.debug('fd %s is not registered for reading!', fd._fileno)
                             self.unregister(fd)
-                except:
-                    logger.debug(traceback.format_exc())
+                    elif event & _AsyncPoller._Write:
+                        if fd._write_task:
+                            fd._write_task()
+                        else:
+                            logger.debug('fd %s is not registered for writing!', fd._fileno)
+                            self.unregister(fd)
+                    elif event & _AsyncPoller._Hangup:
+                        fd._eof()
+                    elif event & _AsyncPoller._Error:
+                        logger.warning('error on fd %s', fd._fileno)
+                        self.unregister(fd)
+            except:
+                logger.debug(traceback.format_exc())
 
-                if self._timeouts:
-                    now = _time() + 0.0001
-                    while self._timeouts and self._timeouts[0][0] <= now:
-                        fd_timeout, fd = self._timeouts.pop(0)
-                        if fd._timeout_id == fd_timeout:
-                            fd._timeout_id = None
-                            fd._timed_out()
-                self._lock.release()
+            if self._timers:
+                for fd in self._timers.expire(_time()):
+                    fd._timeout_id = None
+                    fd._timed_out()
+            self._lock.release()
 
+        def _cleanup(self):
+            """Internal use only.
+            """
             self._lock.acquire()
             if hasattr(self.cmd_write, 'getsockname'):
                 self.cmd_write.close()
@@ -1889,41 +3088,106 @@ if not hasattr(sys.modules[__name__], '_AsyncNotifier'):
                                    fd._fileno, traceback.format_exc())
                 fd._notifier = None
             self._fds.clear()
-            self._timeouts = []
+            self._ready.clear()
+            self._timers = _TimerWheel()
             self._poller = None
             self.cmd_read = self.cmd_write = None
             self.__class__._instance = None
             self._lock.release()
 
+        def _start_poll_thread(self):
+            """Internal use only.
+
+            Process I/O events in a (daemon) thread of its own; this is
+            the default.
+            """
+            self._lock.acquire()
+            if self._run and not self.poll_thread:
+                self.poll_thread = threading.Thread(target=self.poll)
+                self.poll_thread.daemon = True
+                self.poll_thread.start()
+            self._lock.release()
+
+        def _stop_poll_thread(self):
+            """Internal use only.
+
+            Stop poll thread so that caller (scheduler in run loop mode)
+            processes I/O events with '_poll_events' and '_dispatch'
+            instead. Returns True if poll thread has been stopped.
+            """
+            self._lock.acquire()
+            poll_thread, self.poll_thread = self.poll_thread, None
+            if poll_thread:
+                self._interrupt()
+            self._lock.release()
+            if not poll_thread:
+                return False
+            poll_thread.join()
+            return True
+
+        def _set_edge_triggered(self):
+            """Internal use only.
+
+            Register sockets for edge-triggered notifications (for both
+            reading and writing) once and keep track of their readiness
+            here, so 'add' and 'clear' don't need system calls (or
+            interrupting poller). Returns True if edge-triggered
+            notifications are used (only with epoll).
+            """
+            if not _AsyncPoller._Edge:
+                return False
+            self._lock.acquire()
+            if not self._edge_triggered:
+                self._edge_triggered = True
+                for fd in self._fds.values():
+                    if isinstance(fd, _AsyncSocket) and fd is not self.cmd_read:
+                        self._ready[fd._fileno] = 0
+                        self._poller.modify(fd._fileno, _AsyncPoller._Edge)
+            self._lock.release()
+            return True
+
+        def _run_ready(self, fd):
+            """Internal use only.
+
+            Run I/O tasks of edge-triggered 'fd' that it is ready for. As
+            readiness is consumed by running task, tasks continue until
+            they are done or operation would block, and operations are
+            tried before waiting for notifications.
+            """
+            fileno = fd._fileno
+            ready = self._ready.get(fileno, 0) & self._events.get(fileno, 0)
+            if ready & _AsyncPoller._Read and fd._read_task:
+                self._ready[fileno] &= ~_AsyncPoller._Read
+                fd._read_task()
+                ready = self._ready.get(fileno, 0) & self._events.get(fileno, 0)
+            if ready & _AsyncPoller._Write and fd._write_task:
+                self._ready[fileno] &= ~_AsyncPoller._Write
+                fd._write_task()
+
         def terminate(self):
             if self._run:
                 self._lock.acquire()
                 self._run = False
                 self._interrupt()
+                poll_thread = self.poll_thread
                 self._lock.release()
-                self.poll_thread.join(0.2)
+                if poll_thread:
+                    poll_thread.join(0.2)
+                else:
+                    self._cleanup()
 
         def _add_timeout(self, fd):
             self._lock.acquire()
-            fd._timeout_id = _time() + fd._timeout
-            i = bisect_left(self._timeouts, (fd._timeout_id, fd))
-            self._timeouts.insert(i, (fd._timeout_id, fd))
+            if fd._timeout_id:
+                self._timers.cancel(fd._timeout_id)
+            fd._timeout_id = self._timers.add(_time() + fd._timeout, fd)
             self._lock.release()
 
         def _del_timeout(self, fd):
             self._lock.acquire()
-            i = bisect_left(self._timeouts, (fd._timeout_id, fd))
-            # in case of identical timeouts (unlikely?), search for
-            # correct index where fd is
-            while i < len(self._timeouts):
-                if self._timeouts[i] == (fd._timeout_id, fd):
-                    del self._timeouts[i]
-                    fd._timeout_id = None
-                    break
-                if fd._timeout_id != self._timeouts[i][0]:
-                    logger.warning('fd %s with %s is not found', fd._fileno, fd._timeout_id)
-                    break
-                i += 1
+            if fd._timeout_id:
+                self._timers.cancel(fd._timeout_id)
+                fd._timeout_id = None
             self._lock.release()
 
         def unregister(self, fd):
@@ -1933,6 +3197,7 @@ if not hasattr(sys.modules[__name__], '_AsyncNotifier'):
                 self._lock.release()
                 return
             self._events.pop(fd._fileno, None)
+            self._ready.pop(fd._fileno, None)
             self._poller.unregister(fd._fileno)
             if self._polling:
                 self._interrupt()
@@ -1946,16 +3211,30 @@ if not hasattr(sys.modules[__name__], '_AsyncNotifier'):
             if cur_event is None:
                 self._fds[fd._fileno] = fd
                 self._events[fd._fileno] = event
-                self._poller.register(fd._fileno, event)
+                if self._edge_triggered and isinstance(fd, _AsyncSocket) and \
+                   fd is not self.cmd_read:
+                    self._ready[fd._fileno] = 0
+                    self._poller.register(fd._fileno, _AsyncPoller._Edge)
+                else:
+                    self._poller.register(fd._fileno, event)
             else:
                 event |= cur_event
                 self._events[fd._fileno] = event
-                self._poller.modify(fd._fileno, event)
+                if fd._fileno not in self._ready:
+                    self._poller.modify(fd._fileno, event)
             if fd._timeout:
                 self._add_timeout(fd)
             else:
                 fd._timeout_id = None
-            if self._polling:
+            ready = self._ready.get(fd._fileno, None)
+            if ready is None:
+                if self._polling:
+                    self._interrupt()
+            elif ready & event:
+                # edge-triggered socket became ready earlier; there
+                # won't be another notification for it
+                self._run_ready(fd)
+            elif fd._timeout and self._polling:
                 self._interrupt()
             self._lock.release()
 
@@ -1968,11 +3247,15 @@ if not hasattr(sys.modules[__name__], '_AsyncNotifier'):
                 else:
                     cur_event = 0
                 self._events[fd._fileno] = cur_event
-                self._poller.modify(fd._fileno, cur_event)
-                if not cur_event and fd._timeout_id:
-                    self._del_timeout(fd)
-                if self._polling:
-                    self._interrupt()
+                if fd._fileno in self._ready:
+                    if not cur_event and fd._timeout_id:
+                        self._del_timeout(fd)
+                else:
+                    self._poller.modify(fd._fileno, cur_event)
+                    if not cur_event and fd._timeout_id:
+                        self._del_timeout(fd)
+                    if self._polling:
+                        self._interrupt()
             self._lock.release()
 
         @staticmethod
@@ -2435,6 +3718,24 @@ class _NetRequest(object):
     pass
 
 
+class _Mailbox(object):
+    """Internal use only.
+
+    Capacity and overflow policy of bounded mailbox (message queue) of
+    a coroutine, and deliveries waiting for room in it.
+    """
+
+    __slots__ = ('size', 'overflow', 'waiting', 'dropped', 'rejected')
+
+    def __init__(self, size, overflow):
+        self.size = size
+        self.overflow = overflow
+        # (sender, message) of deliveries waiting for room
+        self.waiting = collections.deque()
+        self.dropped = 0
+        self.rejected = 0
+
+
 class Coro(object):
     """Creates coroutine with the given generator function and
     schedules that coroutine to be executed with AsynCoro. If the
@@ -2443,12 +3744,16 @@ class Coro(object):
     """
 
     __slots__ = ('_generator', '_name', '_id', '_state', '_value', '_exceptions', '_callers',
-                 '_timeout', '_daemon', '_complete', '_msgs', '_monitors', '_swap_generator',
-                 '_hot_swappable', '_location', '_scheduler')
+                 '_timeout', '_daemon', '_complete', '_msgs', '_mailbox', '_monitors',
+                 '_swap_generator', '_hot_swappable', '_location', '_scheduler')
 
     _asyncoro = None
 
     def __init__(self, *args, **kwargs):
+        self.__setup(*args, **kwargs)
+        self._scheduler._add(self)
+
+    def __setup(self, *args, **kwargs):
         self._generator = Coro.__get_generator(self, *args, **kwargs)
         self._name = self._generator.__name__
         self._id = id(self)
@@ -2460,6 +3765,7 @@ class Coro(object):
         self._daemon = False
         self._complete = None
         self._msgs = collections.deque()
+        self._mailbox = None
         self._monitors = set()
         self._swap_generator = None
         self._hot_swappable = False
@@ -2468,13 +3774,30 @@ class Coro(object):
         if not getattr(self, '_scheduler', None):
             self._scheduler = Coro._asyncoro
         self._location = self._scheduler._location
-        self._scheduler._add(self)
         if self._scheduler == Coro._asyncoro:
             self._name = '~' + self._name
         else:
             # assert self._location and self._scheduler == Coro._asyncoro._sys_asyncoro
             self._name = '!' + self._name
 
+    @staticmethod
+    def spawn_many(target, args_list):
+        """Creates a coroutine with generator function 'target' for
+        each item in 'args_list', which must be a tuple of (positional)
+        arguments to 'target', and returns list of these coroutines.
+
+        This is same as creating each coroutine with 'Coro', but more
+        efficient, as all coroutines are added to scheduler at once.
+        """
+        coros = []
+        for args in args_list:
+            coro = Coro.__new__(Coro)
+            coro.__setup(target, *args)
+            coros.append(coro)
+        if coros:
+            coros[0]._scheduler._add_many(coros)
+        return coros
+
     @property
     def location(self):
         """Get Location instance where this coro is running.
@@ -2589,17 +3912,23 @@ class Coro(object):
 
         If coro is currently waiting with 'receive', it is resumed
         with 'message'. Otherwise, 'message' is queued so that next
-        receive call will return message.
+        receive call will return message. If coro's mailbox is bounded
+        (see 'set_mailbox') and full, 'message' is handled as per its
+        overflow policy; if the policy is 'reject', -1 is returned.
 
         Can also be used on remotely running coroutines.
         """
         if self._location == Coro._asyncoro._location:
-            return self._scheduler._resume(self, message, AsynCoro._AwaitMsg_)
+            # -2 (message rejected by full mailbox) is also reported as -1
+            if self._scheduler._resume(self, message, AsynCoro._AwaitMsg_) == 0:
+                return 0
+            return -1
         else:
             request = _NetRequest('send', kwargs={'message': message, 'name': self._name,
                                                   'coro': self._id},
                                   dst=self._location, timeout=MsgTimeout)
-            # request is queued for asynchronous processing
+            # one-way request: it is queued and sent (in a batch with other
+            # such requests to the peer) without waiting for reply
             if _Peer.send_req(request) != 0:
                 logger.warning('remote coro at %s may not be valid', self._location)
                 return -1
@@ -2614,12 +3943,18 @@ class Coro(object):
         Return value indicates status of delivering the message: If it
         is 1, then message has been delivered, if it is 0, it couldn't
         be delivered before timeout, and if it is < 0, then the
-        (remote) coroutine is not valid.
+        (remote) coroutine is not valid. If coro's mailbox is bounded
+        (see 'set_mailbox') and full, waits until there is room in it.
         """
         if self._location == Coro._asyncoro._location:
-            reply = self._scheduler._resume(self, message, AsynCoro._AwaitMsg_)
-            if reply == 0:
-                reply = 1
+            sender = AsynCoro.cur_coro()
+            reply = 0
+            try:
+                reply = yield self._scheduler._put_msg(self, message, sender, timeout)
+            finally:
+                if reply != 1 and sender:
+                    # timed out (or interrupted) while waiting for room
+                    self._scheduler._cancel_put(self, sender)
         else:
             request = _NetRequest('deliver', kwargs={'message': message, 'name': self._name,
                                                      'coro': self._id},
@@ -2644,6 +3979,35 @@ class Coro(object):
 
     recv = receive
 
+    def set_mailbox(self, size=None, overflow='reject'):
+        """Limit number of messages queued for this coroutine to
+        'size'. If 'size' is None (default), the mailbox is unbounded.
+
+        When mailbox is full, 'overflow' determines what happens to a
+        message sent with 'send': if it is 'drop_oldest', the earliest
+        queued message is discarded to make room for it, if it is
+        'drop_newest', the message is discarded and if it is
+        'reject', the message is discarded and 'send' returns -1.
+        'deliver' waits (until timeout) for room in the mailbox
+        irrespective of 'overflow'. Messages already queued are not
+        discarded if 'size' is smaller than their number.
+        """
+        if self._location != Coro._asyncoro._location:
+            return -1
+        return self._scheduler._set_mailbox(self, size, overflow)
+
+    def mailbox_stats(self):
+        """Returns dictionary with number of messages queued for this
+        coroutine ('depth'), size and overflow policy of its mailbox
+        (both None if mailbox is unbounded), number of deliveries
+        waiting for room ('waiting') and number of messages dropped and
+        rejected due to overflow. Returns None if coroutine is not
+        valid (e.g., it is remote or has finished).
+        """
+        if self._location != Coro._asyncoro._location:
+            return None
+        return self._scheduler._mailbox_stats(self)
+
     def throw(self, *args):
         """Throw exception in coroutine. This method must be called from
         coro only.
@@ -2907,8 +4271,8 @@ class Channel(object):
     Channels can be hierarchical, and subscribers can be remote.
     """
 
-    __slots__ = ('_name', '_location', '_transform', '_subscribers', '_subscribe_event',
-                 '_scheduler')
+    __slots__ = ('_name', '_location', '_transform', '_subscribers', '_subscriber_index',
+                 '_dispatch', '_subscribe_event', '_scheduler')
 
     _asyncoro = None
 
@@ -2948,7 +4312,14 @@ class Channel(object):
         else:
             # assert self._location and self._scheduler == Channel._asyncoro._sys_asyncoro
             self._name = '!' + self._name
-        self._subscribers = set()
+        # subscribers are kept in tuple that is replaced (not updated) when
+        # subscribers change, so it can be used to send messages without
+        # locking; '_subscriber_index' has (subscriber, filter) keyed by
+        # '_subscriber_key' and '_dispatch' is (also replaced) structure
+        # used to match messages to filters
+        self._subscribers = ()
+        self._subscriber_index = {}
+        self._dispatch = ((), {}, ())
         self._subscribe_event = Event()
         self._scheduler._lock.acquire()
         if self._name in self._scheduler._channels:
@@ -3029,7 +4400,7 @@ class Channel(object):
         self._transform = transform
         return 0
 
-    def subscribe(self, subscriber, timeout=None):
+    def subscribe(self, subscriber, timeout=None, filter=None):
         """Must be used with 'yield', as, for example,
         'yield channel.subscribe(coro)'.
 
@@ -3037,30 +4408,39 @@ class Channel(object):
         subscribe. A message sent to this channel is delivered to all
         subscribers.
 
+        If 'filter' is given, only messages that match it are sent to
+        'subscriber'; other messages are dropped by the channel (so
+        they are not sent to remote subscribers). 'filter' can be a
+        dictionary, in which case messages must be dictionaries with
+        same keys as 'filter' and values equal to (or, if value in
+        'filter' is a set, in) corresponding value in 'filter', e.g.,
+        "{'type': 'quote', 'symbol': set(['IBM', 'MSFT'])}". 'filter'
+        can also be a function that is called with message and
+        returns True if message should be sent to subscriber; with
+        remote channels, the function is called at channel's location
+        and so it must be available there. If subscriber is already
+        subscribed, its filter is replaced with 'filter'.
+
         Can also be used on remote channels.
         """
         if not isinstance(subscriber, Coro) and not isinstance(subscriber, Channel):
             logger.warning('invalid subscriber ignored')
             raise StopIteration(-1)
         if self._location == Channel._asyncoro._location:
-            if subscriber._location != self._location:
-                if isinstance(subscriber, Coro):
-                    # remote coro
-                    subscriber._id = int(subscriber._id)
-                    for s in self._subscribers:
-                        if isinstance(s, Coro) and \
-                           s._id == subscriber._id and s._location == subscriber._location:
-                            subscriber = s
-                            break
-                elif isinstance(subscriber, Channel):
-                    # remote channel
-                    for s in self._subscribers:
-                        if isinstance(s, Channel) and \
-                           s._name == subscriber._name and s._location == subscriber._location:
-                            subscriber = s
-                            break
+            if filter is not None:
+                filter = Channel._subscriber_filter(filter)
+                if filter is None:
+                    logger.warning('invalid filter for subscriber %s ignored', subscriber)
+                    raise StopIteration(-1)
+            key = Channel._subscriber_key(subscriber)
             self._scheduler._lock.acquire()
-            self._subscribers.add(subscriber)
+            entry = self._subscriber_index.get(key, None)
+            if entry is None:
+                self._subscriber_index[key] = (subscriber, filter)
+                self._update_subscribers()
+            elif entry[1] != filter:
+                self._subscriber_index[key] = (entry[0], filter)
+                self._update_subscribers()
             self._subscribe_event.set()
             self._scheduler._lock.release()
             reply = 0
@@ -3068,6 +4448,8 @@ class Channel(object):
             # remote channel
             kwargs = {'channel': self._name}
             kwargs['subscriber'] = subscriber
+            if filter is not None:
+                kwargs['filter'] = filter
             request = _NetRequest('subscribe', kwargs=kwargs, dst=self._location, timeout=timeout)
             reply = yield _Peer._sync_reply(request)
         raise StopIteration(reply)
@@ -3084,28 +4466,14 @@ class Channel(object):
             logger.warning('invalid subscriber ignored')
             raise StopIteration(-1)
         if self._location == Channel._asyncoro._location:
-            if subscriber._location != self._location:
-                if isinstance(subscriber, Coro):
-                    # remote coro
-                    subscriber._id = int(subscriber._id)
-                    for s in self._subscribers:
-                        if isinstance(s, Coro) and \
-                           s._id == subscriber._id and s._location == subscriber._location:
-                            subscriber = s
-                            break
-                elif isinstance(subscriber, Channel):
-                    # remote channel
-                    for s in self._subscribers:
-                        if isinstance(s, Channel) and \
-                           s._name == subscriber._name and s._location == subscriber._location:
-                            subscriber = s
-                            break
-            try:
-                self._subscribers.remove(subscriber)
-            except KeyError:
+            key = Channel._subscriber_key(subscriber)
+            self._scheduler._lock.acquire()
+            if self._subscriber_index.pop(key, None) is None:
                 reply = -1
             else:
+                self._update_subscribers()
                 reply = 0
+            self._scheduler._lock.release()
         else:
             # remote channel
             kwargs = {'channel': self._name}
@@ -3120,11 +4488,7 @@ class Channel(object):
         Can also be used on remote channels.
         """
         if self._location == Channel._asyncoro._location:
-            self._scheduler._lock.acquire()
             transform = self._transform
-            subscribers = list(self._subscribers)
-            self._scheduler._lock.release()
-
             if transform:
                 try:
                     message = transform(self.name, message)
@@ -3132,10 +4496,34 @@ class Channel(object):
                     message = None
                 if message is None:
                     return 0
+            subscribers = self._match(message)
             invalid = []
+            remote = []
             for subscriber in subscribers:
-                if subscriber.send(message) != 0:
-                    invalid.append(subscriber)
+                if subscriber._location == self._location:
+                    if isinstance(subscriber, Coro):
+                        # message rejected by full mailbox (-2) is not
+                        # an error
+                        if subscriber._scheduler._resume(subscriber, message,
+                                                         AsynCoro._AwaitMsg_) == -1:
+                            invalid.append(subscriber)
+                    elif subscriber.send(message) != 0:
+                        invalid.append(subscriber)
+                else:
+                    remote.append(subscriber)
+            if len(remote) == 1:
+                if remote[0].send(message) != 0:
+                    invalid.append(remote[0])
+            elif remote:
+                # message is serialized once and sent to remote subscribers
+                # at each peer with one request
+                data = serialize(message)
+                for location, group in Channel._peer_groups(remote):
+                    request = _NetRequest('send', kwargs={'data': data,
+                                                          'recipients': Channel._recipients(group)},
+                                          dst=location, timeout=MsgTimeout)
+                    if _Peer.send_req(request) != 0:
+                        invalid.extend(group)
             if invalid:
                 def _unsub(self, subscriber, coro=None):
                     logger.debug('remote subscriber %s is not valid; unsubscribing it', subscriber)
@@ -3146,7 +4534,8 @@ class Channel(object):
             # remote channel
             request = _NetRequest('send', kwargs={'message': message, 'channel': self._name},
                                   dst=self._location, timeout=MsgTimeout)
-            # request is queued for asynchronous processing
+            # one-way request: it is queued and sent (in a batch with other
+            # such requests to the peer) without waiting for reply
             if _Peer.send_req(request) != 0:
                 logger.warning('remote channel at %s may not be valid', self._location)
                 return -1
@@ -3156,7 +4545,8 @@ class Channel(object):
         """Must be used with 'yield' as 'rcvd = yield channel.deliver(message)'.
 
         Blocking 'send': Wait until message can be delivered to at
-        least 'n' subscribers before timeout. Returns number of
+        least 'n' subscribers (whose filters, if any, match message)
+        before timeout. Returns number of
         end-point recipients (coroutines) the message is delivered to;
         i.e., in case of heirarchical channels, it is the sum of
         recipients of all the channels.
@@ -3166,11 +4556,7 @@ class Channel(object):
         if not isinstance(n, int) or n < 0:
             raise StopIteration(-1)
         if self._location == Channel._asyncoro._location:
-            self._scheduler._lock.acquire()
             transform = self._transform
-            subscribers = list(self._subscribers)
-            self._scheduler._lock.release()
-
             if transform:
                 try:
                     message = transform(self.name, message)
@@ -3178,6 +4564,7 @@ class Channel(object):
                     message = None
                 if message is None:
                     raise StopIteration(0)
+            subscribers = self._match(message)
             if n:
                 while len(subscribers) < n:
                     start = _time()
@@ -3190,9 +4577,7 @@ class Channel(object):
                         timeout -= _time() - start
                         if timeout <= 0:
                             raise StopIteration(0)
-                    self._scheduler._lock.acquire()
-                    subscribers = list(self._subscribers)
-                    self._scheduler._lock.release()
+                    subscribers = self._match(message)
 
             info = {'reply': 0, 'pending': len(subscribers), 'success': 0,
                     'done': Event(), 'invalid': []}
@@ -3212,15 +4597,55 @@ class Channel(object):
                 info['pending'] -= 1
                 if info['pending'] == 0:
                     info['done'].set()
+
+            def _deliver_to(location, group, data, info, timeout, n, coro=None):
+                # deliver to subscribers at a peer with one request
+                request = _NetRequest('deliver', kwargs={'data': data, 'n': n,
+                                                         'recipients': Channel._recipients(group)},
+                                      dst=location, timeout=timeout)
+                try:
+                    replies = yield _Peer._sync_reply(request, alarm_value=0)
+                except:
+                    replies = 0
+                if isinstance(replies, list):
+                    for subscriber, reply in zip(group, replies):
+                        if reply > 0:
+                            info['reply'] += reply
+                            info['success'] += 1
+                        elif reply < 0:
+                            info['invalid'].append(subscriber)
+                    if n > 0 and info['success'] >= n:
+                        info['done'].set()
+                elif replies != 0:
+                    info['invalid'].extend(group)
+                info['pending'] -= len(group)
+                if info['pending'] == 0:
+                    info['done'].set()
+
+            remote = []
             for subscriber in subscribers:
                 if isinstance(subscriber, Coro) and self._location == subscriber._location:
-                    if subscriber.send(message) == 0:
+                    reply = subscriber._scheduler._put_msg(subscriber, message, None, None)
+                    if reply == 0:
+                        # mailbox is full; wait for room
+                        Coro(_deliver, subscriber, info, timeout, n)
+                        continue
+                    if reply == 1:
                         info['reply'] += 1
                         info['success'] += 1
                     info['pending'] -= 1
-                else:
+                elif self._location == subscriber._location:
                     # channel/remote coro
                     Coro(_deliver, subscriber, info, timeout, n)
+                else:
+                    remote.append(subscriber)
+            if len(remote) == 1:
+                Coro(_deliver, remote[0], info, timeout, n)
+            elif remote:
+                # message is serialized once for all remote subscribers
+                data = serialize(message)
+                for location, group in Channel._peer_groups(remote):
+                    Coro(_deliver_to, location, group, data, info, timeout, n)
             if info['pending'] == 0:
                 info['done'].set()
             if n == 0 or info['success'] < n:
@@ -3248,11 +4673,152 @@ class Channel(object):
             #                    self._name, self._location)
             raise StopIteration(reply)
 
+    @staticmethod
+    def _subscriber_key(subscriber):
+        """Internal use only.
+
+        Returns key that identifies 'subscriber' (which may be a copy,
+        e.g., of remote coroutine, received in 'subscribe' request).
+        """
+        if isinstance(subscriber, Coro):
+            if subscriber._location != Channel._asyncoro._location:
+                # id of remote coro is received as string
+                subscriber._id = int(subscriber._id)
+            return (subscriber._name, subscriber._id, subscriber._location)
+        else:
+            return (subscriber._name, None, subscriber._location)
+
+    @staticmethod
+    def _subscriber_filter(filter):
+        """Internal use only.
+
+        Returns 'filter' given to 'subscribe' in the form used by
+        '_update_subscribers': tuple of (key, value) pairs for
+        dictionary (with sets converted to frozensets), or the
+        function itself. Returns None if 'filter' is not valid.
+        """
+        if isinstance(filter, dict):
+            items = []
+            try:
+                for key, value in filter.items():
+                    if isinstance(value, (set, frozenset)):
+                        value = frozenset(value)
+                    hash(value)
+                    items.append((key, value))
+            except TypeError:
+                return None
+            if items:
+                return tuple(items)
+        elif callable(filter):
+            return filter
+        return None
+
+    def _update_subscribers(self):
+        """Internal use only.
+
+        Updates '_subscribers' and '_dispatch' after '_subscriber_index'
+        is changed. Must be called with scheduler's lock held.
+
+        '_dispatch' is tuple of subscribers without filter, dictionary
+        of subscribers with dictionary filters and tuple of (subscriber,
+        function) of subscribers with function filters. Each dictionary
+        filter is indexed (in first dictionary) by key that is most
+        common in filters and its value(s) (in the second level
+        dictionary), so a message is matched with only a few lookups
+        instead of checking each filter.
+        """
+        subscribers, unfiltered, filtered, predicates = [], [], [], []
+        counts = {}
+        for subscriber, filter in self._subscriber_index.values():
+            subscribers.append(subscriber)
+            if filter is None:
+                unfiltered.append(subscriber)
+            elif isinstance(filter, tuple):
+                filtered.append((subscriber, filter))
+                for key, value in filter:
+                    counts[key] = counts.get(key, 0) + 1
+            else:
+                predicates.append((subscriber, filter))
+        index = {}
+        for subscriber, filter in filtered:
+            key, value = max(filter, key=lambda item: counts[item[0]])
+            items = tuple(item for item in filter if item[0] != key)
+            entries = index.setdefault(key, {})
+            for value in (value if isinstance(value, frozenset) else (value,)):
+                entries.setdefault(value, []).append((subscriber, items))
+        self._subscribers = tuple(subscribers)
+        self._dispatch = (tuple(unfiltered), index, tuple(predicates))
+
+    def _match(self, message):
+        """Internal use only.
+
+        Returns subscribers whose filters (if any) match 'message'.
+        """
+        unfiltered, index, predicates = self._dispatch
+        if not index and not predicates:
+            return unfiltered
+        subscribers = list(unfiltered)
+        if index and isinstance(message, dict):
+            for key, entries in index.items():
+                try:
+                    entries = entries.get(message[key], None)
+                except (KeyError, TypeError):
+                    continue
+                if not entries:
+                    continue
+                for subscriber, items in entries:
+                    for key, value in items:
+                        try:
+                            if isinstance(value, frozenset):
+                                if message[key] not in value:
+                                    break
+                            elif message[key] != value:
+                                break
+                        except (KeyError, TypeError):
+                            break
+                    else:
+                        subscribers.append(subscriber)
+        for subscriber, predicate in predicates:
+            try:
+                if predicate(message):
+                    subscribers.append(subscriber)
+            except:
+                pass
+        return subscribers
+
+    @staticmethod
+    def _peer_groups(subscribers):
+        """Internal use only.
+
+        Returns list of (location, subscribers) pairs of remote
+        'subscribers' grouped by their location.
+        """
+        groups = {}
+        for subscriber in subscribers:
+            group = groups.get(subscriber._location, None)
+            if group is None:
+                groups[subscriber._location] = [subscriber]
+            else:
+                group.append(subscriber)
+        return list(groups.items())
+
+    @staticmethod
+    def _recipients(subscribers):
+        """Internal use only.
+
+        Returns (name, id) of coroutines and (name, None) of channels
+        in 'subscribers', as recipients of 'send' / 'deliver' request.
+        """
+        return [(subscriber._name, subscriber._id) if isinstance(subscriber, Coro) else
+                (subscriber._name, None) for subscriber in subscribers]
+
     def close(self):
         if self._location == Channel._asyncoro._location:
             self.unregister()
-            self._subscribers = set()
             self._scheduler._lock.acquire()
+            self._subscribers = ()
+            self._subscriber_index = {}
+            self._dispatch = ((), {}, ())
             self._scheduler._channels.pop(self._name, None)
             self._scheduler._lock.release()
 
@@ -3374,24 +4940,40 @@ class AsynCoro(object):
     coroutine is created, for example), so there is no reason to
     create it explicitly. To use distributed programming, AsynCoro in
     disasyncoro module should be used.
+
+    If 'run_loop' is True, the scheduler processes I/O events itself
+    instead of handing them over from the I/O notifier's thread: one
+    thread alternates between running scheduled coroutines and polling
+    for I/O events (with timeout computed from timed suspends), so I/O
+    completions resume coroutines without a thread switch. In this case
+    scheduler should be created explicitly (before any coroutines are
+    created) as 'AsynCoro(run_loop=True)'. This mode is not available
+    with IOCP notifier (on Windows).
+
+    If 'edge_triggered' is True, sockets are registered with epoll
+    only once (for both reading and writing, edge-triggered) and
+    readiness is tracked by the notifier, so waiting for and finishing
+    I/O operations doesn't need additional system calls. This mode is
+    available only with epoll notifier (on Linux); with other
+    notifiers, it is ignored.
     """
 
     __metaclass__ = Singleton
     _instance = None
     _schedulers = {}
 
-    # in _scheduled set, waiting for turn to execute
+    # in _scheduled queue, waiting for turn to execute
     _Scheduled = 1
-    # in _scheduled, currently executing
+    # currently executing
     _Running = 2
-    # in _suspended, waiting for resume
+    # waiting for resume
     _Suspended = 3
-    # in _suspended, waiting for I/O operation
+    # waiting for I/O operation
     _AwaitIO_ = 4
-    # in _suspended, waiting for message
+    # waiting for message
     _AwaitMsg_ = 5
 
-    def __init__(self):
+    def __init__(self, run_loop=False, edge_triggered=False):
         if not AsynCoro._instance:
             AsynCoro._instance = self
             Coro._asyncoro = Channel._asyncoro = self
@@ -3401,9 +4983,11 @@ class AsynCoro(object):
         self._name = ''
         self.__cur_coro = None
         self._coros = {}
-        self._scheduled = set()
-        self._suspended = set()
-        self._timeouts = []
+        # coroutines ready to run, in the order they became ready; a
+        # coroutine is in this queue if (and only if) its state is
+        # _Scheduled
+        self._scheduled = collections.deque()
+        self._timers = _TimerWheel()
         self._quit = False
         self._complete = threading.Event()
         self._complete.set()
@@ -3417,6 +5001,20 @@ class AsynCoro(object):
         self._atexit = []
         self._polling = False
         self._poll_event = threading.Event()
+        if run_loop and hasattr(self._notifier, '_stop_poll_thread') and \
+           self._notifier._stop_poll_thread():
+            self._run_loop = True
+            self._wakeup = self._notifier._interrupt
+        else:
+            if run_loop:
+                logger.warning('run loop is not supported with %s notifier',
+                               self._notifier._poller_name)
+            self._run_loop = False
+            self._wakeup = self._poll_event.set
+        if edge_triggered and not (hasattr(self._notifier, '_set_edge_triggered') and
+                                   self._notifier._set_edge_triggered()):
+            logger.warning('edge-triggered notifications are not supported with %s notifier',
+                           self._notifier._poller_name)
         self._scheduler = threading.Thread(target=self._schedule)
         AsynCoro._schedulers[self._scheduler] = self
         self._scheduler.daemon = True
@@ -3445,6 +5043,13 @@ class AsynCoro(object):
         """
         return self._name
 
+    def pending_timers(self):
+        """Number of timers (for timed suspends/receives and I/O timeouts)
+        currently pending. Timers that have been cancelled (e.g., when a
+        coroutine is resumed before its timeout expires) are not counted.
+        """
+        return len(self._timers) + len(self._notifier._timers)
+
     @staticmethod
     def scheduler():
         return AsynCoro._schedulers.get(threading.current_thread(), None)
@@ -3459,6 +5064,54 @@ class AsynCoro(object):
                 return None
         return scheduler.__cur_coro
 
+    def send_many(self, messages):
+        """Sends messages in 'messages', which must be an iterable of
+        (coro, message) pairs; returns list of status of sending each
+        message, as returned by 'send' of coro.
+
+        This is same as calling 'send' of each coro, but more efficient
+        for coroutines running with this scheduler, as these messages
+        are sent (and receiving coroutines are scheduled) with lock
+        acquired once and scheduler is woken up at most once.
+        """
+        # 'messages' may be a generator, so it is consumed before taking lock
+        messages = list(messages)
+        replies = []
+        others = []
+        scheduled = False
+        self._lock.acquire()
+        try:
+            for coro, message in messages:
+                if coro._location != self._location or coro._scheduler != self:
+                    # remote coro or coro in another scheduler
+                    others.append((len(replies), coro, message))
+                    replies.append(None)
+                    continue
+                coro = self._coros.get(coro._id, None)
+                if not coro:
+                    reply = -1
+                elif coro._state == AsynCoro._AwaitMsg_:
+                    if coro._timeout:
+                        self._timers.cancel(coro._timeout)
+                        coro._timeout = None
+                    coro._value = message
+                    coro._state = AsynCoro._Scheduled
+                    self._scheduled.append(coro)
+                    scheduled = True
+                    reply = 0
+                elif self._queue_msg(coro, message) == 0:
+                    reply = 0
+                else:
+                    reply = -1
+                replies.append(reply)
+        finally:
+            if scheduled and self._polling:
+                self._wakeup()
+            self._lock.release()
+        for i, coro, message in others:
+            replies[i] = coro.send(message)
+        return replies
+
     def _add(self, coro):
         """Internal use only. See Coro class.
         """
@@ -3466,9 +5119,22 @@ class AsynCoro(object):
         self._coros[coro._id] = coro
         self._complete.clear()
         coro._state = AsynCoro._Scheduled
-        self._scheduled.add(coro._id)
+        self._scheduled.append(coro)
+        if self._polling:
+            self._wakeup()
+        self._lock.release()
+
+    def _add_many(self, coros):
+        """Internal use only. See spawn_many in Coro.
+        """
+        self._lock.acquire()
+        for coro in coros:
+            self._coros[coro._id] = coro
+            coro._state = AsynCoro._Scheduled
+        self._complete.clear()
+        self._scheduled.extend(coros)
         if self._polling:
-            self._poll_event.set()
+            self._wakeup()
         self._lock.release()
 
     def _remove(self, coro):
@@ -3476,8 +5142,8 @@ class AsynCoro(object):
         """
         self._lock.acquire()
         try:
-            self._scheduled.remove(coro._id)
-        except KeyError:
+            self._scheduled.remove(coro)
+        except ValueError:
             ret = -1
         else:
             self._coros.pop(coro._id, None)
@@ -3532,6 +5198,8 @@ class AsynCoro(object):
             s, update = coro._msgs[0]
             if s == state:
                 coro._msgs.popleft()
+                if coro._mailbox and coro._mailbox.waiting:
+                    self._mailbox_room(coro, coro._mailbox)
                 self._lock.release()
                 return update
         if timeout is None:
@@ -3545,10 +5213,7 @@ class AsynCoro(object):
                 self._lock.release()
                 return alarm_value
             else:
-                coro._timeout = _time() + timeout
-                heappush(self._timeouts, (coro._timeout, cid, alarm_value))
-        self._scheduled.discard(cid)
-        self._suspended.add(cid)
+                coro._timeout = self._timers.add(_time() + timeout, (coro, alarm_value))
         coro._state = state
         self._lock.release()
         return 0
@@ -3564,20 +5229,148 @@ class AsynCoro(object):
             logger.warning('invalid coroutine %s to resume', cid)
             return -1
         if coro._state == state:
-            coro._timeout = None
+            if coro._timeout:
+                self._timers.cancel(coro._timeout)
+                coro._timeout = None
             coro._value = update
-            self._suspended.discard(cid)
-            self._scheduled.add(cid)
             coro._state = AsynCoro._Scheduled
+            self._scheduled.append(coro)
             if self._polling:
-                self._poll_event.set()
+                self._wakeup()
         elif state == AsynCoro._AwaitMsg_:
-            coro._msgs.append((state, update))
+            if self._queue_msg(coro, update):
+                self._lock.release()
+                return -2
         else:
             logger.warning('ignoring resume for %s: %s', coro, coro._state)
         self._lock.release()
         return 0
 
+    def _queue_msg(self, coro, message):
+        """Internal use only.
+
+        Queues 'message' for 'coro' (that is not waiting for message),
+        as per its mailbox. Returns 0 if message is queued (or dropped)
+        and -2 if it is rejected. Must be called with lock held.
+        """
+        mailbox = coro._mailbox
+        if mailbox is None or len(coro._msgs) < mailbox.size:
+            coro._msgs.append((AsynCoro._AwaitMsg_, message))
+        elif mailbox.overflow == 'drop_oldest':
+            coro._msgs.popleft()
+            coro._msgs.append((AsynCoro._AwaitMsg_, message))
+            mailbox.dropped += 1
+        elif mailbox.overflow == 'drop_newest':
+            mailbox.dropped += 1
+        else:
+            mailbox.rejected += 1
+            return -2
+        return 0
+
+    def _put_msg(self, coro, message, sender, timeout):
+        """Internal use only. See deliver in Coro.
+
+        Returns 1 if 'message' is queued for (or received by) 'coro' and
+        -1 if 'coro' is not valid. If mailbox of 'coro' is full,
+        returns 0 if 'sender' is None; otherwise, 'sender' is suspended
+        until there is room in mailbox (when message is queued and
+        sender is resumed with 1) or timeout (sender is resumed with 0).
+        """
+        self._lock.acquire()
+        cid = coro._id
+        coro = self._coros.get(cid, None)
+        if not coro:
+            self._lock.release()
+            logger.warning('invalid coroutine %s to deliver', cid)
+            return -1
+        mailbox = coro._mailbox
+        if mailbox is None or len(coro._msgs) < mailbox.size or \
+           coro._state == AsynCoro._AwaitMsg_:
+            self._resume(coro, message, AsynCoro._AwaitMsg_)
+            reply = 1
+        elif sender is None:
+            reply = 0
+        else:
+            mailbox.waiting.append((sender, message))
+            reply = sender._scheduler._suspend(sender, timeout, 0, AsynCoro._AwaitIO_)
+        self._lock.release()
+        return reply
+
+    def _cancel_put(self, coro, sender):
+        """Internal use only. See deliver in Coro.
+        """
+        self._lock.acquire()
+        coro = self._coros.get(coro._id, None)
+        if coro and coro._mailbox:
+            for entry in coro._mailbox.waiting:
+                if entry[0] is sender:
+                    coro._mailbox.waiting.remove(entry)
+                    break
+        self._lock.release()
+
+    def _mailbox_room(self, coro, mailbox):
+        """Internal use only.
+
+        Queues messages of deliveries waiting (in 'mailbox') for room in
+        mailbox of 'coro', as long as there is room, and resumes their
+        senders. Must be called with lock held.
+        """
+        size = mailbox.size if coro._mailbox is mailbox else None
+        waiting = mailbox.waiting
+        while waiting and (size is None or len(coro._msgs) < size):
+            sender, message = waiting.popleft()
+            # sender that timed out is not in _AwaitIO_ state
+            if sender._state == AsynCoro._AwaitIO_:
+                coro._msgs.append((AsynCoro._AwaitMsg_, message))
+                sender._scheduler._resume(sender, 1, AsynCoro._AwaitIO_)
+
+    def _set_mailbox(self, coro, size, overflow):
+        """Internal use only. See set_mailbox in Coro.
+        """
+        if (size is not None and (not isinstance(size, int) or size < 1)) or \
+           overflow not in ('drop_oldest', 'drop_newest', 'reject'):
+            logger.warning('set_mailbox: invalid size %s / overflow %s', size, overflow)
+            return -1
+        self._lock.acquire()
+        cid = coro._id
+        coro = self._coros.get(cid, None)
+        if coro is None:
+            self._lock.release()
+            logger.warning('set_mailbox: invalid coroutine %s', cid)
+            return -1
+        mailbox = coro._mailbox
+        if size is None:
+            coro._mailbox = None
+        elif mailbox:
+            mailbox.size = size
+            mailbox.overflow = overflow
+        else:
+            coro._mailbox = _Mailbox(size, overflow)
+        if mailbox and mailbox.waiting:
+            self._mailbox_room(coro, mailbox)
+        self._lock.release()
+        return 0
+
+    def _mailbox_stats(self, coro):
+        """Internal use only. See mailbox_stats in Coro.
+        """
+        self._lock.acquire()
+        coro = self._coros.get(coro._id, None)
+        if coro is None:
+            self._lock.release()
+            return None
+        stats = {'depth': len(coro._msgs), 'size': None, 'overflow': None, 'waiting': 0,
+                 'dropped': 0, 'rejected': 0}
+        mailbox = coro._mailbox
+        if mailbox:
+            stats['size'] = mailbox.size
+            stats['overflow'] = mailbox.overflow
+            stats['waiting'] = len(mailbox.waiting)
+            stats['dropped'] = mailbox.dropped
+            stats['rejected'] = mailbox.rejected
+        self._lock.release()
+        return stats
+
     def _throw(self, coro, *args):
         """Internal use only. See throw in Coro.
         """
@@ -3589,14 +5382,15 @@ class AsynCoro(object):
             logger.warning('invalid coroutine %s to throw exception', cid)
             self._lock.release()
             return -1
-        coro._timeout = None
+        if coro._timeout:
+            self._timers.cancel(coro._timeout)
+            coro._timeout = None
         coro._exceptions.append(args)
         if coro._state in (AsynCoro._AwaitIO_, AsynCoro._Suspended, AsynCoro._AwaitMsg_):
-            self._suspended.discard(cid)
-            self._scheduled.add(cid)
             coro._state = AsynCoro._Scheduled
+            self._scheduled.append(coro)
             if self._polling:
-                self._poll_event.set()
+                self._wakeup()
         self._lock.release()
         return 0
 
@@ -3614,13 +5408,15 @@ class AsynCoro(object):
         if coro._state == AsynCoro._Running:
             logger.warning('coroutine to terminate %s/%s is running', coro._name, cid)
         else:
-            self._suspended.discard(cid)
-            self._scheduled.add(cid)
-            coro._state = AsynCoro._Scheduled
-            coro._timeout = None
+            if coro._state != AsynCoro._Scheduled:
+                coro._state = AsynCoro._Scheduled
+                self._scheduled.append(coro)
+            if coro._timeout:
+                self._timers.cancel(coro._timeout)
+                coro._timeout = None
             coro._callers = []
             if self._polling:
-                self._poll_event.set()
+                self._wakeup()
         coro._exceptions.append((GeneratorExit, GeneratorExit('close')))
         self._lock.release()
         return 0
@@ -3640,41 +5436,59 @@ class AsynCoro(object):
             self._lock.release()
             return 0
         else:
-            coro._timeout = None
+            if coro._timeout:
+                self._timers.cancel(coro._timeout)
+                coro._timeout = None
             # TODO: check that another HotSwapException is not pending?
             if coro._state is None:
-                # assert coro._id not in self._scheduled
-                # assert coro._id not in self._suspended
                 coro._generator = coro._swap_generator
                 coro._value = None
                 if coro._complete == 0:
                     coro._complete = None
                 elif isinstance(coro._complete, Event):
                     coro._complete.clear()
-                self._scheduled.add(cid)
                 coro._state = AsynCoro._Scheduled
+                self._scheduled.append(coro)
                 coro._hot_swappable = False
             else:
                 coro._exceptions.append((HotSwapException, HotSwapException(coro._swap_generator)))
                 # assert coro._state != AsynCoro._AwaitIO_
                 if coro._state in (AsynCoro._Suspended, AsynCoro._AwaitMsg_):
-                    self._suspended.discard(cid)
-                    self._scheduled.add(cid)
                     coro._state = AsynCoro._Scheduled
+                    self._scheduled.append(coro)
             coro._swap_generator = None
             if self._polling:
-                self._poll_event.set()
+                self._wakeup()
         self._lock.release()
         return 0
 
     def _schedule(self):
         """Internal use only.
         """
+        scheduled = self._scheduled
         while not self._quit:
             self._lock.acquire()
-            if not self._scheduled:
-                if self._timeouts:
-                    timeout = self._timeouts[0][0] - _time()
+            if self._run_loop:
+                if scheduled:
+                    # check for I/O events without waiting
+                    timeout = 0
+                elif self._timers:
+                    timeout = self._timers.next_expiry() - _time()
+                    if timeout < 0.0001:
+                        timeout = 0
+                else:
+                    timeout = None
+                if timeout != 0:
+                    self._polling = True
+                self._lock.release()
+                events = self._notifier._poll_events(timeout)
+                self._lock.acquire()
+                self._polling = False
+                # I/O tasks resume coroutines in this thread
+                self._notifier._dispatch(events)
+            elif not scheduled:
+                if self._timers:
+                    timeout = self._timers.next_expiry() - _time()
                     if timeout < 0.0001:
                         timeout = 0
                 else:
@@ -3685,31 +5499,36 @@ class AsynCoro(object):
                 self._poll_event.wait(timeout)
                 self._lock.acquire()
                 self._polling = False
-            if self._timeouts:
-                # wake up timed suspends; pollers may timeout slightly
-                # earlier, so give a bit of slack
-                now = _time() + 0.0001
-                while self._timeouts and self._timeouts[0][0] <= now:
-                    timeout, cid, alarm_value = heappop(self._timeouts)
-                    assert timeout <= now
-                    coro = self._coros.get(cid, None)
-                    if not coro or coro._timeout != timeout:
+            if self._timers:
+                # wake up timed suspends; cancelled timers are never
+                # returned, so each entry is a pending alarm
+                for alarm in self._timers.expire(_time()):
+                    if not alarm:
                         continue
+                    coro, alarm_value = alarm
                     if coro._state not in (AsynCoro._AwaitIO_, AsynCoro._Suspended,
                                            AsynCoro._AwaitMsg_):
                         logger.warning('coro %s/%s is in state %s for resume; ignored',
                                        coro._name, coro._id, coro._state)
                         continue
                     coro._timeout = None
-                    self._suspended.discard(cid)
-                    self._scheduled.add(cid)
                     coro._state = AsynCoro._Scheduled
+                    scheduled.append(coro)
                     coro._value = alarm_value
-            scheduled = [self._coros[cid] for cid in self._scheduled]
-            self._lock.release()
 
-            for coro in scheduled:
-                self._lock.acquire()
+            # run coroutines that are ready now in the order they became
+            # ready; coroutines that are (re)scheduled while these run are
+            # queued behind them and run in next iteration. The lock is
+            # released only while a coroutine runs, so state transitions
+            # after a coroutine runs and before next one runs are done
+            # with one lock acquisition.
+            n = len(scheduled)
+            while n:
+                n -= 1
+                coro = scheduled.popleft()
+                if coro._state != AsynCoro._Scheduled:
+                    # coroutine finished after it was resumed
+                    continue
                 coro._state = AsynCoro._Running
                 self.__cur_coro = coro
                 self._lock.release()
@@ -3750,11 +5569,15 @@ class AsynCoro(object):
                             coro._value = None
                             # coro._msgs is not reset, so new
                             # coroutine can process pending messages
-                            coro._state = AsynCoro._Scheduled
+                            if coro._state != AsynCoro._Scheduled:
+                                coro._state = AsynCoro._Scheduled
+                                scheduled.append(coro)
                         else:
                             logger.warning('invalid HotSwapException from %s/%s ignored',
                                            coro._name, coro._id)
-                        self._lock.release()
+                            if coro._state == AsynCoro._Running:
+                                coro._state = AsynCoro._Scheduled
+                                scheduled.append(coro)
                         continue
                     else:
                         coro._exceptions.append(exc)
@@ -3767,15 +5590,18 @@ class AsynCoro(object):
                             coro._exceptions.append((HotSwapException,
                                                      HotSwapException(coro._swap_generator)))
                             coro._swap_generator = None
-                            coro._state = AsynCoro._Scheduled
+                            if coro._state != AsynCoro._Scheduled:
+                                coro._state = AsynCoro._Scheduled
+                                scheduled.append(coro)
                         elif coro._exceptions:
                             # exception in callee, restore saved value
                             coro._value = caller[1]
-                            self._suspended.discard(coro._id)
-                            self._scheduled.add(coro._id)
-                            coro._state = AsynCoro._Scheduled
+                            if coro._state != AsynCoro._Scheduled:
+                                coro._state = AsynCoro._Scheduled
+                                scheduled.append(coro)
                         elif coro._state == AsynCoro._Running:
                             coro._state = AsynCoro._Scheduled
+                            scheduled.append(coro)
                     else:
                         if coro._exceptions:
                             exc = coro._exceptions[0]
@@ -3825,6 +5651,12 @@ class AsynCoro(object):
                                 monitor.send(exc)
                         if not coro._monitors or not coro._exceptions:
                             coro._msgs.clear()
+                            if coro._mailbox:
+                                # deliveries waiting for room fail
+                                for sender, message in coro._mailbox.waiting:
+                                    if sender._state == AsynCoro._AwaitIO_:
+                                        sender._scheduler._resume(sender, -1, AsynCoro._AwaitIO_)
+                                coro._mailbox = None
                             coro._monitors.clear()
                             coro._exceptions = []
                             if self._coros.pop(coro._id, None) != coro:
@@ -3841,14 +5673,13 @@ class AsynCoro(object):
                             coro._complete.set()
                         else:
                             coro._complete = 0
-                        self._scheduled.discard(coro._id)
                         if len(self._coros) == self._daemons:
                             self._complete.set()
-                    self._lock.release()
                 else:
                     self._lock.acquire()
                     if coro._state == AsynCoro._Running:
                         coro._state = AsynCoro._Scheduled
+                        scheduled.append(coro)
                         # if this coroutine is suspended, don't update
                         # the value; when it is resumed, it will be
                         # updated with the 'update' value
@@ -3860,8 +5691,8 @@ class AsynCoro(object):
                         coro._callers.append((coro._generator, coro._value))
                         coro._generator = retval
                         coro._value = None
-                    self._lock.release()
             self.__cur_coro = None
+            self._lock.release()
 
         self._lock.acquire()
         for coro in self._coros.itervalues():
@@ -3883,14 +5714,16 @@ class AsynCoro(object):
                 coro._complete.set()
             else:
                 coro._complete = 0
-        self._scheduled = set()
-        self._suspended = set()
-        self._timeouts = []
+        scheduled.clear()
+        self._timers = _TimerWheel()
         self._coros = {}
         self._channels = {}
         self.__class__._instance = None
         self._quit = True
         self._lock.release()
+        if self._run_loop:
+            # other schedulers may still need I/O events
+            self._notifier._start_poll_thread()
         if self._location:
             logger.debug('AsynCoro %s terminated', self._location)
         else:
@@ -3938,8 +5771,8 @@ class AsynCoro(object):
             self._quit = True
             # add a dummy timeout so scheduler will not wait for any other
             # timeouts left behind by coroutines that may have quit already
-            heappush(self._timeouts, (_time() + 0.1, None, None))
-            self._poll_event.set()
+            self._timers.add(_time() + 0.1, None)
+            self._wakeup()
             self._lock.release()
             self._complete.wait()
         else:
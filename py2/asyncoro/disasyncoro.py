@@ -8,6 +8,7 @@ import socket
 import inspect
 import traceback
 import os
+import sys
 import stat
 import hashlib
 import collections
@@ -16,6 +17,8 @@ import tempfile
 import threading
 import errno
 import atexit
+import cPickle as pickle
+from cStringIO import StringIO
 try:
     import netifaces
 except ImportError:
@@ -29,8 +32,11 @@ __copyright__ = "Copyright (c) 2012-2014 Giridhar Pemmasani"
 __license__ = "MIT"
 __url__ = "http://asyncoro.sourceforge.net"
 
+# peers must run same version: peer protocol (e.g., request ids, batches of
+# one-way requests, serializer tags) is not compatible across versions, so
+# 'ping' / 'pong' from peers with other versions are refused
 __version__ = asyncoro.__version__
-__all__ = asyncoro.__all__ + ['RCI']
+__all__ = asyncoro.__all__ + ['RCI', 'Serializer', 'CompactSerializer']
 
 # if connections to a peer are not successful consecutively
 # MaxConnectionErrors times, peer is assumed dead and removed
@@ -38,11 +44,43 @@ MaxConnectionErrors = 10
 MsgTimeout = asyncoro.MsgTimeout
 
 
+def _host_id():
+    """Internal use only.
+
+    Returns string identifying this host, so peers running on same host
+    (even with different node addresses) can be detected.
+    """
+    for path in ['/etc/machine-id', '/var/lib/dbus/machine-id']:
+        try:
+            with open(path) as fd:
+                host_id = fd.read().strip()
+        except:
+            continue
+        if host_id:
+            return host_id
+    return socket.gethostname()
+
+
+def _keepalive(sock):
+    """Internal use only.
+
+    Enables TCP keepalive on (TCP) socket 'sock', so connections to
+    peers that are gone are detected even if they are idle.
+    """
+    if sock.family == getattr(socket, 'AF_UNIX', None):
+        return
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    if hasattr(socket, 'TCP_KEEPIDLE'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 60)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 6)
+
+
 class _NetRequest(object):
     """Internal use only.
     """
 
-    __slots__ = ('name', 'kwargs', 'dst', 'auth', 'event', 'reply', 'timeout')
+    __slots__ = ('name', 'kwargs', 'dst', 'auth', 'event', 'reply', 'timeout', 'id')
 
     def __init__(self, name, kwargs={}, dst=None, auth=None, timeout=None):
         self.name = name
@@ -52,10 +90,14 @@ class _NetRequest(object):
         self.event = None
         self.reply = None
         self.timeout = timeout
+        # requests sent by _Peer have id, so that many requests can be
+        # sent before replies, which are tagged with this id
+        self.id = None
 
     def __getstate__(self):
         state = {'name': self.name, 'kwargs': self.kwargs, 'dst': self.dst,
-                 'auth': self.auth, 'reply': self.reply, 'timeout': self.timeout}
+                 'auth': self.auth, 'reply': self.reply, 'timeout': self.timeout,
+                 'id': self.id}
         return state
 
     def __setstate__(self, state):
@@ -63,6 +105,158 @@ class _NetRequest(object):
             setattr(self, k, v)
 
 
+class Serializer(object):
+    """Serializes requests and replies exchanged with peers. This
+    serializer pickles them. Other serializers are subclasses with their
+    own 'name', 'tag', 'dumps' and 'loads'; an instance can be given as
+    'serializer' to AsynCoro (which also takes name of a serializer
+    already registered). Peers tell each other names of serializers they
+    have (when they find each other); requests to peers that don't have
+    serializer of this asyncoro are pickled. Messages serialized with
+    'dumps' are prefixed with 'tag' (one byte, other than that pickled
+    messages start with), so peers know to deserialize them with
+    'loads' (and reply with same serializer).
+    """
+
+    name = 'pickle'
+    tag = b''
+
+    # registered serializers, by name and by tag
+    _names = {}
+    _tags = {}
+
+    def dumps(self, obj):
+        return serialize(obj)
+
+    def loads(self, msg):
+        return deserialize(msg)
+
+    def encode(self, obj):
+        if self.tag:
+            return self.tag + self.dumps(obj)
+        else:
+            return self.dumps(obj)
+
+    @staticmethod
+    def decode(msg):
+        """Returns object in 'msg' and serializer it is encoded with.
+        """
+        serializer = Serializer._tags.get(msg[:1], None)
+        if serializer:
+            return (serializer.loads(msg[1:]), serializer)
+        return (deserialize(msg), _PickleSerializer)
+
+    @staticmethod
+    def register(serializer):
+        if not isinstance(serializer, Serializer):
+            raise ValueError('invalid serializer: %s' % serializer)
+        if serializer.tag:
+            if len(serializer.tag) != 1 or serializer.tag == b'\x80':
+                raise ValueError('invalid tag of serializer "%s"' % serializer.name)
+            other = Serializer._tags.get(serializer.tag, None)
+            if other and other.name != serializer.name:
+                raise ValueError('serializers "%s" and "%s" have same tag' %
+                                 (serializer.name, other.name))
+            Serializer._tags[serializer.tag] = serializer
+        Serializer._names[serializer.name] = serializer
+
+    @staticmethod
+    def get(name):
+        return Serializer._names.get(name, None)
+
+
+_PickleSerializer = Serializer()
+Serializer.register(_PickleSerializer)
+
+# CompactSerializer sends index of request name in this tuple instead of
+# name; names must only be appended, so peers agree on them
+_CompactReqNames = ('send', 'deliver', 'batch', 'locate_coro', 'locate_channel', 'locate_rci',
+                    'locate_peer', 'monitor', 'terminate_coro', 'subscribe', 'unsubscribe',
+                    'run_rci', 'del_file', 'send_file', 'peer_closed', 'ping', 'pong')
+_CompactReqCodes = dict((name, i) for i, name in enumerate(_CompactReqNames))
+
+
+def _compact_request(name, kwargs, dst, auth, reply, timeout, id):
+    req = _NetRequest.__new__(_NetRequest)
+    if isinstance(name, int):
+        name = _CompactReqNames[name]
+    req.name = name
+    req.kwargs = kwargs
+    req.dst = dst
+    req.auth = auth
+    req.event = None
+    req.reply = reply
+    req.timeout = timeout
+    req.id = id
+    return req
+
+
+def _compact_location(addr, port):
+    loc = Location.__new__(Location)
+    loc.addr = addr
+    loc.port = port
+    return loc
+
+
+def _compact_coro(name, id, location):
+    coro = Coro.__new__(Coro)
+    coro.__setstate__({'name': name, 'id': id, 'location': location})
+    return coro
+
+
+def _compact_channel(name, location):
+    channel = Channel.__new__(Channel)
+    channel.__setstate__({'name': name, 'location': location})
+    return channel
+
+
+class CompactSerializer(Serializer):
+    """Serializer that pickles requests, coroutines, channels and
+    locations as tuples (as persistent ids), with request names and
+    types of objects as numbers, instead of objects with their state, so
+    messages to peers are smaller and faster to serialize. Other
+    objects (e.g., messages sent to coroutines) are pickled as usual;
+    as 'inst_persistent_id' is not called for objects of builtin types,
+    they are not slowed down.
+    """
+
+    name = 'compact'
+    tag = b'\x01'
+
+    def __init__(self):
+        self._reducers = {
+            _NetRequest: lambda req: (0, _CompactReqCodes.get(req.name, req.name), req.kwargs,
+                                      req.dst, req.auth, req.reply, req.timeout, req.id),
+            Location: lambda loc: (1, loc.addr, loc.port),
+            Coro: lambda coro: (2, coro._name, str(coro._id), coro._location),
+            Channel: lambda channel: (3, channel._name, channel._location)
+            }
+        self._builders = (_compact_request, _compact_location, _compact_coro, _compact_channel)
+
+    def _persistent_id(self, obj):
+        reducer = self._reducers.get(type(obj), None)
+        if reducer:
+            return reducer(obj)
+        return None
+
+    def _persistent_load(self, pid):
+        return self._builders[pid[0]](*pid[1:])
+
+    def dumps(self, obj):
+        buf = StringIO()
+        pickler = pickle.Pickler(buf, pickle.HIGHEST_PROTOCOL)
+        pickler.inst_persistent_id = self._persistent_id
+        pickler.dump(obj)
+        return buf.getvalue()
+
+    def loads(self, msg):
+        unpickler = pickle.Unpickler(StringIO(msg))
+        unpickler.persistent_load = self._persistent_load
+        return unpickler.load()
+
+Serializer.register(CompactSerializer())
+
+
 class PeerStatus(object):
     """'peer_status' method of AsynCoro can be used to be notified of
     status of peers (other AsynCoro's to communicate for distributed
@@ -79,32 +273,183 @@ class PeerStatus(object):
         self.status = status
 
 
-class _Peer(object):
+class _PeerConn(object):
+    """Internal use only.
+
+    Connection to a peer; requests are sent over 'conn' by 'req_coro' and
+    wait in 'pending' for replies, which are received by 'reply_coro'.
+    """
+
+    __slots__ = ()
+
+    def idle(self):
+        return self.waiting and not self.reqs and not self.pending
+
+    def reply_proc(self, conn, coro=None):
+        """Receives replies to requests sent over 'conn' by 'req_proc' (in
+        any order) until connection is closed.
+        """
+        coro.set_daemon()
+        while 1:
+            try:
+                msg = yield conn.recv_msg()
+            except GeneratorExit:
+                # terminated by 'close_conn'
+                raise StopIteration(None)
+            except:
+                msg = None
+            if not msg:
+                break
+            try:
+                req_id, reply = Serializer.decode(msg)[0]
+            except:
+                logger.debug('%s: ignoring invalid reply from %s',
+                             _Peer._asyncoro._location, self.location)
+                break
+            req = self.pending.pop(req_id, None)
+            if req:
+                if req.event:
+                    if reply is not None or req.dst == self.location:
+                        req.reply = reply
+                        req.event.set()
+                else:
+                    req.reply = reply
+            if not self.pending:
+                # 'req_proc' may be waiting to close connection
+                _Peer._lock.acquire()
+                if self.waiting:
+                    self.waiting = False
+                    self.req_coro.send(1)
+                _Peer._lock.release()
+
+        # connection closed by peer or broken
+        if self.conn == conn:
+            self.reply_coro = None
+            self.close_conn()
+
+    def close_conn(self):
+        """Closes connection and fails requests waiting for replies.
+        """
+        if self.reply_coro:
+            self.reply_coro.terminate()
+            self.reply_coro = None
+        if self.conn:
+            try:
+                self.conn.shutdown(socket.SHUT_WR)
+                self.conn.close()
+            except:
+                pass
+            self.conn = None
+            _Peer._lock.acquire()
+            _Peer.conns.pop(self, None)
+            _Peer._lock.release()
+        pending, self.pending = self.pending, {}
+        for req in pending.values():
+            req.reply = None
+            if req.event:
+                req.event.set()
+
+
+class _InFlight(object):
+    """Internal use only.
+
+    Used as 'event' of batch of one-way requests sent (with id) to peer
+    with stripes: recipients of requests in batch are in flight over
+    connection 'peer_conn' (in 'inflight' of peer) until batch is
+    acknowledged (or fails), when 'set' is called.
+    """
+
+    __slots__ = ('inflight', 'peer_conn', 'keys')
+
+    def __init__(self, inflight, peer_conn, batch):
+        self.inflight = inflight
+        self.peer_conn = peer_conn
+        self.keys = [key for req in batch for key in _Peer.recipients(req)]
+        for key in self.keys:
+            entry = inflight.get(key, None)
+            if entry and entry[0] == peer_conn:
+                entry[1] += 1
+            else:
+                inflight[key] = [peer_conn, 1]
+
+    def set(self):
+        for key in self.keys:
+            entry = self.inflight.get(key, None)
+            if entry and entry[0] == self.peer_conn:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self.inflight[key]
+        self.keys = []
+
+
+class _Peer(_PeerConn):
     """Internal use only.
     """
 
     __slots__ = ('name', 'location', 'auth', 'keyfile', 'certfile', 'stream', 'conn',
-                 'reqs', 'waiting', 'req_coro')
+                 'reqs', 'waiting', 'req_coro', 'unix_path', 'pending', 'reply_coro', 'req_id',
+                 'connects', 'reuses', 'evictions', 'stripes', 'stripe_idx', 'inflight',
+                 'serializer')
 
     peers = {}
     status_coro = None
     _asyncoro = None
     _lock = threading.Lock()
-
-    def __init__(self, name, location, auth, keyfile, certfile):
+    # requests that don't get replies; these are sent in batches (of at
+    # most _MaxBatch requests queued one after another, with messages of
+    # at most 'bulk_size' bytes in all, unless a message is bigger)
+    _OneWayReqs = set(['send'])
+    # requests with messages to coroutines / channels (recipients)
+    _MsgReqs = set(['send', 'deliver'])
+    _MaxBatch = 1024
+    # connections are kept open until they are idle for 'idle_timeout'
+    # seconds; if more than 'max_conns' connections are open, idle
+    # connections of least recently used peers are closed
+    idle_timeout = 60
+    max_conns = 256
+    # connections (peers and their stripes) that are open, in the order
+    # of their use
+    conns = collections.OrderedDict()
+    # with 'peer_conns' > 1, requests (and batches of one-way requests) of
+    # at least 'bulk_size' bytes (serialized) are sent round-robin over
+    # additional connections (stripes) to peer, so they don't hold up other
+    # requests; messages ('send' / 'deliver') to a recipient are sent over
+    # the connection its earlier one-way requests are in flight on (if
+    # any), so they are not reordered
+    peer_conns = 1
+    bulk_size = 65536
+
+    def __init__(self, name, location, auth, keyfile, certfile, unix_path=None,
+                 serializer=None):
         self.name = name
         self.location = location
         self.auth = auth
         self.keyfile = keyfile
         self.certfile = certfile
+        # peer on same host is connected with Unix domain socket at this path
+        self.unix_path = unix_path
         self.stream = False
+        # requests to peer are encoded with this serializer
+        self.serializer = serializer if serializer else _PickleSerializer
         self.conn = None
         self.reqs = collections.deque()
         self.waiting = False
+        # requests sent (over 'conn') but not replied yet, by id
+        self.pending = {}
+        self.reply_coro = None
+        self.req_id = 0
+        # number of connections made, requests sent over open connection and
+        # connections closed to limit number of open connections
+        self.connects = self.reuses = self.evictions = 0
+        self.stripes = []
+        self.stripe_idx = 0
+        # recipients of one-way requests in flight (with 'stripes') -> [connection, count]
+        self.inflight = {}
         _Peer._lock.acquire()
         _Peer.peers[(location.addr, location.port)] = self
         _Peer._lock.release()
         self.req_coro = SysCoro(self.req_proc)
+        self.set_conns(_Peer.peer_conns)
         if _Peer.status_coro:
             _Peer.status_coro.send(PeerStatus(location, name, PeerStatus.Online))
 
@@ -122,6 +467,60 @@ class _Peer(object):
         _Peer._lock.release()
         return peer
 
+    @staticmethod
+    def get_conn_stats():
+        _Peer._lock.acquire()
+        stats = dict((copy.copy(peer.location), {'connects': peer.connects,
+                                                 'reuses': peer.reuses,
+                                                 'evictions': peer.evictions,
+                                                 'conns': len(peer.stripes) + 1})
+                     for peer in _Peer.peers.values())
+        _Peer._lock.release()
+        return stats
+
+    @staticmethod
+    def evict_conns(n=1):
+        """Closes idle connections of least recently used peers and, if
+        necessary, idle connections from peers, so (if possible) 'n'
+        more connections can be open without exceeding 'max_conns'.
+        """
+        _Peer._lock.acquire()
+        tcp_conns = _Peer._asyncoro._tcp_conns
+        n += len(_Peer.conns) + len(tcp_conns) - _Peer.max_conns
+        evict = []
+        for peer_conn in _Peer.conns.values():
+            if n <= 0:
+                break
+            if peer_conn.idle():
+                evict.append(peer_conn)
+                n -= 1
+        if n > 0:
+            idle_conns = [conn for conn, idle in tcp_conns.items() if idle][:n]
+        else:
+            idle_conns = []
+        _Peer._lock.release()
+        for peer_conn in evict:
+            if isinstance(peer_conn, _Peer):
+                peer_conn.evictions += 1
+            else:
+                peer_conn.peer.evictions += 1
+            peer_conn.close_conn()
+        for conn in idle_conns:
+            # task serving connection finds it closed and quits
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except:
+                pass
+
+    @staticmethod
+    def use_conn(peer_conn):
+        """Marks 'peer_conn' as most recently used.
+        """
+        _Peer._lock.acquire()
+        _Peer.conns.pop(peer_conn, None)
+        _Peer.conns[peer_conn] = peer_conn
+        _Peer._lock.release()
+
     @staticmethod
     def send_req(req):
         _Peer._lock.acquire()
@@ -198,36 +597,97 @@ class _Peer(object):
             else:
                 self.waiting = True
                 _Peer._lock.release()
-                if not self.stream and self.conn:
-                    self.conn.shutdown(socket.SHUT_WR)
-                    self.conn.close()
-                    self.conn = None
+                if not self.stream and self.conn and not self.pending:
+                    # close connection if it is not used for a while
+                    timeout = _Peer.idle_timeout
+                else:
+                    timeout = None
                 try:
-                    yield coro.receive()
+                    msg = yield coro.receive(timeout=timeout)
                 except GeneratorExit:
                     break
+                if msg is None and timeout is not None and not self.reqs and not self.pending:
+                    self.close_conn()
+                continue
             req = self.reqs.popleft()
-            if not self.conn:
-                self.conn = AsyncSocket(socket.socket(socket.AF_INET, socket.SOCK_STREAM),
-                                        keyfile=self.keyfile, certfile=self.certfile)
-                if req.timeout:
-                    self.conn.settimeout(req.timeout)
+            req.auth = self.auth
+            # request sent to all peers (e.g., 'locate_peer') is same object
+            # in their queues, so its id (set here) is kept in 'req_id' for
+            # 'pending', as other peers may change it while this one waits
+            req_id = None
+            peer_conn = None
+            if req.name in _Peer._OneWayReqs:
+                batch = [req]
+                if self.stripes:
+                    # batch is sent over connection that has earlier requests
+                    # to its recipients in flight, so it can't include
+                    # requests that must go over another connection
+                    peer_conn = self.inflight_conn(req)
+                    size = _Peer.msg_size(req)
+                    while (self.reqs and self.reqs[0].name in _Peer._OneWayReqs and
+                           len(batch) < _Peer._MaxBatch):
+                        size += _Peer.msg_size(self.reqs[0])
+                        if size > _Peer.bulk_size:
+                            break
+                        conn = self.inflight_conn(self.reqs[0])
+                        if conn:
+                            if not peer_conn:
+                                peer_conn = conn
+                            elif conn != peer_conn:
+                                break
+                        batch.append(self.reqs.popleft())
+                else:
+                    size = _Peer.msg_size(req)
+                    while (self.reqs and self.reqs[0].name in _Peer._OneWayReqs and
+                           len(batch) < _Peer._MaxBatch):
+                        size += _Peer.msg_size(self.reqs[0])
+                        if size > _Peer.bulk_size:
+                            break
+                        batch.append(self.reqs.popleft())
+                req = _NetRequest('batch', kwargs={'reqs': batch}, dst=self.location,
+                                  auth=self.auth)
+                if self.stripes:
+                    # peer acknowledges batch with id, after which its
+                    # recipients are no longer in flight
+                    self.req_id += 1
+                    req.id = req_id = self.req_id
+            else:
+                self.req_id += 1
+                req.id = req_id = self.req_id
+                if self.stripes and req.name in _Peer._MsgReqs:
+                    # e.g., 'deliver' can't get ahead of earlier 'send'
+                    peer_conn = self.inflight_conn(req)
+            try:
+                msg = self.serializer.encode(req)
+            except:
+                logger.warning('%s: could not serialize "%s" to %s', _Peer._asyncoro._location,
+                               req.name, self.location)
+                req.reply = None
+                if req.event:
+                    req.event.set()
+                continue
+            if self.stripes and req_id:
+                if not peer_conn and len(msg) >= _Peer.bulk_size:
+                    peer_conn = self.stripes[self.stripe_idx]
+                    self.stripe_idx = (self.stripe_idx + 1) % len(self.stripes)
+                if req.name == 'batch':
+                    req.event = _InFlight(self.inflight, peer_conn or self, batch)
+            if peer_conn and peer_conn != self:
+                stripe = peer_conn
+                stripe.reqs.append((req, req_id, msg))
+                if stripe.waiting:
+                    stripe.waiting = False
+                    stripe.req_coro.send(1)
+                continue
+
+            if self.conn:
+                self.reuses += 1
+            else:
                 try:
-                    yield self.conn.connect((self.location.addr, self.location.port))
+                    self.conn = yield self.connect(req.timeout)
                 except GeneratorExit:
-                    if self.conn:
-                        try:
-                            self.conn.shutdown(socket.SHUT_WR)
-                            self.conn.close()
-                        except:
-                            pass
-                        self.conn = None
                     break
                 except:
-                    if self.conn:
-                        # self.conn.shutdown(socket.SHUT_WR)
-                        self.conn.close()
-                        self.conn = None
                     req.reply = None
                     if req.event:
                         req.event.set()
@@ -240,20 +700,13 @@ class _Peer(object):
                 else:
                     if conn_errors:
                         conn_errors = 0
-            else:
-                self.conn.settimeout(req.timeout)
+                    self.reply_coro = SysCoro(self.reply_proc, self.conn)
+            _Peer.use_conn(self)
 
-            req.auth = self.auth
+            if req_id:
+                self.pending[req_id] = req
             try:
-                yield self.conn.send_msg(serialize(req))
-                reply = yield self.conn.recv_msg()
-                reply = deserialize(reply)
-                if req.event:
-                    if reply is not None or req.dst == self.location:
-                        req.reply = reply
-                        req.event.set()
-                else:
-                    req.reply = reply
+                yield self.conn.send_msg(msg)
             except socket.error as exc:
                 logger.debug('%s: Could not send "%s" to %s', _Peer._asyncoro._location, req.name,
                              self.location)
@@ -261,47 +714,12 @@ class _Peer(object):
                 if len(exc.args) == 1 and exc.args[0] == 'hangup':
                     logger.warning('peer "%s" not reachable', self.location)
                     # TODO: remove peer?
-                try:
-                    self.conn.shutdown(socket.SHUT_WR)
-                    self.conn.close()
-                except:
-                    pass
-                self.conn = None
-                req.reply = None
-                if req.event:
-                    req.event.set()
-            except socket.timeout:
-                # logger.debug(traceback.format_exc())
-                try:
-                    self.conn.shutdown(socket.SHUT_WR)
-                    self.conn.close()
-                except:
-                    pass
-                self.conn = None
-                req.reply = None
-                if req.event:
-                    req.event.set()
+                self.close_conn()
             except GeneratorExit:
-                if self.conn:
-                    try:
-                        self.conn.shutdown(socket.SHUT_WR)
-                        self.conn.close()
-                    except:
-                        pass
-                    self.conn = None
                 break
             except:
                 # logger.debug(traceback.format_exc())
-                if self.conn:
-                    try:
-                        self.conn.shutdown(socket.SHUT_WR)
-                        self.conn.close()
-                    except:
-                        pass
-                    self.conn = None
-                req.reply = None
-                if req.event:
-                    req.event.set()
+                self.close_conn()
 
         if req and isinstance(req.event, Event):
             req.reply = None
@@ -313,13 +731,103 @@ class _Peer(object):
 
         self.reqs.clear()
         self.req_coro = None
-        if self.conn:
-            # self.conn.shutdown(socket.SHUT_WR)
-            self.conn.close()
-            self.conn = None
+        self.close_conn()
+        self.set_conns(1)
         _Peer.remove(self.location)
         raise StopIteration(None)
 
+    def connect(self, timeout, coro=None):
+        """Returns new connection to peer; peer on same host is connected
+        with Unix domain socket if possible, otherwise with TCP.
+        """
+        if len(_Peer.conns) + len(_Peer._asyncoro._tcp_conns) >= _Peer.max_conns:
+            _Peer.evict_conns()
+        while 1:
+            if self.unix_path:
+                conn = AsyncSocket(socket.socket(socket.AF_UNIX, socket.SOCK_STREAM),
+                                   keyfile=self.keyfile, certfile=self.certfile)
+                addr = self.unix_path
+            else:
+                conn = AsyncSocket(socket.socket(socket.AF_INET, socket.SOCK_STREAM),
+                                   keyfile=self.keyfile, certfile=self.certfile)
+                addr = (self.location.addr, self.location.port)
+            if timeout:
+                conn.settimeout(timeout)
+            try:
+                yield conn.connect(addr)
+            except GeneratorExit:
+                conn.close()
+                raise
+            except:
+                conn.close()
+                if self.unix_path:
+                    # fall back to TCP
+                    logger.debug('%s: could not connect to %s at "%s"',
+                                 _Peer._asyncoro._location, self.location, self.unix_path)
+                    self.unix_path = None
+                    continue
+                raise
+            break
+        # requests wait for replies (with their timeouts), so connection
+        # itself doesn't time out
+        conn.settimeout(0)
+        _keepalive(conn)
+        self.connects += 1
+        raise StopIteration(conn)
+
+    @staticmethod
+    def msg_size(req):
+        """Returns size of message in request 'req' (in _OneWayReqs), to
+        limit size of batches. It is approximate (message is not
+        serialized): bytes, bytearray and str (in message or its items,
+        if it is tuple, list or dict) are counted with their lengths and
+        other objects with their (shallow) sizes in memory.
+        """
+        msg = req.kwargs.get('data', req.kwargs.get('message', None))
+        if isinstance(msg, (bytes, bytearray, str)):
+            return len(msg)
+        if isinstance(msg, dict):
+            items = msg.values()
+        elif isinstance(msg, (tuple, list)):
+            items = msg
+        else:
+            return sys.getsizeof(msg)
+        return sum(len(item) if isinstance(item, (bytes, bytearray, str))
+                   else sys.getsizeof(item) for item in items)
+
+    @staticmethod
+    def recipients(req):
+        """Returns (name, id) of coroutines and (name, None) of channels
+        request 'req' (in _MsgReqs) is sent to.
+        """
+        if 'recipients' in req.kwargs:
+            return req.kwargs['recipients']
+        if 'channel' in req.kwargs:
+            return [(req.kwargs['channel'], None)]
+        return [(req.kwargs['name'], req.kwargs['coro'])]
+
+    def inflight_conn(self, req):
+        """Returns connection (peer or its stripe) that earlier one-way
+        requests to recipients of 'req' are in flight on, or None.
+        """
+        for key in _Peer.recipients(req):
+            entry = self.inflight.get(key, None)
+            if entry and (entry[0] == self or entry[0] in self.stripes):
+                return entry[0]
+        return None
+
+    def set_conns(self, n):
+        """Use (at most) 'n' connections to peer; first one is used for
+        all requests but bulk requests, which are sent over the others.
+        """
+        n = max(n, 1) - 1
+        while len(self.stripes) > n:
+            stripe = self.stripes.pop()
+            stripe.req_coro.terminate()
+        while len(self.stripes) < n:
+            self.stripes.append(_PeerStripe(self))
+        self.stripe_idx = 0
+
     @staticmethod
     def remove(location):
         _Peer._lock.acquire()
@@ -352,6 +860,79 @@ class _Peer(object):
         _Peer._lock.release()
 
 
+class _PeerStripe(_PeerConn):
+    """Internal use only.
+
+    Additional connection to peer, over which bulk requests are sent by
+    peer's 'req_proc'.
+    """
+
+    __slots__ = ('peer', 'location', 'conn', 'reqs', 'waiting', 'req_coro', 'pending',
+                 'reply_coro')
+
+    def __init__(self, peer):
+        self.peer = peer
+        self.location = peer.location
+        self.conn = None
+        # requests, along with their ids and serialized messages, to be sent
+        self.reqs = collections.deque()
+        self.waiting = False
+        self.pending = {}
+        self.reply_coro = None
+        self.req_coro = SysCoro(self.req_proc)
+
+    def req_proc(self, coro=None):
+        coro.set_daemon()
+        while 1:
+            if not self.reqs:
+                self.waiting = True
+                if not self.peer.stream and self.conn and not self.pending:
+                    timeout = _Peer.idle_timeout
+                else:
+                    timeout = None
+                try:
+                    msg = yield coro.receive(timeout=timeout)
+                except GeneratorExit:
+                    break
+                if msg is None and timeout is not None and not self.reqs and not self.pending:
+                    self.close_conn()
+                continue
+            req, req_id, msg = self.reqs.popleft()
+            if self.conn:
+                self.peer.reuses += 1
+            else:
+                try:
+                    self.conn = yield self.peer.connect(req.timeout)
+                except GeneratorExit:
+                    self.reqs.appendleft((req, req_id, msg))
+                    break
+                except:
+                    req.reply = None
+                    if req.event:
+                        req.event.set()
+                    continue
+                self.reply_coro = SysCoro(self.reply_proc, self.conn)
+            _Peer.use_conn(self)
+
+            self.pending[req_id] = req
+            try:
+                yield self.conn.send_msg(msg)
+            except GeneratorExit:
+                break
+            except:
+                logger.debug('%s: Could not send "%s" to %s', _Peer._asyncoro._location, req.name,
+                             self.location)
+                self.close_conn()
+
+        for req, req_id, msg in self.reqs:
+            req.reply = None
+            if req.event:
+                req.event.set()
+        self.reqs.clear()
+        self.close_conn()
+        raise StopIteration(None)
+
+
 class RCI(object):
     """Remote Coro (Callable) Interface.
 
@@ -523,6 +1104,46 @@ class AsynCoro(asyncoro.AsynCoro):
     'max_file_size' is maximum length of file in bytes allowed for
     transferred files. If it is 0 or None (default), there is no
     limit.
+
+    'backlog' is length of queue of pending connections for TCP
+    server socket (default 128). If 'acceptors' is more than 1 (and
+    platform supports SO_REUSEPORT), that many server sockets are
+    bound to same TCP port with SO_REUSEPORT, each with its own
+    coroutine accepting connections, so kernel spreads connections
+    (e.g., during connection storms) among them.
+
+    If 'unix_sock' is True (default) and platform supports Unix domain
+    sockets, asyncoro also listens on Unix domain socket and
+    advertises it to peers; peers running on same host (detected with
+    node address or host id) connect to it instead of TCP port, which
+    is used if that fails.
+
+    Connections to peers are kept open (with TCP keepalive) so they
+    are reused for later requests, until they are not used for
+    'idle_timeout' seconds (default 60). If more than 'max_conns'
+    connections (default 256), to and from peers, are to be open, idle
+    connections of least recently used peers (and then idle
+    connections from peers) are closed. See 'peer_conn_stats'. When
+    asyncoro finishes, idle connections are closed right away.
+
+    If 'peer_conns' is more than 1, that many connections are used with
+    each peer (see 'peer' to set it per peer): requests with large
+    messages (e.g., 'deliver' or 'send' of bulk data) are sent
+    round-robin over additional connections, so messages to peer that
+    are sent over first connection are not held up behind them. Messages
+    sent (with 'send' or 'deliver') to a coroutine or channel are still
+    received in the order they are sent: while earlier ones sent with
+    'send' are in flight over a connection, later ones to it are sent
+    over that connection.
+
+    'serializer' is name of (registered) serializer, or instance of
+    Serializer (subclass), used to serialize requests to peers that
+    have it (others are sent pickled requests). Default 'compact'
+    serializer (see CompactSerializer) is faster than pickle.
+
+    If 'run_loop' is True, user coroutines and I/O events are processed
+    in one thread; if 'edge_triggered' is True, sockets are registered
+    with epoll for edge-triggered notifications; see asyncoro.AsynCoro.
     """
 
     __metaclass__ = Singleton
@@ -533,7 +1154,8 @@ class AsynCoro(asyncoro.AsynCoro):
     def __init__(self, *args, **kwargs):
         AsynCoro._instance = self
         atexit.register(self.finish)
-        super(self.__class__, self).__init__()
+        super(self.__class__, self).__init__(run_loop=kwargs.pop('run_loop', False),
+                                             edge_triggered=kwargs.pop('edge_triggered', False))
         RCI._asyncoro = _SysAsynCoro_._asyncoro = self
         self._sys_asyncoro = _SysAsynCoro_(*args, **kwargs)
         self.__class__._sys_asyncoro = self._sys_asyncoro
@@ -610,7 +1232,7 @@ class AsynCoro(asyncoro.AsynCoro):
             self._lock.release()
         raise StopIteration(loc)
 
-    def peer(self, loc, udp_port=0, stream_send=False, broadcast=False):
+    def peer(self, loc, udp_port=0, stream_send=False, broadcast=False, conns=None):
         """Must be used with 'yield', as
         'status = yield scheduler.peer("loc")'.
 
@@ -631,13 +1253,16 @@ class AsynCoro(asyncoro.AsynCoro):
         the network of peer. This can be used if client is on remote
         network and needs to communicate with all asyncoro's available
         on the network of peer (at 'loc').
+
+        If 'conns' is given, that many connections are used with peer(s)
+        (instead of 'peer_conns' given to AsynCoro).
         """
 
         if not self._sys_asyncoro:
             raise StopIteration(-1)
 
         def _peer(coro=None):
-            SysCoro(self._sys_asyncoro.peer, coro, loc, udp_port, stream_send, broadcast)
+            SysCoro(self._sys_asyncoro.peer, coro, loc, udp_port, stream_send, broadcast, conns)
             yield coro.recv()
 
         yield Coro(_peer).finish()
@@ -656,6 +1281,16 @@ class AsynCoro(asyncoro.AsynCoro):
         """
         return _Peer.get_peers()
 
+    def peer_conn_stats(self):
+        """Returns dictionary of connection statistics of current peers,
+        keyed by their Location instances. Each value is dictionary with
+        number of connections made ('connects'), requests sent over
+        already open connection ('reuses'), connections closed to
+        limit number of open connections ('evictions') and connections
+        used with peer ('conns').
+        """
+        return _Peer.get_conn_stats()
+
     def close_peer(self, location, timeout=MsgTimeout):
         """Must be used with 'yield', as
         'yield scheduler.close_peer("loc")'.
@@ -738,11 +1373,10 @@ class AsynCoro(asyncoro.AsynCoro):
             recvd = deserialize(recvd)
             sent = 0
             while sent == recvd:
-                data = fd.read(1024000)
-                if not data:
+                n = yield sock.sendfile(fd, sent, 1024000)
+                if not n:
                     break
-                yield sock.sendall(data)
-                sent += len(data)
+                sent += n
                 recvd = yield sock.recv_msg()
                 recvd = deserialize(recvd)
             if recvd == stat_buf.st_size:
@@ -818,13 +1452,36 @@ class _SysAsynCoro_(asyncoro.AsynCoro):
 
     _instance = None
     _asyncoro = None
+    # requests handled with '_req_reply' (which may be pipelined)
+    _ReplyReqs = set(['send', 'deliver', 'run_rci', 'locate_coro', 'locate_channel',
+                      'locate_rci', 'monitor', 'terminate_coro', 'subscribe', 'unsubscribe',
+                      'locate_peer', 'del_file'])
+    # requests whose handlers may wait
+    _WaitReqs = set(['deliver', 'subscribe', 'unsubscribe'])
 
     def __init__(self, udp_port=0, tcp_port=0, node=None, ext_ip_addr=None,
                  name=None, discover_peers=True,
                  secret='', certfile=None, keyfile=None, notifier=None,
-                 dest_path=None, max_file_size=None):
+                 dest_path=None, max_file_size=None, backlog=128, acceptors=1,
+                 unix_sock=True, idle_timeout=60, max_conns=256, peer_conns=1,
+                 serializer='compact'):
         super(self.__class__, self).__init__()
         SysCoro._asyncoro = _Peer._asyncoro = self
+        _Peer.idle_timeout = idle_timeout
+        _Peer.max_conns = max_conns
+        _Peer.peer_conns = peer_conns
+        # number of connections to use with peers, set with 'peer'
+        self._peer_conns = {}
+        # connections from peers (to '_tcp_task'); value is True if
+        # connection is idle (waiting for request)
+        self._tcp_conns = {}
+        if isinstance(serializer, Serializer):
+            Serializer.register(serializer)
+        elif Serializer.get(serializer):
+            serializer = Serializer.get(serializer)
+        else:
+            raise ValueError('invalid serializer: %s' % serializer)
+        self._serializer = serializer
         if node:
             node = socket.gethostbyname(node)
         else:
@@ -863,14 +1520,23 @@ class _SysAsynCoro_(asyncoro.AsynCoro):
         if hasattr(socket, 'SO_REUSEPORT'):
             self._udp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self._udp_sock.bind(('', udp_port))
-        self._tcp_sock = AsyncSocket(socket.socket(socket.AF_INET, socket.SOCK_STREAM),
-                                     keyfile=self._keyfile, certfile=self._certfile)
-        if tcp_port:
-            if hasattr(socket, 'SO_REUSEADDR'):
-                self._tcp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            if hasattr(socket, 'SO_REUSEPORT'):
-                self._tcp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
-        self._tcp_sock.bind((node, tcp_port))
+        if acceptors > 1 and not hasattr(socket, 'SO_REUSEPORT'):
+            logger.warning('SO_REUSEPORT is not supported; using one acceptor')
+            acceptors = 1
+        self._tcp_socks = []
+        for i in range(acceptors):
+            sock = AsyncSocket(socket.socket(socket.AF_INET, socket.SOCK_STREAM),
+                               keyfile=self._keyfile, certfile=self._certfile)
+            if tcp_port or acceptors > 1:
+                if hasattr(socket, 'SO_REUSEADDR'):
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                if hasattr(socket, 'SO_REUSEPORT'):
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind((node, tcp_port))
+            # other acceptors bind to port of first socket
+            tcp_port = sock.getsockname()[1]
+            self._tcp_socks.append(sock)
+        self._tcp_sock = self._tcp_socks[0]
         self._location = Location(*self._tcp_sock.getsockname())
         if not self._location.port:
             raise Exception('could not start network server at %s' % (self._location))
@@ -894,7 +1560,29 @@ class _SysAsynCoro_(asyncoro.AsynCoro):
             self._signature = os.urandom(20).encode('hex')
             self._auth_code = hashlib.sha1(self._signature + secret).hexdigest()
 
-        self._tcp_sock.listen(32)
+        for sock in self._tcp_socks:
+            sock.listen(backlog)
+        self._host_id = _host_id()
+        self._unix_sock = self._unix_path = None
+        if unix_sock and hasattr(socket, 'AF_UNIX'):
+            # peers on same host connect to this socket instead of TCP socket
+            unix_path = os.path.join(tempfile.gettempdir(), 'asyncoro-%s-%s.sock' %
+                                     (self._tcp_sock.getsockname()[0], self._location.port))
+            try:
+                if os.path.exists(unix_path):
+                    os.remove(unix_path)
+                self._unix_sock = AsyncSocket(socket.socket(socket.AF_UNIX, socket.SOCK_STREAM),
+                                              keyfile=self._keyfile, certfile=self._certfile)
+                self._unix_sock.bind(unix_path)
+                self._unix_sock.listen(backlog)
+            except:
+                logger.warning('could not create Unix domain socket "%s"', unix_path)
+                logger.debug(traceback.format_exc())
+                if self._unix_sock:
+                    self._unix_sock.close()
+                    self._unix_sock = None
+            else:
+                self._unix_path = unix_path
         logger.info('network server %s@ %s, udp_port=%s', '"%s" ' % name if name else '',
                     self._location, self._udp_sock.getsockname()[1])
         self._broadcast = '<broadcast>'
@@ -908,7 +1596,11 @@ class _SysAsynCoro_(asyncoro.AsynCoro):
                     continue
                 break
         self._ignore_peers = False
-        self._tcp_coro = SysCoro(self._tcp_proc)
+        self._tcp_coro = SysCoro(self._tcp_proc, self._tcp_sock)
+        for sock in self._tcp_socks[1:]:
+            SysCoro(self._tcp_proc, sock)
+        if self._unix_sock:
+            SysCoro(self._tcp_proc, self._unix_sock)
         self._udp_coro = SysCoro(self._udp_proc, discover_peers)
 
     @staticmethod
@@ -924,19 +1616,44 @@ class _SysAsynCoro_(asyncoro.AsynCoro):
         self.__dest_path = path
 
     def finish(self):
+        # close idle connections from peers, so peers notice (and close
+        # their ends) right away; tasks serving connections from peers
+        # are daemons, so finish doesn't wait for them (connections are
+        # closed, rather than shut down, so those tasks, which are
+        # terminated, are not resumed with end of connection);
+        # connections to peers are closed after they are notified that
+        # this asyncoro is closed
+        _Peer._lock.acquire()
+        conns = [conn for conn, idle in self._tcp_conns.items() if idle]
+        _Peer._lock.release()
+        for conn in conns:
+            try:
+                conn.close()
+            except:
+                pass
         super(self.__class__, self).finish()
         if self._udp_sock:
             self._udp_sock.close()
             self._udp_sock = None
         if self._tcp_sock:
-            self._tcp_sock.close()
+            for sock in self._tcp_socks:
+                sock.close()
+            self._tcp_socks = []
             self._tcp_sock = None
+        if self._unix_sock:
+            self._unix_sock.close()
+            self._unix_sock = None
+            try:
+                os.remove(self._unix_path)
+            except:
+                pass
 
-    def peer(self, client, loc, udp_port=0, stream_send=False, broadcast=False, coro=None):
+    def peer(self, client, loc, udp_port=0, stream_send=False, broadcast=False, conns=None,
+             coro=None):
         """
         _Must_ be called with SysCoro
         """
-        def _peer(loc, udp_port, stream_send, broadcast):
+        def _peer(loc, udp_port, stream_send, broadcast, conns):
             if not isinstance(loc, Location):
                 try:
                     loc = socket.gethostbyname(loc)
@@ -950,6 +1667,8 @@ class _SysAsynCoro_(asyncoro.AsynCoro):
                 self._stream_peers[(loc.addr, loc.port)] = True
             else:
                 self._stream_peers.pop((loc.addr, loc.port), None)
+            if conns:
+                self._peer_conns[(loc.addr, loc.port)] = conns
 
             if loc.port:
                 _Peer._lock.acquire()
@@ -957,6 +1676,8 @@ class _SysAsynCoro_(asyncoro.AsynCoro):
                 _Peer._lock.release()
                 if peer:
                     peer.stream = stream_send
+                    if conns:
+                        peer.set_conns(conns)
                     if not broadcast:
                         _SysAsynCoro_._asyncoro._lock.release()
                         raise StopIteration(0)
@@ -965,6 +1686,8 @@ class _SysAsynCoro_(asyncoro.AsynCoro):
                 for (addr, port), peer in _Peer.peers.iteritems():
                     if addr == loc.addr:
                         peer.stream = stream_send
+                        if conns:
+                            peer.set_conns(conns)
                         if not stream_send:
                             self._stream_peers.pop((addr, port), None)
                 _Peer._lock.release()
@@ -973,7 +1696,10 @@ class _SysAsynCoro_(asyncoro.AsynCoro):
             if loc.port:
                 req = _NetRequest('ping',
                                   kwargs={'location': self._location, 'signature': self._signature,
-                                          'name': self._name, 'version': __version__}, dst=loc)
+                                          'name': self._name, 'version': __version__,
+                                          'unix_path': self._unix_path,
+                                          'host_id': self._host_id,
+                                          'serializers': list(Serializer._names)}, dst=loc)
                 sock = AsyncSocket(socket.socket(socket.AF_INET, socket.SOCK_STREAM))
                 sock.settimeout(2)
                 try:
@@ -1000,7 +1726,7 @@ class _SysAsynCoro_(asyncoro.AsynCoro):
                 sock.close()
             raise StopIteration(0)
 
-        ret = yield _peer(loc, udp_port, stream_send, broadcast)
+        ret = yield _peer(loc, udp_port, stream_send, broadcast, conns)
         client.send(ret)
 
     def discover_peers(self, port=None, coro=None):
@@ -1029,7 +1755,9 @@ class _SysAsynCoro_(asyncoro.AsynCoro):
         def send_ping_req(peer, auth, coro=None):
             req = _NetRequest('ping',
                               kwargs={'location': self._location, 'signature': self._signature,
-                                      'name': self._name, 'version': __version__},
+                                      'name': self._name, 'version': __version__,
+                                      'unix_path': self._unix_path, 'host_id': self._host_id,
+                                      'serializers': list(Serializer._names)},
                               dst=peer, auth=auth)
             sock = AsyncSocket(socket.socket(socket.AF_INET, socket.SOCK_STREAM),
                                keyfile=self._keyfile, certfile=self._certfile)
@@ -1047,74 +1775,116 @@ class _SysAsynCoro_(asyncoro.AsynCoro):
             SysCoro(self.discover_peers)
 
         while 1:
-            msg, addr = yield self._udp_sock.recvfrom(1024)
-            if not msg.startswith('ping:'):
-                logger.warning('ignoring UDP message from %s:%s', addr[0], addr[1])
-                continue
-            try:
-                ping_info = deserialize(msg[len('ping:'):])
-            except:
-                continue
-            req_peer = ping_info['location']
-            if req_peer == self._location:
-                continue
-            if ping_info['version'] != __version__:
-                logger.warning('Peer %s version %s is not %s',
-                               req_peer, ping_info['version'], __version__)
-                continue
-            if self._ignore_peers:
-                continue
-            if self._secret is None:
-                auth_code = None
-            else:
-                auth_code = hashlib.sha1(ping_info['signature'] + self._secret).hexdigest()
-            _Peer._lock.acquire()
-            peer = _Peer.peers.get((req_peer.addr, req_peer.port), None)
-            _Peer._lock.release()
-            if peer and peer.auth == auth_code:
-                continue
+            # all pings received are processed with one notification
+            msgs = yield self._udp_sock.recvfrom_many(64, 1024)
+            bcasts = []
+            for msg, addr in msgs:
+                if not msg.startswith('ping:'):
+                    logger.warning('ignoring UDP message from %s:%s', addr[0], addr[1])
+                    continue
+                try:
+                    ping_info = deserialize(msg[len('ping:'):])
+                except:
+                    continue
+                req_peer = ping_info['location']
+                if req_peer == self._location:
+                    continue
+                if ping_info['version'] != __version__:
+                    logger.warning('Peer %s version %s is not %s',
+                                   req_peer, ping_info['version'], __version__)
+                    continue
+                if self._ignore_peers:
+                    continue
+                if self._secret is None:
+                    auth_code = None
+                else:
+                    auth_code = hashlib.sha1(ping_info['signature'] + self._secret).hexdigest()
+                _Peer._lock.acquire()
+                peer = _Peer.peers.get((req_peer.addr, req_peer.port), None)
+                _Peer._lock.release()
+                if peer and peer.auth == auth_code:
+                    continue
+
+                SysCoro(send_ping_req, req_peer, auth_code)
 
-            SysCoro(send_ping_req, req_peer, auth_code)
+                if ping_info.pop('broadcast', None):
+                    ping_info.pop('propagate', None)
+                    ping_msg = 'ping:'.encode() + serialize(ping_info)
+                    bcasts.append((ping_msg, (self._broadcast, self._udp_sock.getsockname()[1])))
+                elif ping_info.pop('propagate', None):
+                    _Peer._lock.acquire()
+                    for peer in [peer for peer in _Peer.peers.itervalues()
+                                 if peer.location.addr == self._location.addr and
+                                 peer.location.port != self._location.port]:
+                        SysCoro(send_ping_req, peer.location, peer.auth)
+                    _Peer._lock.release()
 
-            if ping_info.pop('broadcast', None):
+            if bcasts:
                 ping_sock = AsyncSocket(socket.socket(socket.AF_INET, socket.SOCK_DGRAM))
                 ping_sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
                 ping_sock.settimeout(2)
-                ping_info.pop('propagate', None)
-                ping_msg = 'ping:'.encode() + serialize(ping_info)
                 try:
-                    yield ping_sock.sendto(ping_msg,
-                                           (self._broadcast, self._udp_sock.getsockname()[1]))
+                    yield ping_sock.sendto_many(bcasts)
                 except GeneratorExit:
                     break
                 except:
                     pass
                 finally:
                     ping_sock.close()
-            elif ping_info.pop('propagate', None):
-                _Peer._lock.acquire()
-                for peer in [peer for peer in _Peer.peers.itervalues()
-                             if peer.location.addr == self._location.addr and
-                             peer.location.port != self._location.port]:
-                    SysCoro(send_ping_req, peer.location, peer.auth)
-                _Peer._lock.release()
 
-    def _tcp_proc(self, coro=None):
+    def _peer_unix_path(self, peer_loc, info):
+        """Internal use only.
+
+        Returns path of Unix domain socket advertised by peer (in
+        'ping' / 'pong' request) if it is running on same host.
+        """
+        unix_path = info.get('unix_path', None)
+        if unix_path and self._unix_path and (peer_loc.addr == self._location.addr or
+                                              info.get('host_id', None) == self._host_id):
+            return unix_path
+        return None
+
+    def _peer_serializer(self, info):
+        """Internal use only.
+
+        Returns serializer to use for requests to peer, which advertises
+        names of its serializers in 'ping' / 'pong' request.
+        """
+        if self._serializer.name in info.get('serializers', ()):
+            return self._serializer
+        return _PickleSerializer
+
+    def _tcp_proc(self, sock, coro=None):
         coro.set_daemon()
         while 1:
-            conn, addr = yield self._tcp_sock.accept()
-            SysCoro(self._tcp_task, conn, addr)
+            # all pending connections are accepted with one notification
+            conns = yield sock.accept_many()
+            # connections from peers also count towards 'max_conns'
+            if len(_Peer.conns) + len(self._tcp_conns) + len(conns) > _Peer.max_conns:
+                _Peer.evict_conns(len(conns))
+            for conn, addr in conns:
+                SysCoro(self._tcp_task, conn, addr)
 
     def _tcp_task(self, conn, addr, coro=None):
+        # connections from peers are kept open (until they are idle for a
+        # while), so detect peers that are gone
+        coro.set_daemon()
+        _keepalive(conn)
+        _Peer._lock.acquire()
+        self._tcp_conns[conn] = False
+        _Peer._lock.release()
+        writer = None
         while 1:
+            self._tcp_conns[conn] = True
             try:
                 msg = yield conn.recv_msg()
             except:
                 break
             if not msg:
                 break
+            self._tcp_conns[conn] = False
             try:
-                req = deserialize(msg)
+                req, serializer = Serializer.decode(msg)
             except:
                 logger.debug('%s ignoring invalid message', self._location)
                 break
@@ -1126,168 +1896,37 @@ class _SysAsynCoro_(asyncoro.AsynCoro):
             #     logger.debug('invalid request "%s" to %s (%s)', req.name, req.dst, self._location)
             #     break
 
-            if req.name == 'send':
-                # synchronous message
-                reply = -1
-                if req.dst != self._location:
-                    logger.warning('ignoring invalid "send" (%s != %s)', req.dst, self._location)
+            if req.name in _SysAsynCoro_._ReplyReqs:
+                if req.id is None:
+                    reply = yield self._req_reply(req)
+                    yield conn.send_msg(serializer.encode(reply))
                 else:
-                    coro = req.kwargs.get('coro', None)
-                    if coro:
-                        name = req.kwargs.get('name', ' ')
-                        if name[0] == '~':
-                            Coro._asyncoro._lock.acquire()
-                            coro = Coro._asyncoro._coros.get(int(coro), None)
-                            Coro._asyncoro._lock.release()
-                            if coro and coro._name == name:
-                                reply = coro.send(req.kwargs['message'])
-                            else:
-                                logger.warning('ignoring invalid recipient to "send"')
-                        elif name[0] == '!':
-                            coro = self._coros.get(int(coro))
-                            if coro and coro._name == name:
-                                reply = coro.send(req.kwargs['message'])
-                            else:
-                                logger.warning('ignoring invalid recipient to "send"')
-                        else:
-                            logger.warning('invalid "send" message ignored')
+                    # request from peer's 'req_proc'; it may send more requests
+                    # before getting reply, so replies are sent (with id of
+                    # request) by 'writer' as soon as they are ready
+                    if not writer:
+                        writer = SysCoro(self._tcp_writer, conn)
+                    if req.name in _SysAsynCoro_._WaitReqs:
+                        # handlers that wait don't block requests after them
+                        SysCoro(self._tcp_reply, req, writer, serializer)
                     else:
-                        channel = req.kwargs.get('channel', None)
-                        if channel[0] == '~':
-                            Channel._asyncoro._lock.acquire()
-                            channel = Channel._asyncoro._channels.get(channel)
-                            Channel._asyncoro._lock.release()
-                            if channel:
-                                reply = channel.send(req.kwargs['message'])
-                            else:
-                                logger.warning('ignoring invalid recipient to "send"')
-                        elif channel[0] == '!':
-                            channel = self._channels.get(channel)
-                            if isinstance(channel, Channel):
-                                reply = channel.send(req.kwargs['message'])
-                            else:
-                                logger.warning('invalid "send" message ignored')
-                        else:
-                            logger.warning('ignoring invalid recipient to "send"')
-                yield conn.send_msg(serialize(reply))
-            elif req.name == 'deliver':
-                # synchronous message
-                reply = -1
-                if req.dst != self._location:
-                    logger.warning('ignoring invalid "deliver" (%s != %s)', req.dst, self._location)
-                else:
-                    coro = req.kwargs.get('coro', None)
-                    if coro:
-                        name = req.kwargs.get('name', ' ')
-                        if name[0] == '~':
-                            Coro._asyncoro._lock.acquire()
-                            coro = Coro._asyncoro._coros.get(int(coro))
-                            Coro._asyncoro._lock.release()
-                            if coro and coro.send(req.kwargs['message']) == 0:
-                                reply = 1
-                        elif name[0] == '!':
-                            coro = self._coros.get(int(coro))
-                            if coro and coro.send(req.kwargs['message']) == 0:
-                                reply = 1
-                            else:
-                                logger.warning('invalid "deliver" message ignored')
-                    else:
-                        channel = req.kwargs.get('channel')
-                        if channel:
-                            if channel[0] == '~':
-                                Channel._asyncoro._lock.acquire()
-                                channel = Channel._asyncoro._channels.get(channel)
-                                Channel._asyncoro._lock.release()
-                                if channel:
-                                    reply = yield channel.deliver(
-                                        req.kwargs['message'], timeout=req.timeout,
-                                        n=req.kwargs['n'])
-                            elif channel[0] == '!':
-                                channel = self._channels.get(channel)
-                                if isinstance(channel, Channel):
-                                    reply = yield channel.deliver(
-                                        req.kwargs['message'], timeout=req.timeout,
-                                        n=req.kwargs['n'])
-                            else:
-                                logger.warning('invalid "deliver" message ignored')
-                        else:
-                            logger.warning('invalid "deliver" message ignored')
-                yield conn.send_msg(serialize(reply))
-            elif req.name == 'run_rci':
-                # synchronous message
-                if req.dst != self._location:
-                    reply = Exception('invalid RCI invocation')
-                else:
-                    RCI._asyncoro._lock.acquire()
-                    rci = RCI._asyncoro._rcis.get(req.kwargs['name'], None)
-                    RCI._asyncoro._lock.release()
-                    if rci:
-                        args = req.kwargs['args']
-                        kwargs = req.kwargs['kwargs']
-                        try:
-                            reply = Coro(rci._method, *args, **kwargs)
-                        except:
-                            reply = Exception(traceback.format_exc())
-                    else:
-                        reply = Exception('RCI "%s" is not registered' % req.kwargs['name'])
-                yield conn.send_msg(serialize(reply))
-            elif req.name == 'locate_coro':
-                Coro._asyncoro._lock.acquire()
-                coro = Coro._asyncoro._rcoros.get(req.kwargs['name'], None)
-                Coro._asyncoro._lock.release()
-                if not coro:
-                    coro = self._rcoros.get(req.kwargs['name'], None)
-                yield conn.send_msg(serialize(coro))
-            elif req.name == 'locate_channel':
-                Channel._asyncoro._lock.acquire()
-                channel = Channel._asyncoro._rchannels.get('~' + req.kwargs['name'], None)
-                Channel._asyncoro._lock.release()
-                if not channel:
-                    channel = self._rchannels.get('!' + req.kwargs['name'], None)
-                yield conn.send_msg(serialize(channel))
-            elif req.name == 'locate_rci':
-                RCI._asyncoro._lock.acquire()
-                rci = RCI._asyncoro._rcis.get(req.kwargs['name'], None)
-                RCI._asyncoro._lock.release()
-                yield conn.send_msg(serialize(rci))
-            elif req.name == 'monitor':
-                # synchronous message
-                assert req.dst == self._location
-                reply = -1
-                monitor = req.kwargs.get('monitor', None)
-                coro = req.kwargs.get('coro', None)
-                name = req.kwargs.get('name', None)
-                if coro and name:
-                    if name[0] == '~':
-                        Coro._asyncoro._lock.acquire()
-                        coro = Coro._asyncoro._coros.get(int(coro), None)
-                        if coro and coro._name == name:
-                            reply = Coro._asyncoro._monitor(monitor, coro)
-                        Coro._asyncoro._lock.release()
-                    elif name == '!':
-                        coro = self._coros.get(int(coro), None)
-                        if coro and coro._name == name:
-                            reply = self._monitor(monitor, coro)
-                yield conn.send_msg(serialize(reply))
-            elif req.name == 'terminate_coro':
-                reply = -1
-                coro = req.kwargs.get('coro', None)
-                name = req.kwargs.get('name', None)
-                if coro and name:
-                    if name[0] == '~':
-                        Coro._asyncoro._lock.acquire()
-                        coro = Coro._asyncoro._coros.get(int(coro), None)
-                        Coro._asyncoro._lock.release()
-                    elif name[0] == '!':
-                        coro = self._coros.get(int(coro), None)
-                if isinstance(coro, Coro):
-                    reply = coro.terminate()
-                yield conn.send_msg(serialize(reply))
+                        reply = yield self._req_reply(req)
+                        writer.send(serializer.encode((req.id, reply)))
+            elif req.name == 'batch':
+                # one-way requests (sent together by peer's 'req_proc'); these
+                # are not replied to, but batch with id (from peer with
+                # stripes) is acknowledged once they are queued
+                for oreq in req.kwargs['reqs']:
+                    self._send_req(oreq)
+                if req.id is not None:
+                    if not writer:
+                        writer = SysCoro(self._tcp_writer, conn)
+                    writer.send(serializer.encode((req.id, 0)))
             elif req.name == 'ping':
                 peer_loc = req.kwargs.get('location', None)
                 if req.kwargs.get('version', None) != __version__:
                     logger.warning('Peer %s version %s is not %s',
-                                   peer_loc, req.kwargs.get['version'], __version__)
+                                   peer_loc, req.kwargs.get('version', None), __version__)
                     break
                 try:
                     assert req.kwargs['name']
@@ -1309,7 +1948,10 @@ class _SysAsynCoro_(asyncoro.AsynCoro):
                     break
                 pong = _NetRequest('pong',
                                    kwargs={'location': self._location, 'signature': self._signature,
-                                           'name': self._name, 'version': __version__},
+                                           'name': self._name, 'version': __version__,
+                                           'unix_path': self._unix_path,
+                                           'host_id': self._host_id,
+                                           'serializers': list(Serializer._names)},
                                    dst=peer_loc, auth=auth_code)
                 sock = AsyncSocket(socket.socket(socket.AF_INET, socket.SOCK_STREAM),
                                    keyfile=self._keyfile, certfile=self._certfile)
@@ -1332,12 +1974,18 @@ class _SysAsynCoro_(asyncoro.AsynCoro):
                     break
                 logger.debug('%s: found asyncoro "%s" at %s',
                              self._location, req.kwargs['name'], peer_loc)
-                peer = _Peer(req.kwargs['name'], peer_loc, auth_code, self._keyfile, self._certfile)
+                peer = _Peer(req.kwargs['name'], peer_loc, auth_code, self._keyfile, self._certfile,
+                             self._peer_unix_path(peer_loc, req.kwargs),
+                             self._peer_serializer(req.kwargs))
 
                 _SysAsynCoro_._asyncoro._lock.acquire()
                 if (peer_loc.addr, peer_loc.port) in _SysAsynCoro_._asyncoro._stream_peers or \
                    (peer_loc.addr, 0) in _SysAsynCoro_._asyncoro._stream_peers:
                     peer.stream = True
+                conns = self._peer_conns.get((peer_loc.addr, peer_loc.port),
+                                             self._peer_conns.get((peer_loc.addr, 0), None))
+                if conns:
+                    peer.set_conns(conns)
 
                 for loc_req in _SysAsynCoro_._asyncoro._pending_reqs.itervalues():
                     if loc_req.name == 'locate_peer' and \
@@ -1358,7 +2006,7 @@ class _SysAsynCoro_(asyncoro.AsynCoro):
                 peer_loc = req.kwargs.get('location', None)
                 if req.kwargs.get('version', None) != __version__:
                     logger.warning('Peer %s version %s is not %s',
-                                   peer_loc, req.kwargs.get['version'], __version__)
+                                   peer_loc, req.kwargs.get('version', None), __version__)
                     break
                 try:
                     assert req.kwargs['name']
@@ -1386,11 +2034,17 @@ class _SysAsynCoro_(asyncoro.AsynCoro):
                     break
                 logger.debug('%s: found asyncoro "%s" at %s',
                              self._location, req.kwargs['name'], peer_loc)
-                peer = _Peer(req.kwargs['name'], peer_loc, auth_code, self._keyfile, self._certfile)
+                peer = _Peer(req.kwargs['name'], peer_loc, auth_code, self._keyfile, self._certfile,
+                             self._peer_unix_path(peer_loc, req.kwargs),
+                             self._peer_serializer(req.kwargs))
                 _SysAsynCoro_._asyncoro._lock.acquire()
                 if (peer_loc.addr, peer_loc.port) in _SysAsynCoro_._asyncoro._stream_peers or \
                    (peer_loc.addr, 0) in _SysAsynCoro_._asyncoro._stream_peers:
                     peer.stream = True
+                conns = self._peer_conns.get((peer_loc.addr, peer_loc.port),
+                                             self._peer_conns.get((peer_loc.addr, 0), None))
+                if conns:
+                    peer.set_conns(conns)
 
                 # send pending (async) requests
                 for pending_req in _SysAsynCoro_._asyncoro._pending_reqs.itervalues():
@@ -1400,64 +2054,6 @@ class _SysAsynCoro_(asyncoro.AsynCoro):
                     else:
                         _Peer.send_req_to(pending_req, peer_loc)
                 _SysAsynCoro_._asyncoro._lock.release()
-            elif req.name == 'subscribe':
-                # synchronous message
-                assert req.dst == self._location
-                reply = -1
-                channel = req.kwargs.get('channel', ' ')
-                if channel[0] == '~':
-                    Channel._asyncoro._lock.acquire()
-                    channel = Channel._asyncoro._channels.get(channel, None)
-                    Channel._asyncoro._lock.release()
-                elif channel[0] == '!':
-                    channel = self._channels.get(channel, None)
-                if isinstance(channel, Channel) and channel._location == self._location:
-                    subscriber = req.kwargs.get('subscriber', None)
-                    if isinstance(subscriber, Coro):
-                        if subscriber._location == self._location:
-                            Coro._asyncoro._lock.acquire()
-                            subscriber = Coro._asyncoro._coros.get(int(subscriber._id), None)
-                            Coro._asyncoro._lock.release()
-                        reply = yield channel.subscribe(subscriber)
-                    elif isinstance(subsriber, Channel):
-                        if subscriber._location == self._location:
-                            Channel._asyncoro._lock.acquire()
-                            subscriber = self._channels.get(subscriber._name, None)
-                            Channel._asyncoro._lock.release()
-                        reply = yield channel.subscribe(subscriber)
-                yield conn.send_msg(serialize(reply))
-            elif req.name == 'unsubscribe':
-                # synchronous message
-                assert req.dst == self._location
-                reply = -1
-                channel = req.kwargs.get('channel', ' ')
-                if channel[0] == '~':
-                    Channel._asyncoro._lock.acquire()
-                    channel = Channel._asyncoro._channels.get(channel, None)
-                    Channel._asyncoro._lock.release()
-                elif channel[0] == '!':
-                    channel = self._channels.get(channel, None)
-                if isinstance(channel, Channel) and channel._location == self._location:
-                    subscriber = req.kwargs.get('subscriber', None)
-                    if isinstance(subscriber, Coro):
-                        if subscriber._location == self._location:
-                            Coro._asyncoro._lock.acquire()
-                            subscriber = Coro._asyncoro._coros.get(int(subscriber._id), None)
-                            Coro._asyncoro._lock.release()
-                        reply = yield channel.unsubscribe(subscriber)
-                    elif isinstance(subsriber, Channel):
-                        if subscriber._location == self._location:
-                            Channel._asyncoro._lock.acquire()
-                            subscriber = self._channels.get(subscriber._name, None)
-                            Channel._asyncoro._lock.release()
-                        reply = yield channel.unsubscribe(subscriber)
-                yield conn.send_msg(serialize(reply))
-            elif req.name == 'locate_peer':
-                if req.kwargs['name'] == self._name:
-                    loc = self._location
-                elif req.dst == self._location:
-                    loc = None
-                yield conn.send_msg(serialize(loc))
             elif req.name == 'send_file':
                 # synchronous message
                 assert req.dst == self._location
@@ -1515,28 +2111,6 @@ class _SysAsynCoro_(asyncoro.AsynCoro):
                         os.remove(tgt)
                         resp = -1
                 yield conn.send_msg(serialize(resp))
-            elif req.name == 'del_file':
-                # synchronous message
-                assert req.dst == self._location
-                tgt = os.path.basename(req.kwargs['file'])
-                dir = req.kwargs['dir']
-                if isinstance(dir, str) and dir:
-                    tgt = os.path.join(dir, tgt)
-                tgt = os.path.join(self.__dest_path, tgt)
-                if tgt.startswith(self.__dest_path) and os.path.isfile(tgt):
-                    os.remove(tgt)
-                    d = os.path.dirname(tgt)
-                    try:
-                        while d > self.__dest_path and os.path.isdir(d):
-                            os.rmdir(d)
-                            d = os.path.dirname(d)
-                    except:
-                        # logger.debug(traceback.format_exc())
-                        pass
-                    reply = 0
-                else:
-                    reply = -1
-                yield conn.send_msg(serialize(reply))
             elif req.name == 'peer_closed':
                 # synchronous message
                 peer_loc = req.kwargs.get('location', None)
@@ -1545,13 +2119,372 @@ class _SysAsynCoro_(asyncoro.AsynCoro):
                     # TODO: remove from _stream_peers?
                     # _SysAsynCoro_._asyncoro._stream_peers.pop((peer_loc.addr, peer_loc.port))
                     _Peer.remove(peer_loc)
-                    yield conn.send_msg(serialize(0))
+                    if req.id is None:
+                        yield conn.send_msg(serializer.encode(0))
+                    else:
+                        if not writer:
+                            writer = SysCoro(self._tcp_writer, conn)
+                        writer.send(serializer.encode((req.id, 0)))
                 break
             else:
                 logger.warning('invalid request "%s" ignored', req.name)
 
+        _Peer._lock.acquire()
+        self._tcp_conns.pop(conn, None)
+        _Peer._lock.release()
+        if writer:
+            # writer closes connection after sending pending replies
+            writer.send(None)
+        else:
+            conn.close()
+
+    def _tcp_writer(self, conn, coro=None):
+        """Internal use only.
+
+        Sends replies (as they become ready) to requests received over
+        'conn' by '_tcp_task'. Replies of handlers still waiting when
+        connection is closed are discarded.
+        """
+        coro.set_daemon()
+        while 1:
+            msg = yield coro.receive()
+            if msg is None:
+                break
+            try:
+                yield conn.send_msg(msg)
+            except:
+                break
         conn.close()
 
+    def _tcp_reply(self, req, writer, serializer, coro=None):
+        """Internal use only.
+
+        Handles request that may wait (e.g., 'deliver') and gives its
+        reply (encoded with 'serializer') to 'writer'.
+        """
+        coro.set_daemon()
+        try:
+            reply = yield self._req_reply(req)
+        except:
+            logger.debug('%s: request "%s" failed: %s', self._location, req.name,
+                         traceback.format_exc())
+            reply = None
+        writer.send(serializer.encode((req.id, reply)))
+
+    def _send_req(self, req):
+        """Internal use only.
+
+        Handles 'send' request (which may be in a batch of one-way
+        requests) and returns status.
+        """
+        reply = -1
+        if req.dst != self._location:
+            logger.warning('ignoring invalid "send" (%s != %s)', req.dst, self._location)
+        elif 'recipients' in req.kwargs:
+            # message (serialized once) to subscribers of a channel
+            message = deserialize(req.kwargs['data'])
+            reply = 0
+            for name, coro in req.kwargs['recipients']:
+                if self._send_msg(name, coro, message) != 0:
+                    reply = -1
+        else:
+            coro = req.kwargs.get('coro', None)
+            if coro:
+                reply = self._send_msg(req.kwargs.get('name', ' '), coro, req.kwargs['message'])
+            else:
+                reply = self._send_msg(req.kwargs.get('channel', None), None,
+                                       req.kwargs['message'])
+        return reply
+
+    def _send_msg(self, name, coro, message):
+        """Internal use only.
+
+        Sends 'message' to coroutine with 'name' and id 'coro' or, if
+        'coro' is None, to channel with 'name'; returns status.
+        """
+        reply = -1
+        if coro:
+            if name[0] == '~':
+                Coro._asyncoro._lock.acquire()
+                coro = Coro._asyncoro._coros.get(int(coro), None)
+                Coro._asyncoro._lock.release()
+                if coro and coro._name == name:
+                    reply = coro.send(message)
+                else:
+                    logger.warning('ignoring invalid recipient to "send"')
+            elif name[0] == '!':
+                coro = self._coros.get(int(coro))
+                if coro and coro._name == name:
+                    reply = coro.send(message)
+                else:
+                    logger.warning('ignoring invalid recipient to "send"')
+            else:
+                logger.warning('invalid "send" message ignored')
+        else:
+            channel = name
+            if channel[0] == '~':
+                Channel._asyncoro._lock.acquire()
+                channel = Channel._asyncoro._channels.get(channel)
+                Channel._asyncoro._lock.release()
+                if channel:
+                    reply = channel.send(message)
+                else:
+                    logger.warning('ignoring invalid recipient to "send"')
+            elif channel[0] == '!':
+                channel = self._channels.get(channel)
+                if isinstance(channel, Channel):
+                    reply = channel.send(message)
+                else:
+                    logger.warning('invalid "send" message ignored')
+            else:
+                logger.warning('ignoring invalid recipient to "send"')
+        return reply
+
+    def _deliver_msg(self, name, coro, message, timeout, n):
+        """Internal use only.
+
+        Delivers 'message' to coroutine with 'name' and id 'coro' or, if
+        'coro' is None, to channel with 'name'; returns number of
+        recipients it is delivered to (or -1 if recipient is invalid).
+        """
+        reply = -1
+        if coro:
+            if name[0] == '~':
+                Coro._asyncoro._lock.acquire()
+                coro = Coro._asyncoro._coros.get(int(coro))
+                Coro._asyncoro._lock.release()
+                if coro:
+                    # waits for room if coro's mailbox is full
+                    reply = yield coro.deliver(message, timeout=timeout)
+            elif name[0] == '!':
+                coro = self._coros.get(int(coro))
+                if coro:
+                    reply = yield coro.deliver(message, timeout=timeout)
+                else:
+                    logger.warning('invalid "deliver" message ignored')
+        elif name:
+            channel = name
+            if channel[0] == '~':
+                Channel._asyncoro._lock.acquire()
+                channel = Channel._asyncoro._channels.get(channel)
+                Channel._asyncoro._lock.release()
+                if channel:
+                    reply = yield channel.deliver(message, timeout=timeout, n=n)
+            elif channel[0] == '!':
+                channel = self._channels.get(channel)
+                if isinstance(channel, Channel):
+                    reply = yield channel.deliver(message, timeout=timeout, n=n)
+            else:
+                logger.warning('invalid "deliver" message ignored')
+        else:
+            logger.warning('invalid "deliver" message ignored')
+        raise StopIteration(reply)
+
+    def _req_reply(self, req):
+        """Internal use only.
+
+        Handles request 'req' (one of _ReplyReqs) and returns reply.
+        """
+        if req.name == 'send':
+            reply = self._send_req(req)
+        elif req.name == 'deliver':
+            # synchronous message
+            reply = -1
+            if req.dst != self._location:
+                logger.warning('ignoring invalid "deliver" (%s != %s)', req.dst, self._location)
+            elif 'recipients' in req.kwargs:
+                # message (serialized once) to subscribers of a channel,
+                # delivered to them concurrently; reply is list of
+                # replies for them, given when all are done, 'n' of them
+                # got message or timeout (replies of those not done by
+                # then are 0)
+                message = deserialize(req.kwargs['data'])
+                recipients = req.kwargs['recipients']
+                n = req.kwargs['n']
+                timeout = req.timeout
+                if timeout is not None:
+                    # leave time for reply to get to sender before it
+                    # stops waiting for it
+                    timeout *= 0.9
+                info = {'reply': [0] * len(recipients), 'pending': len(recipients),
+                        'success': 0, 'done': Event()}
+
+                def _deliver(i, name, coro_id, coro=None):
+                    try:
+                        reply = yield self._deliver_msg(name, coro_id, message, timeout, n)
+                    except:
+                        reply = 0
+                    info['reply'][i] = reply
+                    if reply > 0:
+                        info['success'] += 1
+                        if n > 0 and info['success'] >= n:
+                            info['done'].set()
+                    info['pending'] -= 1
+                    if info['pending'] == 0:
+                        info['done'].set()
+
+                for i, (name, coro) in enumerate(recipients):
+                    SysCoro(_deliver, i, name, coro)
+                if info['pending']:
+                    yield info['done'].wait(timeout)
+                reply = list(info['reply'])
+            else:
+                coro = req.kwargs.get('coro', None)
+                if coro:
+                    reply = yield self._deliver_msg(req.kwargs.get('name', ' '), coro,
+                                                    req.kwargs['message'], req.timeout, None)
+                else:
+                    reply = yield self._deliver_msg(req.kwargs.get('channel'), None,
+                                                    req.kwargs['message'], req.timeout,
+                                                    req.kwargs.get('n', 0))
+        elif req.name == 'run_rci':
+            # synchronous message
+            if req.dst != self._location:
+                reply = Exception('invalid RCI invocation')
+            else:
+                RCI._asyncoro._lock.acquire()
+                rci = RCI._asyncoro._rcis.get(req.kwargs['name'], None)
+                RCI._asyncoro._lock.release()
+                if rci:
+                    args = req.kwargs['args']
+                    kwargs = req.kwargs['kwargs']
+                    try:
+                        reply = Coro(rci._method, *args, **kwargs)
+                    except:
+                        reply = Exception(traceback.format_exc())
+                else:
+                    reply = Exception('RCI "%s" is not registered' % req.kwargs['name'])
+        elif req.name == 'locate_coro':
+            Coro._asyncoro._lock.acquire()
+            coro = Coro._asyncoro._rcoros.get(req.kwargs['name'], None)
+            Coro._asyncoro._lock.release()
+            if not coro:
+                coro = self._rcoros.get(req.kwargs['name'], None)
+            reply = coro
+        elif req.name == 'locate_channel':
+            Channel._asyncoro._lock.acquire()
+            channel = Channel._asyncoro._rchannels.get('~' + req.kwargs['name'], None)
+            Channel._asyncoro._lock.release()
+            if not channel:
+                channel = self._rchannels.get('!' + req.kwargs['name'], None)
+            reply = channel
+        elif req.name == 'locate_rci':
+            RCI._asyncoro._lock.acquire()
+            rci = RCI._asyncoro._rcis.get(req.kwargs['name'], None)
+            RCI._asyncoro._lock.release()
+            reply = rci
+        elif req.name == 'monitor':
+            # synchronous message
+            assert req.dst == self._location
+            reply = -1
+            monitor = req.kwargs.get('monitor', None)
+            coro = req.kwargs.get('coro', None)
+            name = req.kwargs.get('name', None)
+            if coro and name:
+                if name[0] == '~':
+                    Coro._asyncoro._lock.acquire()
+                    coro = Coro._asyncoro._coros.get(int(coro), None)
+                    if coro and coro._name == name:
+                        reply = Coro._asyncoro._monitor(monitor, coro)
+                    Coro._asyncoro._lock.release()
+                elif name == '!':
+                    coro = self._coros.get(int(coro), None)
+                    if coro and coro._name == name:
+                        reply = self._monitor(monitor, coro)
+        elif req.name == 'terminate_coro':
+            reply = -1
+            coro = req.kwargs.get('coro', None)
+            name = req.kwargs.get('name', None)
+            if coro and name:
+                if name[0] == '~':
+                    Coro._asyncoro._lock.acquire()
+                    coro = Coro._asyncoro._coros.get(int(coro), None)
+                    Coro._asyncoro._lock.release()
+                elif name[0] == '!':
+                    coro = self._coros.get(int(coro), None)
+            if isinstance(coro, Coro):
+                reply = coro.terminate()
+        elif req.name == 'subscribe':
+            # synchronous message
+            assert req.dst == self._location
+            reply = -1
+            channel = req.kwargs.get('channel', ' ')
+            if channel[0] == '~':
+                Channel._asyncoro._lock.acquire()
+                channel = Channel._asyncoro._channels.get(channel, None)
+                Channel._asyncoro._lock.release()
+            elif channel[0] == '!':
+                channel = self._channels.get(channel, None)
+            if isinstance(channel, Channel) and channel._location == self._location:
+                subscriber = req.kwargs.get('subscriber', None)
+                if isinstance(subscriber, Coro):
+                    if subscriber._location == self._location:
+                        Coro._asyncoro._lock.acquire()
+                        subscriber = Coro._asyncoro._coros.get(int(subscriber._id), None)
+                        Coro._asyncoro._lock.release()
+                    reply = yield channel.subscribe(subscriber,
+                                                    filter=req.kwargs.get('filter', None))
+                elif isinstance(subscriber, Channel):
+                    if subscriber._location == self._location:
+                        Channel._asyncoro._lock.acquire()
+                        subscriber = self._channels.get(subscriber._name, None)
+                        Channel._asyncoro._lock.release()
+                    reply = yield channel.subscribe(subscriber,
+                                                    filter=req.kwargs.get('filter', None))
+        elif req.name == 'unsubscribe':
+            # synchronous message
+            assert req.dst == self._location
+            reply = -1
+            channel = req.kwargs.get('channel', ' ')
+            if channel[0] == '~':
+                Channel._asyncoro._lock.acquire()
+                channel = Channel._asyncoro._channels.get(channel, None)
+                Channel._asyncoro._lock.release()
+            elif channel[0] == '!':
+                channel = self._channels.get(channel, None)
+            if isinstance(channel, Channel) and channel._location == self._location:
+                subscriber = req.kwargs.get('subscriber', None)
+                if isinstance(subscriber, Coro):
+                    if subscriber._location == self._location:
+                        Coro._asyncoro._lock.acquire()
+                        subscriber = Coro._asyncoro._coros.get(int(subscriber._id), None)
+                        Coro._asyncoro._lock.release()
+                    reply = yield channel.unsubscribe(subscriber)
+                elif isinstance(subscriber, Channel):
+                    if subscriber._location == self._location:
+                        Channel._asyncoro._lock.acquire()
+                        subscriber = self._channels.get(subscriber._name, None)
+                        Channel._asyncoro._lock.release()
+                    reply = yield channel.unsubscribe(subscriber)
+        elif req.name == 'locate_peer':
+            if req.kwargs['name'] == self._name:
+                reply = self._location
+            else:
+                # to broadcast request, only peer with that name replies
+                reply = None
+        elif req.name == 'del_file':
+            # synchronous message
+            assert req.dst == self._location
+            tgt = os.path.basename(req.kwargs['file'])
+            dir = req.kwargs['dir']
+            if isinstance(dir, str) and dir:
+                tgt = os.path.join(dir, tgt)
+            tgt = os.path.join(self.__dest_path, tgt)
+            if tgt.startswith(self.__dest_path) and os.path.isfile(tgt):
+                os.remove(tgt)
+                d = os.path.dirname(tgt)
+                try:
+                    while d > self.__dest_path and os.path.isdir(d):
+                        os.rmdir(d)
+                        d = os.path.dirname(d)
+                except:
+                    # logger.debug(traceback.format_exc())
+                    pass
+                reply = 0
+            else:
+                reply = -1
+        raise StopIteration(reply)
+
     def _swing_call_(self, swing, method, *args, **kwargs):
         swing['result'] = yield method(*args, **kwargs)
         swing['event'].set()
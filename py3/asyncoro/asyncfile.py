@@ -21,7 +21,7 @@ import platform
 from functools import partial as partial_func
 
 import asyncoro
-from asyncoro import _AsyncPoller, AsynCoro, Coro
+from asyncoro import _AsyncPoller, AsynCoro, Coro, _Awaitable, _AwaitNone, _coroutine
 
 __author__ = "Giridhar Pemmasani (pgiri@yahoo.com)"
 __copyright__ = "Copyright (c) 2014 Giridhar Pemmasani"
@@ -314,7 +314,7 @@ if platform.system() == 'Windows':
                     if len(buf) > size:
                         buf, self._buflist = buf[:size], [buf[size:]]
                     if (not full) or (len(buf) == size):
-                        return buf
+                        return _Awaitable(buf)
                     self._buflist = [buf]
                     size -= len(buf)
                 count = size
@@ -331,7 +331,7 @@ if platform.system() == 'Windows':
                     buf, self._buflist = b''.join(self._buflist), []
                     self._read_coro._proceed_(buf)
                     self._read_result = self._read_coro = self._overlap.object = None
-                    return
+                    return _AwaitNone
                 else:
                     rc = exc.winerror
             if rc and rc != winerror.ERROR_IO_PENDING:
@@ -340,6 +340,7 @@ if platform.system() == 'Windows':
             if timeout:
                 self._timeout = timeout
                 _AsyncFile._notifier._add_timeout(self)
+            return _AwaitNone
 
         def write(self, buf, full=False, timeout=None):
             """Write data in 'buf' to file. If 'full' is True, the function
@@ -411,7 +412,7 @@ if platform.system() == 'Windows':
                     self._write_result.release()
                     self._write_coro._proceed_(0)
                     self._write_result = self._write_coro = self._overlap.object = None
-                    return
+                    return _AwaitNone
                 else:
                     rc = exc.winerror
             if rc and rc != winerror.ERROR_IO_PENDING:
@@ -421,6 +422,7 @@ if platform.system() == 'Windows':
             if timeout:
                 self._timeout = timeout
                 _AsyncFile._notifier._add_timeout(self)
+            return _AwaitNone
 
         def seek(self, offset, whence=os.SEEK_SET):
             """Similar to 'seek' of file descriptor; works only for
@@ -590,7 +592,7 @@ else:
                 if len(buf) > size:
                     buf, self._buflist = buf[:size], [buf[size:]]
                 if (not full) or (len(buf) == size):
-                    return buf
+                    return _Awaitable(buf)
                 self._buflist = [buf]
                 size -= len(buf)
             self._timeout = timeout
@@ -600,6 +602,7 @@ else:
             self._read_coro = AsynCoro.cur_coro(self._asyncoro)
             self._read_coro._await_()
             _AsyncFile._notifier.add(self, _AsyncPoller._Read)
+            return _AwaitNone
 
         def write(self, buf, full=False, timeout=None):
             """Write data in 'buf' to file. If 'full' is True, the function
@@ -652,6 +655,7 @@ else:
             self._write_coro = AsynCoro.cur_coro(self._asyncoro)
             self._write_coro._await_()
             _AsyncFile._notifier.add(self, _AsyncPoller._Write)
+            return _AwaitNone
 
         def close(self):
             """Close file descriptor.
@@ -696,6 +700,7 @@ else:
 class AsyncFile(_AsyncFile):
     """See _AsyncFile above.
     """
+    @_coroutine
     def readline(self, size=0, sizehint=100, timeout=None):
         """Read a line up to 'size' and return. 'size' and 'timeout'
         are as per 'read' method above. 'sizehint' indicates
@@ -711,7 +716,7 @@ class AsyncFile(_AsyncFile):
         else:
             buf = yield self.read(size=sizehint, timeout=timeout)
             if not buf:
-                raise StopIteration(buf)
+                return buf
 
         buflist = []
         while 1:
@@ -728,12 +733,12 @@ class AsyncFile(_AsyncFile):
                     pos += sum(len(b) for b in buflist)
                 if len(buf) > pos:
                     buf, self._buflist = buf[:pos+1], [buf[pos+1:]]
-                raise StopIteration(buf)
+                return buf
             buflist.append(buf)
             buf = yield self.read(size=sizehint, timeout=timeout)
             if not buf:
                 buf = b''.join(buflist)
-                raise StopIteration(buf)
+                return buf
 
     def __enter__(self):
         return self
@@ -796,36 +801,42 @@ class AsyncPipe(object):
         else:
             raise RuntimeError('AsyncPipe is invalid')
 
+    @_coroutine
     def write(self, buf, full=False, timeout=None):
         """Write data in buf to stdin of pipe. See 'write' method of
         AsyncFile for details.
         """
-        yield self.stdin.write(buf, full=full, timeout=timeout)
+        return (yield self.stdin.write(buf, full=full, timeout=timeout))
 
+    @_coroutine
     def read(self, size=0, timeout=None):
         """Read data from stdout of pipe. See 'read' method of
         AsyncFile for details.
         """
-        yield self.stdout.read(size=size, timeout=timeout)
+        return (yield self.stdout.read(size=size, timeout=timeout))
 
+    @_coroutine
     def readline(self, size=0, sizehint=100, timeout=None):
         """Read a line from stdout of pipe. See 'readline' method of
         AsyncFile for details.
         """
-        yield self.stdout.readline(size=size, sizehint=sizehint, timeout=timeout)
+        return (yield self.stdout.readline(size=size, sizehint=sizehint, timeout=timeout))
 
+    @_coroutine
     def read_stderr(self, size=0, timeout=None):
         """Read data from stderr of pipe. See 'read' method of
         AsyncFile for details.
         """
-        yield self.stderr.read(size=size, timeout=timeout)
+        return (yield self.stderr.read(size=size, timeout=timeout))
 
+    @_coroutine
     def readline_stderr(self, size=0, sizehint=100, timeout=None):
         """Read a line from stderr of pipe. See 'readline' method of
         AsyncFile for details.
         """
-        yield self.stderr.readline(size=size, sizehint=sizehint, timeout=timeout)
+        return (yield self.stderr.readline(size=size, sizehint=sizehint, timeout=timeout))
 
+    @_coroutine
     def communicate(self, input=None):
         """Similar to Popen's communicate. Must be used with 'yield' as
         'stdout, stderr = yield async_pipe.communicate()'
@@ -868,7 +879,7 @@ class AsyncPipe(object):
                 buflist.append(buf)
             fd.close()
             data = b''.join(buflist)
-            raise StopIteration(data)
+            return data
 
         if self.stdout:
             stdout_coro = Coro(read_proc, self.stdout)
@@ -878,8 +889,8 @@ class AsyncPipe(object):
             stdin_coro = Coro(write_proc, self.stdin, input)
             yield stdin_coro.finish()
 
-        raise StopIteration((yield stdout_coro.finish()) if self.stdout else None,
-                            (yield stderr_coro.finish()) if self.stderr else None)
+        return ((yield stdout_coro.finish()) if self.stdout else None,
+                (yield stderr_coro.finish()) if self.stderr else None)
 
     def poll(self):
         """Similar to 'poll' of Popen.
@@ -26,7 +26,7 @@ import functools
 import re
 
 import asyncoro.disasyncoro as asyncoro
-from asyncoro import Coro, SysCoro, logger
+from asyncoro import Coro, SysCoro, logger, _coroutine
 
 __author__ = "Giridhar Pemmasani (pgiri@yahoo.com)"
 __copyright__ = "Copyright (c) 2014-2015 Giridhar Pemmasani"
@@ -211,6 +211,7 @@ class Computation(object):
         if '__mp_main__' not in sys.modules:
             sys.modules['__mp_main__'] = sys.modules['__main__']
 
+    @_coroutine
     def schedule(self, location=None, timeout=None):
         """Schedule computation for execution. Must be used with 'yield' as
         'result = yield compute.schedule()'. If scheduler is executing other
@@ -219,15 +220,15 @@ class Computation(object):
         """
 
         if self._auth is not None:
-            raise StopIteration(-1)
+            return -1
         if self.status_coro is not None and not isinstance(self.status_coro, Coro):
-            raise StopIteration(-1)
+            return -1
 
         if not self.scheduler:
             self.scheduler = yield Coro.locate('discoro_scheduler', location=location,
                                                timeout=self.timeout)
             if not isinstance(self.scheduler, Coro):
-                raise StopIteration(-1)
+                return -1
 
         def _schedule(self, coro=None):
             self._pulse_coro = SysCoro(self._pulse_proc)
@@ -238,7 +239,7 @@ class Computation(object):
             if not isinstance(self._auth, str):
                 logger.debug('Could not send computation to scheduler %s: %s',
                              self.scheduler, self._auth)
-                raise StopIteration(-1)
+                return -1
             SysCoro.scheduler().atexit(10, lambda: SysCoro(self.close).value())
             if coro.location != self.scheduler.location:
                 for xf, dst, sep in self._xfer_files:
@@ -253,19 +254,20 @@ class Computation(object):
                        self.scheduler.location, xf, dir=dst, timeout=self.timeout)) < 0:
                         logger.warning('Could not send file "%s" to scheduler', xf)
                         yield self.close()
-                        raise StopIteration(-1)
+                        return -1
             msg = {'req': 'await', 'auth': self._auth, 'client': coro}
             self.scheduler.send(msg)
             resp = yield coro.receive(timeout=timeout)
             if (isinstance(resp, dict) and resp.get('auth') == self._auth and
                resp.get('resp') == 'scheduled'):
-                raise StopIteration(0)
+                return 0
             else:
                 yield self.close()
-                raise StopIteration(-1)
+                return -1
 
-        yield Coro(_schedule, self).finish()
+        return (yield Coro(_schedule, self).finish())
 
+    @_coroutine
     def run_at(self, where, gen, *args, **kwargs):
         """Run given generator function 'gen' with arguments 'args' and 'kwargs'
         at 'where'.  If the request is successful, 'rcoro' will be a (remote)
@@ -304,10 +306,11 @@ class Computation(object):
                     self.status_coro.send(DiscoroStatus(Scheduler.CoroCreated, msg))
             else:
                 rcoro = None
-            raise StopIteration(rcoro)
+            return rcoro
 
-        yield Coro(_run, self).finish()
+        return (yield Coro(_run, self).finish())
 
+    @_coroutine
     def run_each(self, where, gen, *args, **kwargs):
         """Run given generator function 'gen' with arguments 'args' and 'kwargs'
         at each node or server.  If the request is successful, 'rcoro' will be a
@@ -339,7 +342,7 @@ class Computation(object):
             # TODO: timeout should be for all operations combined?
             n = yield self.scheduler.deliver(msg, timeout=self.timeout)
             if n != 1:
-                raise StopIteration([])
+                return []
             n = yield coro.receive(timeout=self.timeout)
             rcoros = []
             for i in range(n):
@@ -349,10 +352,11 @@ class Computation(object):
                     if self.status_coro:
                         msg = DiscoroCoroInfo(rcoro, args, kwargs, time.time())
                         self.status_coro.send(DiscoroStatus(Scheduler.CoroCreated, msg))
-            raise StopIteration(rcoros)
+            return rcoros
 
-        yield Coro(_run, self).finish()
+        return (yield Coro(_run, self).finish())
 
+    @_coroutine
     def run(self, gen, *args, **kwargs):
         """Run given generator function 'gen' with arguments 'args' and 'kwargs'
         at a server with least load at a node with least load.
@@ -360,8 +364,9 @@ class Computation(object):
         Must be used with 'yield' as 'rcoro = yield compute.run(genf, ...)'. If
         the request is successful, 'rcoro' will be a (remote) coroutine.
         """
-        yield self.run_at(None, gen, *args, **kwargs)
+        return (yield self.run_at(None, gen, *args, **kwargs))
 
+    @_coroutine
     def run_nodes(self, gen, *args, **kwargs):
         """Run given generator function 'gen' with arguments 'args' and 'kwargs'
         at a server with least load at every node.
@@ -369,8 +374,9 @@ class Computation(object):
         Must be used with 'yield' as 'rcoros = yield compute.run_nodes(genf,
         ...)'. 'rcoros' will be a list of (remote) coroutines.
         """
-        yield self.run_each('node', gen, *args, **kwargs)
+        return (yield self.run_each('node', gen, *args, **kwargs))
 
+    @_coroutine
     def run_servers(self, gen, *args, **kwargs):
         """Run given generator function 'gen' with arguments 'args' and 'kwargs'
         at every server (at every node).
@@ -378,8 +384,9 @@ class Computation(object):
         Must be used with 'yield' as 'rcoros = yield compute.run_servers(genf,
         ...)'. 'rcoros' will be a list of (remote) coroutines.
         """
-        yield self.run_each('server', gen, *args, **kwargs)
+        return (yield self.run_each('server', gen, *args, **kwargs))
 
+    @_coroutine
     def run_node_servers(self, host, gen, *args, **kwargs):
         """Run given generator function 'gen' with arguments 'args' and 'kwargs'
         at every server at given node at 'host'. 'host' must IP address or host
@@ -393,13 +400,14 @@ class Computation(object):
             # if host starts with digit, assume IP address
             if not host[0].isdigit():
                 host = socket.gethostbyname(host)
-            yield self.run_each(host, gen, *args, **kwargs)
+            return (yield self.run_each(host, gen, *args, **kwargs))
         else:
-            raise StopIteration([])
+            return []
 
     # TODO: add 'map' methods to run with arguments as iterators
     # (e.g., list of tuples)
 
+    @_coroutine
     def nodes(self):
         """Get list of addresses of nodes initialized for this computation. Must
         be used with 'yield' as 'yield compute.nodes()'.
@@ -410,10 +418,11 @@ class Computation(object):
             if (yield self.scheduler.deliver(msg, timeout=self.timeout)) == 1:
                 yield coro.receive(self.timeout)
             else:
-                raise StopIteration([])
+                return []
 
-        yield Coro(_nodes_list, self).finish()
+        return (yield Coro(_nodes_list, self).finish())
 
+    @_coroutine
     def servers(self):
         """Get list of Location instances of servers initialized for this
         computation. Must be used with 'yield' as 'yield compute.servers()'.
@@ -424,10 +433,11 @@ class Computation(object):
             if (yield self.scheduler.deliver(msg, timeout=self.timeout)) == 1:
                 yield coro.receive(self.timeout)
             else:
-                raise StopIteration([])
+                return []
 
-        yield Coro(_servers_list, self).finish()
+        return (yield Coro(_servers_list, self).finish())
 
+    @_coroutine
     def close(self):
         """Close computation. Must be used with 'yield' as 'yield
         compute.close()'.
@@ -448,7 +458,7 @@ class Computation(object):
         if self._auth:
             done = asyncoro.Event()
             SysCoro(_close, self, done)
-            yield done.wait()
+            return (yield done.wait())
 
     def _pulse_proc(self, coro=None):
         """For internal use only.
@@ -561,7 +571,7 @@ class Scheduler(object, metaclass=asyncoro.Singleton):
                 else:
                     logger.debug('failed to create rcoro: %s / %s',
                                  str(rcoro), computation.timeout)
-                raise StopIteration(rcoro)
+                return rcoro
 
             rcoro = yield SysCoro(_run, self, func).finish()
             yield client.deliver(rcoro)
@@ -733,20 +743,20 @@ class Scheduler(object, metaclass=asyncoro.Singleton):
         #     raise StopIteration
         if not node.coro:
             asyncoro.logger.warning('Node %s is not valid: %s', node.addr, type(node.coro))
-            raise StopIteration
+            return
         node.coro.send({'req': 'discoro_node_info', 'client': coro})
         node_info = yield coro.receive(timeout=MsgTimeout)
         if not node_info:
             self._nodes.pop(node.addr, None)
             asyncoro.Coro(asyncoro.AsynCoro.instance().close_peer, node.coro.location)
-            raise StopIteration
+            return
         node.name = node_info.name
         node.cpus = node_info.cpus
         node.platform = node_info.platform.lower()
         node.avail_info = node_info.avail_info
         if not self.__node_filter(node):
             node.status = Scheduler.NodeIgnore
-            raise StopIteration
+            return
         node.status = Scheduler.NodeDiscovered
         if self._cur_computation:
             SysCoro(self.__reserve_node, node)
@@ -766,7 +776,7 @@ class Scheduler(object, metaclass=asyncoro.Singleton):
     def __discover_peer(self, msg, coro=None):
         m = re.match(r'.+-(\d+)$', msg.name)
         if not m or int(m.group(1)) < 0:
-            raise StopIteration
+            return
 
         if int(m.group(1)) == 0:  # node
             for _ in range(10):
@@ -777,19 +787,19 @@ class Scheduler(object, metaclass=asyncoro.Singleton):
                     continue
                 node = self._nodes.get(msg.location.addr, None)
                 if node and node.coro == rcoro:
-                    raise StopIteration
+                    return
 
                 if not node:
                     node = Scheduler._Node(msg.name, msg.location.addr)
                     self._nodes[msg.location.addr] = node
                 node.coro = rcoro
                 SysCoro(self.__get_node_info, node)
-                raise StopIteration
+                return
 
         else:  # server
             node = self._nodes.get(msg.location.addr, None)
             if node and node.status == Scheduler.NodeIgnore:
-                raise StopIteration
+                return
             for _ in range(10):
                 rcoro = yield Coro.locate('discoro_server', location=msg.location,
                                           timeout=MsgTimeout)
@@ -799,14 +809,14 @@ class Scheduler(object, metaclass=asyncoro.Singleton):
                 node = self._nodes.get(rcoro.location.addr, None)
                 if node:
                     if node.status == Scheduler.NodeIgnore:
-                        raise StopIteration
+                        return
                 else:
                     node = Scheduler._Node(msg.name, rcoro.location.addr)
                     self._nodes[rcoro.location.addr] = node
                 server = node.servers.get(rcoro.location, None)
                 if server:
                     if server.coro == rcoro:
-                        raise StopIteration
+                        return
                     # TODO: close current rcoros on this server?
                     node.servers.pop(rcoro.location)
                 server = Scheduler._Server(msg.name, rcoro.location)
@@ -819,7 +829,7 @@ class Scheduler(object, metaclass=asyncoro.Singleton):
 
                     if node.status != Scheduler.NodeIgnore:
                         SysCoro(self.__setup_server, server)
-                raise StopIteration
+                return
 
     def __timer_proc(self, coro=None):
         coro.set_daemon()
@@ -1118,23 +1128,23 @@ class Scheduler(object, metaclass=asyncoro.Singleton):
 
     def __setup_server(self, server, coro=None):
         if not self._cur_computation:
-            raise StopIteration(0)
+            return 0
         if server.status in (Scheduler.ServerInitialized, Scheduler.ServerIgnore):
-            raise StopIteration(0)
+            return 0
         server.status = Scheduler.ServerIgnore
         node = self._nodes.get(server.location.addr, None)
         if not node:
-            raise StopIteration(0)
+            return 0
         if not self._cur_computation:
-            raise StopIteration(0)
+            return 0
         server.coro.send({'req': 'setup', 'client': coro, 'computation': self._cur_computation,
                           'status_coro': self.__status_coro, 'notify': self.__status_coro})
         ret = yield coro.receive(timeout=self._cur_computation.timeout, alarm_value=-1)
         if ret:
             logger.warning('setup of %s failed: %s', server.coro, ret)
-            raise StopIteration(ret)
+            return ret
         if not self._cur_computation:
-            raise StopIteration(-1)
+            return -1
         xfer_files = self._cur_computation._xfer_files
         for xf, dst, sep in xfer_files:
             reply = yield self.asyncoro.send_file(server.location, xf, dir=dst,
@@ -1142,7 +1152,7 @@ class Scheduler(object, metaclass=asyncoro.Singleton):
             if reply < 0:
                 logger.debug('failed to transfer file %s: %s', xf, reply)
                 SysCoro(self.__close_server, server, self._cur_computation)
-                raise StopIteration(-1)
+                return -1
         server.status = Scheduler.ServerInitialized
         server.last_pulse = time.time()
         if self._cur_computation:
@@ -1153,13 +1163,13 @@ class Scheduler(object, metaclass=asyncoro.Singleton):
             if self._cur_computation.status_coro:
                 self._cur_computation.status_coro.send(DiscoroStatus(server.status, server.location))
         else:
-            raise StopIteration(-1)
-        raise StopIteration(0)
+            return -1
+        return 0
 
     def __close_node(self, node, computation, coro=None):
         if not computation or node.status != Scheduler.NodeInitialized:
             logger.warning('Closing node %s ignored', node.addr)
-            raise StopIteration(-1)
+            return -1
         if node.coro:
             def _close(coro=None):
                 node.coro.send({'req': 'release', 'auth': computation._auth, 'client': coro})
@@ -1173,10 +1183,10 @@ class Scheduler(object, metaclass=asyncoro.Singleton):
     def __close_server(self, server, computation, coro=None):
         if server.status != Scheduler.ServerInitialized or not computation:
             logger.debug('Closing server %s ignored', server.location)
-            raise StopIteration(-1)
+            return -1
         node = self._nodes.get(server.location.addr, None)
         if not node:
-            raise StopIteration(-1)
+            return -1
         disconnected = server.location not in node.servers
         if disconnected:
             if computation and computation.status_coro:
@@ -1212,7 +1222,7 @@ class Scheduler(object, metaclass=asyncoro.Singleton):
             node.status = Scheduler.NodeClosed
             if computation and computation.status_coro:
                 computation.status_coro.send(DiscoroStatus(node.status, node.addr))
-        raise StopIteration(0)
+        return 0
 
     def __close_computation(self, client=None, coro=None):
         computation, self._cur_computation = self._cur_computation, None
@@ -1232,7 +1242,7 @@ class Scheduler(object, metaclass=asyncoro.Singleton):
         self.__sched_event.set()
         if client:
             client.send('closed')
-        raise StopIteration(0)
+        return 0
 
 
 if __name__ == '__main__':
@@ -11,7 +11,7 @@ import inspect
 
 import asyncoro.disasyncoro as asyncoro
 import asyncoro.discoro as discoro
-from asyncoro import Coro
+from asyncoro import Coro, _coroutine
 from asyncoro.discoro import DiscoroStatus, DiscoroServerInfo, DiscoroNodeInfo
 
 __author__ = "Giridhar Pemmasani (pgiri@yahoo.com)"
@@ -106,6 +106,7 @@ class RemoteCoroScheduler(object):
         self._servers = {}
         self._server_avail = asyncoro.Event()
 
+    @_coroutine
     def schedule(self, gen, *args, **kwargs):
         """Similar to 'run' method of computation, except as noted above: This
         method will block until a server process is available (i.e., not running
@@ -129,8 +130,9 @@ class RemoteCoroScheduler(object):
         else:
             self._servers[sloc] = loc
             self._server_avail.set()
-        raise StopIteration(rcoro)
+        return rcoro
 
+    @_coroutine
     def execute(self, gen, *args, **kwargs):
         """Similar to 'run' method of computation, except as noted above: The
         caller (client coroutine) will block until a server process is available
@@ -158,8 +160,9 @@ class RemoteCoroScheduler(object):
         else:
             self._servers[sloc] = loc
             self._server_avail.set()
-            raise StopIteration(asyncoro.MonitorException(None, (type(rcoro), rcoro)))
+            return asyncoro.MonitorException(None, (type(rcoro), rcoro))
 
+    @_coroutine
     def execute_at(self, where, gen, *args, **kwargs):
         """Similar to 'run_at' method of computation, except the calling
         coroutine is blocked until the computation finishes and exit value of
@@ -181,8 +184,9 @@ class RemoteCoroScheduler(object):
                     self.status_coro.send(msg)
             client._await_()
         else:
-            raise StopIteration(asyncoro.MonitorException(None, (type(rcoro), rcoro)))
+            return asyncoro.MonitorException(None, (type(rcoro), rcoro))
 
+    @_coroutine
     def map_results(self, gen, iter):
         """Execute generator 'gen' with arguments from given iterable. The
         return value is list of results that correspond to executing 'gen' with
@@ -207,8 +211,9 @@ class RemoteCoroScheduler(object):
         for i, coro in enumerate(coros):
             result = yield coro.finish()
             results[i] = result
-        raise StopIteration(results)
+        return results
 
+    @_coroutine
     def submit_at(self, where, gen, *args, **kwargs):
         """Similar to 'run_at' method of computation. If 'where' is None, the
         calling coroutine is blocked until any server is discovered and
@@ -231,13 +236,15 @@ class RemoteCoroScheduler(object):
                 msg = self._askew_results.pop(rcoro, None)
                 if msg:
                     self.status_coro.send(msg)
-        raise StopIteration(rcoro)
+        return rcoro
 
+    @_coroutine
     def submit(self, gen, *args, **kwargs):
         """Submit coroutine at any server; see 'submit_at' above.
         """
-        yield self.submit_at(None, gen, *args, **kwargs)
+        return (yield self.submit_at(None, gen, *args, **kwargs))
 
+    @_coroutine
     def finish(self, close=False):
         """Wait until all scheduled coroutines finish. If 'close' is True, the
         computation is closed as well.
@@ -332,7 +339,7 @@ class RemoteCoroScheduler(object):
                       msg.info == self.computation_sign):
                     if self._proc_status:
                         Coro(self._proc_status, msg.status, msg.info)
-                    raise StopIteration
+                    return
                 elif msg.status != discoro.Scheduler.CoroCreated:
                     if self._proc_status:
                         Coro(self._proc_status, msg.status, msg.info)